@@ -1,3 +1,6 @@
+import logging
+import os
+
 from flask import Flask
 from flask_mail import Mail
 from flask_cors import CORS
@@ -8,8 +11,17 @@ load_dotenv()
 mail = Mail()
 
 def create_app():
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+
     app = Flask(__name__)
     app.config.from_object('config.Config')
+
+    from backend.utils.json_provider import configurar_json
+    configurar_json(app)
+
     @app.route("/health")
     def health():
         return {"status": "healthy"}
@@ -37,6 +49,7 @@ def create_app():
     from backend.blueprints.presets import presets_bp
     from backend.blueprints.email import email_bp
     from backend.blueprints.firmas import firma_bp
+    from backend.blueprints.metricas import metricas_bp
     # Registrar
     app.register_blueprint(usuarios_bp)
     app.register_blueprint(alumnos_bp)
@@ -53,4 +66,17 @@ def create_app():
     app.register_blueprint(email_bp)
     app.register_blueprint(comentarios_bp)
     app.register_blueprint(firma_bp)
+    app.register_blueprint(metricas_bp)
+
+    from backend.utils.db import registrar_pool
+    registrar_pool(app)
+
+    from backend.utils.db_session import registrar_unidad_trabajo
+    registrar_unidad_trabajo(app)
+
+    from backend.utils.compresion import registrar_compresion
+    registrar_compresion(app)
+
+    from backend.cli import registrar_comandos
+    registrar_comandos(app)
     return app
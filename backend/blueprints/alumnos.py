@@ -1,12 +1,16 @@
 # backend/blueprints/alumnos.py
 from flask import Blueprint, request, jsonify
 from backend.utils.db_session import DBSession
-from backend.utils.query_helpers import (
-    aplicar_filtros_basicos,
-    aplicar_filtros_atributos,
-    cargar_atributos,
-)
+from backend.utils.listados import responder_listado
 from backend.utils.logger import registrar_historial
+from backend.utils.busqueda import (
+    indexar_trigramas_usuario,
+    normalizar_telefono,
+    normalizar_mail,
+    buscar_duplicado,
+)
+from backend.utils.resumen import refrescar_resumen
+from backend.utils.versiones import con_etag, incrementar_version, TABLAS_CONTACTOS
 from backend.utils.auth_middleware import admin_required, login_required
 
 alumnos_bp = Blueprint("alumnos_bp", __name__, url_prefix="/api")
@@ -14,73 +18,25 @@ alumnos_bp = Blueprint("alumnos_bp", __name__, url_prefix="/api")
 
 @alumnos_bp.route("/alumnos", methods=["GET"])
 @login_required
+@con_etag(*TABLAS_CONTACTOS)
 def listar_alumnos():
     """
     Lista alumnos (estado = 'alumno') con:
       - masters cursando (nomMaster — edicio) en 'master'
       - filtros normales + atributos dinámicos
       - 'atributos' en el JSON (mapa nombre_attr -> valor)
+      - paginación opcional: ?limit=N&cursor=... devuelve
+        {items, next_cursor} en vez de la lista completa
+      - con 'Accept: application/x-ndjson' se devuelve en streaming,
+        una fila JSON por línea
+      - ?fields=id,nombre,mail limita las columnas (y se omiten los
+        JOINs y la carga de atributos que no hagan falta)
     """
     try:
-        params = request.args.to_dict()
-
-        mapa = {
-            "nombre":  "u.nombreUsuario LIKE %s",
-            "telefono": "u.telefon LIKE %s",
-            "mail":    "u.mail LIKE %s",
-            "master":  "m.nomMaster = %s",
-            "edicion": "m.edicio   = %s",
-        }
-
-        filtros, valores = aplicar_filtros_basicos(params, mapa)
-        filtros, valores = aplicar_filtros_atributos(
-            params,
-            filtros,
-            valores,
-            claves_reservadas=set(mapa.keys()),
-        )
-
-        query = """
-            SELECT 
-                u.idUsuario AS id,
-                u.nombreUsuario AS nombre,
-                u.mail,
-                u.telefon AS telefono,
-                GROUP_CONCAT(
-                    DISTINCT CONCAT(m.nomMaster, ' — ', m.edicio)
-                    SEPARATOR ', '
-                ) AS master
-            FROM usuario u
-            LEFT JOIN relacionusuariomaster rum 
-                ON rum.idUsuario = u.idUsuario
-            LEFT JOIN master m 
-                ON m.idMaster = rum.idMaster
-            WHERE u.estado = 'alumno'
-        """
-
-        if filtros:
-            query += " AND " + " AND ".join(filtros)
-
-        query += """
-            GROUP BY u.idUsuario, u.nombreUsuario, u.mail, u.telefon
-            ORDER BY u.nombreUsuario ASC
-        """
-
-        with DBSession() as db:
-            db.execute(query, valores)
-            rows = db.fetchall()
-
-            if not rows:
-                return jsonify([]), 200
-
-            ids = [r["id"] for r in rows]
-            attrs = cargar_atributos(db, ids)
-
-            for u in rows:
-                u["atributos"] = attrs.get(u["id"], {})
-
-        return jsonify(rows), 200
+        return responder_listado("alumnos", request.args.to_dict())
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("❌ ERROR /alumnos GET:", e)
         return jsonify({"error": str(e)}), 500
@@ -100,15 +56,21 @@ def crear_alumno():
             return jsonify({"error": "Faltan datos obligatorios"}), 400
 
         with DBSession() as db:
+            # Possible duplicat (cerca per índex a mail_norm / telefono_norm)
+            duplicado = buscar_duplicado(db, mail, telefono)
+
             # Crear usuario base como alumno
             db.execute(
                 """
-                INSERT INTO usuario (nombreUsuario, mail, telefon, estado)
-                VALUES (%s, %s, %s, 'alumno')
+                INSERT INTO usuario (nombreUsuario, mail, telefon, estado,
+                                     telefono_norm, mail_norm)
+                VALUES (%s, %s, %s, 'alumno', %s, %s)
                 """,
-                (nombre, mail, telefono),
+                (nombre, mail, telefono,
+                 normalizar_telefono(telefono), normalizar_mail(mail)),
             )
             id_usuario = db.lastrowid
+            indexar_trigramas_usuario(db, id_usuario, nombre, mail, telefono)
 
             # Crear entrada en tabla alumno
             db.execute(
@@ -127,6 +89,8 @@ def crear_alumno():
                 """,
                 (id_usuario, id_master),
             )
+            refrescar_resumen(db, [id_usuario])
+            incrementar_version(db, "usuario", "alumno", "relacionusuariomaster")
 
             # nombre máster + edición para historial
             db.execute(
@@ -143,7 +107,11 @@ def crear_alumno():
             detalle += f" — Ed. {edicion_master}"
         registrar_historial(id_usuario, "Alumno creado", detalle)
 
-        return jsonify({"mensaje": "Alumno creado correctamente", "id": id_usuario}), 201
+        return jsonify({
+            "mensaje": "Alumno creado correctamente",
+            "id": id_usuario,
+            "duplicado_de": duplicado,
+        }), 201
 
     except Exception as e:
         print("❌ ERROR /alumnos POST:", e)
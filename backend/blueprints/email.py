@@ -1,9 +1,18 @@
+import logging
+import os
+
 from flask import Blueprint, request, jsonify
 from backend.utils.auth_middleware import login_required
+from backend.utils.cooperativo import ejecutar_concurrente
 from backend.utils.email import enviar_correo_html, wrap_email_html
 
+logger = logging.getLogger("crm.email")
+
 email_bp = Blueprint("email_bp", __name__, url_prefix="/api")
 
+# Envíos SMTP simultáneos por petición (greenlets con gevent, threads si no)
+EMAIL_CONCURRENCIA = int(os.getenv("EMAIL_CONCURRENCIA", "5"))
+
 @email_bp.route("/enviar-email", methods=["POST"])
 @login_required
 def enviar_email():
@@ -26,9 +35,7 @@ def enviar_email():
     remitente_email = user.get("email") or "tecnico@ceibcn.com"
     remitente_nombre = user.get("username") or "CRM"
 
-    enviados = 0
-
-    for dest in destinatarios:
+    def enviar(dest):
         enviar_correo_html(
             destino=dest,
             asunto=asunto,
@@ -37,6 +44,25 @@ def enviar_email():
             remitente_nombre=remitente_nombre,
             bcc_list=bcc
         )
-        enviados += 1
 
-    return jsonify({"status": "ok", "mensaje": f"Correos enviados: {enviados}"}), 200
+    resultados = ejecutar_concurrente(enviar, destinatarios, EMAIL_CONCURRENCIA)
+
+    fallidos = []
+    for dest, error in resultados:
+        if error is not None:
+            # Sin la dirección (ni el mensaje SMTP, que suele incluirla)
+            logger.error(
+                "Error enviando correo a un destinatario de @%s: %s",
+                dest.rsplit("@", 1)[-1], type(error).__name__,
+            )
+            fallidos.append(dest)
+    enviados = len(resultados) - len(fallidos)
+
+    if not enviados:
+        return jsonify({"error": "No se ha podido enviar ningún correo", "fallidos": fallidos}), 500
+
+    return jsonify({
+        "status": "ok",
+        "mensaje": f"Correos enviados: {enviados}",
+        "fallidos": fallidos,
+    }), 200
@@ -1,25 +1,72 @@
 from flask import Blueprint, request, send_file, jsonify
-from backend.utils.db_session import DBSession
-from backend.utils.db import get_connection
+from backend.utils.db_session import DBSession, terminar_unidad
 from backend.utils.auth_middleware import login_required
+from backend.utils.query_compiler import compilar, ejecutar_plantilla
+from backend.utils.consultas import redactar
+from backend.utils.referencia import obtener_referencia
+from backend.utils.simple_cache import obtener_o_calcular, clave_generacional
+from backend.utils.versiones import obtener_versiones, TABLAS_CONTACTOS
+from backend.utils.busqueda import (
+    parsear_modo,
+    condicion_atributo_indexada,
+    condicion_trigramas,
+    campo_trigrama,
+    condicion_clave_normalizada,
+    escapar_like,
+)
 import io
+import logging
 import pandas as pd
 
+logger = logging.getLogger("crm.exportar")
+
 export_bp = Blueprint("export_bp", __name__, url_prefix="/api/exportar")
 
 
-# Helper simple con get_connection (para los GET)
+# Las exportaciones idénticas (misma plantilla + parámetros + versión de los
+# datos) se calculan una sola vez: las peticiones simultáneas esperan a la
+# que está en curso y el resultado se reaprovecha durante EXPORT_CACHE_TTL.
+EXPORT_CACHE_TTL = 30
+EXPORT_CACHE_STALE = 30
+
+
+def filas_exportacion(plantilla, params, cachear=True):
+    """
+    Filas de una consulta de exportación (lista de dicts), con coalescencia
+    de peticiones simultáneas y cache corta.
+    La clave depende de las versiones de TABLAS_CONTACTOS: las consultas sobre
+    otras tablas (p. ej. usuario_sistema) deben pasar cachear=False.
+    """
+    params = list(params or ())
+    if not cachear:
+        with DBSession() as db:
+            return ejecutar_plantilla(db, plantilla, params).fetchall()
+
+    clave = clave_generacional("listados", "export:%s:%r:%r" % (
+        plantilla.huella,
+        params,
+        tuple(sorted(obtener_versiones(TABLAS_CONTACTOS).items())),
+    ))
+
+    def calcular():
+        with DBSession() as db:
+            return ejecutar_plantilla(db, plantilla, params).fetchall()
+
+    return obtener_o_calcular(
+        clave,
+        calcular,
+        ttl_seconds=EXPORT_CACHE_TTL,
+        stale_seconds=EXPORT_CACHE_STALE,
+        metrica="exportar",
+    )
+
+
+# Helper simple (para los GET)
 def ejecutar_query(query, params=None):
     """
     Ejecuta una consulta SQL y retorna todas las filas como lista de dicts.
     """
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(query, params or ())
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+    return filas_exportacion(compilar(query), params)
 
 
 # ---------------------------------------------------------
@@ -30,18 +77,21 @@ def get_nombres_atributos_validos():
     Retorna un set con todos los nombres de atributos definidos en la tabla 'atributos'.
     Sirve como whitelist para las columnas dinámicas.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT nombre FROM atributos")
-    res = {row[0] for row in cursor.fetchall()}
-    cursor.close()
-    conn.close()
-    return res
+    return set(obtener_referencia()["atributos"]["por_nombre"])
 
 
 # ---------------------------------------------------------
 # Construcción unificada de filtros (WHERE)
 # ---------------------------------------------------------
+# Filtros de texto → columna de la tabla base
+COLUMNAS_TEXTO = {
+    "nombre": "nombreUsuario",
+    "mail": "mail",
+    "telefono": "telefon",
+    "telefon": "telefon",
+}
+
+
 def construir_where_clause(
         filtros=None,
         filtros_atributos=None,
@@ -52,11 +102,15 @@ def construir_where_clause(
     """
     Construye la cláusula WHERE (sql y params) a partir de:
       - filtros: dict (nombre, mail, telefono, master, interes_master, edicion…)
-      - filtros_atributos: lista de dicts {"nombre": "...", "valor": "..."}
+      - filtros_atributos: lista de dicts {"nombre": "...", "valor": "...", "match": "..."}
     Los 'alias' indican cómo se llaman las tablas en la consulta principal.
+    'match' (exact / prefix / words), por atributo o global en 'filtros',
+    hace que el filtro de atributo use el índice atributos_busqueda; con
+    exact / prefix, mail y teléfono usan las columnas normalizadas.
     """
     filtros = filtros or {}
     filtros_atributos = filtros_atributos or []
+    modo_global = parsear_modo(filtros.get("match"))
 
     where_parts = []
     valores = []
@@ -67,17 +121,26 @@ def construir_where_clause(
 
         k = str(key).lower()
 
-        if k == "nombre":
-            where_parts.append(f"{base_alias}.nombreUsuario LIKE %s")
-            valores.append(f"%{value}%")
+        if k in ("nombre", "mail", "telefono", "telefon"):
+            columna = COLUMNAS_TEXTO[k]
 
-        elif k == "mail":
-            where_parts.append(f"{base_alias}.mail LIKE %s")
-            valores.append(f"%{value}%")
-
-        elif k in ("telefono", "telefon"):
-            where_parts.append(f"{base_alias}.telefon LIKE %s")
-            valores.append(f"%{value}%")
+            # exact / prefix sobre mail o telèfon: columna normalitzada indexada
+            normalizada = condicion_clave_normalizada(
+                columna, str(value), modo_global, base_alias=base_alias
+            )
+            if normalizada:
+                where_parts.extend(normalizada[0])
+                valores.extend(normalizada[1])
+                continue
+
+            where_parts.append(f"{base_alias}.{columna} LIKE %s")
+            valores.append(f"%{escapar_like(str(value))}%")
+            # Candidats via índex de trigrames abans del LIKE (si està activat)
+            conds, vals = condicion_trigramas(
+                campo_trigrama(columna), str(value), base_alias=base_alias
+            )
+            where_parts.extend(conds)
+            valores.extend(vals)
 
         elif k == "estado":
             # Filtro simple por la columna estado de la tabla base
@@ -87,12 +150,12 @@ def construir_where_clause(
         elif k == "master" and master_alias:
             # Filtra por el master que está cursando
             where_parts.append(f"{master_alias}.nomMaster LIKE %s")
-            valores.append(f"%{value}%")
+            valores.append(f"%{escapar_like(str(value))}%")
 
         elif k == "interes_master" and interes_master_alias:
             # Filtra por el master que le interesa
             where_parts.append(f"{interes_master_alias}.nomMaster LIKE %s")
-            valores.append(f"%{value}%")
+            valores.append(f"%{escapar_like(str(value))}%")
 
         elif k == "edicion" and master_alias:
             where_parts.append(f"{master_alias}.edicio = %s")
@@ -105,6 +168,16 @@ def construir_where_clause(
         if not nombre_attr or not valor_attr:
             continue
 
+        modo = parsear_modo(fa.get("match")) or modo_global
+        if modo:
+            conds, vals = condicion_atributo_indexada(
+                nombre_attr, str(valor_attr), modo, base_alias=base_alias
+            )
+            if conds:
+                where_parts.extend(conds)
+                valores.extend(vals)
+                continue
+
         where_parts.append(f"""
             EXISTS (
                 SELECT 1 
@@ -116,7 +189,7 @@ def construir_where_clause(
             )
         """)
         valores.append(nombre_attr)
-        valores.append(f"%{valor_attr}%")
+        valores.append(f"%{escapar_like(str(valor_attr))}%")
 
     where_sql = ""
     if where_parts:
@@ -345,6 +418,8 @@ def rows_to_excel_response(rows, filename="export.xlsx"):
     Convierte una lista de dicts a un Excel en memoria
     y devuelve la respuesta Flask con send_file.
     """
+    # Generar el Excel es solo CPU: la conexión de la petición vuelve antes al pool
+    terminar_unidad()
     df = pd.DataFrame(rows)
 
     if df.empty:
@@ -572,19 +647,24 @@ def exportar_excel():
         """
         params = params_attr + valores_filtros
 
-        print("🔍 QUERY FINAL EXPORT:", query)
-        print("🔍 PARAMS:", params)
+        # Plantilla compilada: misma forma de filtros → mismo SQL y huella
+        plantilla = compilar(query)
 
-        # 6. EJECUTAR QUERY
-        with DBSession() as db:
-            db.execute(query, params)
-            rows = db.fetchall()
+        logger.debug(
+            "Export [%s] params=%s", plantilla.huella, redactar(params)
+        )
+
+        # 6. EJECUTAR QUERY (compartida con peticiones idénticas en curso)
+        # usuario_sistema no tiene versión de datos: sin cache
+        rows = filas_exportacion(plantilla, params, cachear=tipo != "sistema")
 
         # 7. EXPORTAR EXCEL
         # El DataFrame se crea directamente con las 'rows' resultantes de la
         # consulta unificada, que ya incluye todos los atributos y campos.
         return rows_to_excel_response(rows, filename=filename)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("❌ ERROR exportar_excel:", e)
         return jsonify({"error": "Error generando Excel"}), 500
\ No newline at end of file
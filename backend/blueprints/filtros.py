@@ -1,20 +1,18 @@
 from flask import Blueprint, request, jsonify
 from backend.utils.db_session import DBSession
 from backend.utils.auth_middleware import login_required
+from backend.utils.referencia import obtener_referencia, invalidar_referencia
+from backend.utils.versiones import con_etag, incrementar_version
 
 filtros_bp = Blueprint("filtros_bp", __name__, url_prefix="/api")
 
 
 @filtros_bp.route("/ediciones", methods=["GET"])
 @login_required
+@con_etag("master")
 def obtener_ediciones():
     try:
-        with DBSession() as db:
-            db.execute("SELECT DISTINCT edicio FROM master ORDER BY edicio")
-            rows = db.fetchall()
-
-        ediciones = [row["edicio"] for row in rows]
-        return jsonify(ediciones), 200
+        return jsonify(obtener_referencia()["ediciones"]), 200
 
     except Exception as e:
         print("❌ ERROR /ediciones:", e)
@@ -23,14 +21,10 @@ def obtener_ediciones():
 
 @filtros_bp.route("/atributos-list", methods=["GET"])
 @login_required
+@con_etag("atributos")
 def obtener_atributos():
     try:
-        with DBSession() as db:
-            db.execute("SELECT nombre FROM atributos ORDER BY nombre")
-            rows = db.fetchall()
-
-        atributos = [row["nombre"] for row in rows]
-        return jsonify(atributos), 200
+        return jsonify(obtener_referencia()["atributos"]["nombres"]), 200
 
     except Exception as e:
         print("❌ ERROR /atributos-list:", e)
@@ -52,6 +46,9 @@ def crear_atributo():
                 "INSERT INTO atributos (nombre) VALUES (%s)",
                 (nombre,),
             )
+            incrementar_version(db, "atributos")
+
+        invalidar_referencia()
 
         return jsonify({"mensaje": "Atributo creado"}), 201
 
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from backend.utils.db import get_connection
 from backend.utils.auth_middleware import login_required
+from backend.utils.referencia import obtener_referencia, invalidar_referencia
+from backend.utils.versiones import con_etag, incrementar_version
 
 firma_bp = Blueprint("firma_bp", __name__, url_prefix="/api")
 
@@ -11,22 +13,9 @@ firma_bp = Blueprint("firma_bp", __name__, url_prefix="/api")
 # =========================================================
 @firma_bp.route("/firmas", methods=["GET"])
 @login_required
+@con_etag("firmas_email")
 def get_firmas():
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
-        SELECT idFirma, nombre, html, es_defecto
-        FROM firmas_email
-        WHERE activa = 1
-        ORDER BY es_defecto DESC, nombre
-    """)
-
-    firmas = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    return jsonify(firmas), 200
+    return jsonify(obtener_referencia()["firmas"]), 200
 
 
 # POST /api/firmas
@@ -60,10 +49,12 @@ def crear_firma():
         INSERT INTO firmas_email (nombre, html, es_defecto, activa)
         VALUES (%s, %s, %s, 1)
     """, (nombre, html, es_defecto))
+    incrementar_version(cur, "firmas_email")
 
     conn.commit()
     cur.close()
     conn.close()
+    invalidar_referencia()
 
     return jsonify({"status": "ok"}), 201
 
@@ -86,9 +77,11 @@ def eliminar_firma(id_firma):
             es_defecto = 0
         WHERE idFirma = %s
     """, (id_firma,))
+    incrementar_version(cur, "firmas_email")
 
     conn.commit()
     cur.close()
     conn.close()
+    invalidar_referencia()
 
     return jsonify({"status": "ok"}), 200
@@ -1,29 +1,17 @@
 from flask import Blueprint, jsonify
-from backend.utils.db import get_connection
+from backend.utils.referencia import obtener_referencia
 from backend.utils.auth_middleware import admin_required, login_required
+from backend.utils.versiones import con_etag
 
 masters_bp = Blueprint("masters_bp", __name__, url_prefix="/api")
 
 @masters_bp.route("/masters", methods=["GET"])
 @login_required
+@con_etag("master")
 def obtener_masters():
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT 
-                idMaster,
-                nomMaster AS nombre,
-                edicio AS edicion
-            FROM master
-            ORDER BY nomMaster ASC, edicio ASC
-        """)
-        masters = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
-        return jsonify(masters)
+        # Foto en memòria (backend/utils/referencia.py)
+        return jsonify(obtener_referencia()["masters"])
 
     except Exception as e:
         print("❌ ERROR MASTERS:", e)
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from backend.utils.db import get_connection
 from backend.utils.auth_middleware import admin_required, login_required
+from backend.utils.resumen import refrescar_resumen
+from backend.utils.versiones import incrementar_version
 
 matricula_bp = Blueprint("matricula_bp", __name__, url_prefix="/api")
 
@@ -73,6 +75,10 @@ def matricular():
 
             nuevos_matriculados.append(idUsuario)
 
+        refrescar_resumen(cursor, nuevos_matriculados)
+        if nuevos_matriculados:
+            incrementar_version(cursor, "usuario", "alumno", "relacionusuariomaster", "postulado")
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from backend.utils.auth_middleware import admin_required
+from backend.utils.metricas import instantanea
+
+metricas_bp = Blueprint("metricas_bp", __name__, url_prefix="/api")
+
+
+@metricas_bp.route("/metricas", methods=["GET"])
+@admin_required
+def obtener_metricas():
+    """
+    Mètriques internes del procés (compressió, caches, plantilles SQL...).
+    Cada worker té les seves.
+    """
+    return jsonify(instantanea()), 200
@@ -1,10 +1,14 @@
 from flask import Blueprint, request
-from backend.utils.db import get_connection
+from backend.utils.db import get_connection, usar_primario
 from backend.utils.tokens import verificar_token_unsubscribe
+from backend.utils.resumen import refrescar_resumen
+from backend.utils.versiones import incrementar_version
 
 publicidad_bp = Blueprint("publicidad_bp", __name__, url_prefix="/api/publicidad")
 
+# GET que escribe: nunca a la réplica
 @publicidad_bp.route("/unsubscribe", methods=["GET"])
+@usar_primario
 def unsubscribe():
     token = request.args.get("token", "")
 
@@ -15,6 +19,8 @@ def unsubscribe():
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE usuario SET publicidad = 0 WHERE idUsuario = %s", (user_id,))
+    refrescar_resumen(cursor, [user_id])
+    incrementar_version(cursor, "usuario")
     conn.commit()
     cursor.close()
     conn.close()
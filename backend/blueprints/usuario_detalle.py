@@ -1,11 +1,17 @@
 from flask import Blueprint, jsonify
 from backend.utils.db_session import DBSession
 from backend.utils.auth_middleware import login_required
+from backend.utils.db import usar_primario
+from backend.utils.query_helpers import cargar_atributos
+from backend.utils.resumen import borrar_resumen
+from backend.utils.versiones import incrementar_version
 
 usuario_detalle_bp = Blueprint("usuario_detalle_bp", __name__, url_prefix="/api")
 
 
+# La ficha se abre justo después de crear / editar: siempre del primario
 @usuario_detalle_bp.route('/usuario/<int:id>', methods=['GET'])
+@usar_primario
 @login_required
 def obtener_usuario(id):
     """
@@ -59,14 +65,7 @@ def obtener_usuario(id):
             user["masters_interes"] = db.fetchall()
 
             # Atributs dinàmics
-            db.execute("""
-                SELECT a.nombre AS atributo, va.valor
-                FROM valores_atributos va
-                JOIN atributos a ON a.idAtributo = va.idAtributo
-                WHERE va.idUsuario = %s
-            """, (id,))
-            attrs = db.fetchall()
-            user["atributos"] = {a["atributo"]: a["valor"] for a in attrs}
+            user["atributos"] = cargar_atributos(db, [id]).get(id, {})
 
         return jsonify(user), 200
 
@@ -94,11 +93,17 @@ def eliminar_usuario(id):
                 "DELETE FROM relacionusuariomaster WHERE idUsuario = %s",
                 "DELETE FROM alumno WHERE idUsuario = %s",
                 "DELETE FROM valores_atributos WHERE idUsuario = %s",
+                "DELETE FROM atributos_busqueda WHERE idUsuario = %s",
+                "DELETE FROM usuario_trigramas WHERE idUsuario = %s",
                 "DELETE FROM usuario_historial WHERE idUsuario = %s",
                 "DELETE FROM usuario WHERE idUsuario = %s",
             ]
             for q in queries:
                 db.execute(q, (id,))
+            borrar_resumen(db, id)
+            incrementar_version(
+                db, "usuario", "postulado", "relacionusuariomaster", "alumno", "valores_atributos"
+            )
 
         # Si arribem aquí, el commit ja s'ha fet
         return jsonify({"mensaje": "Usuario eliminado correctamente"}), 200
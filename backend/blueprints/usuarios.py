@@ -2,17 +2,48 @@
 from flask import Blueprint, request, jsonify
 from backend.utils.db_session import DBSession
 from backend.utils.auth_middleware import login_required
-from backend.utils.query_helpers import (
-    aplicar_filtros_basicos,
-    aplicar_filtros_atributos,
-    cargar_atributos,
+from backend.utils.simple_cache import obtener_o_calcular, clave_generacional
+from backend.utils.busqueda import (
+    indexar_atributos_usuario,
+    indexar_trigramas_usuario,
+    normalizar_telefono,
+    normalizar_mail,
+    buscar_duplicado,
+)
+from backend.utils.query_helpers import normalizar_params, obtener_catalogo_atributos
+from backend.utils.resumen import refrescar_resumen
+from backend.utils.versiones import (
+    con_etag,
+    incrementar_version,
+    obtener_versiones,
+    TABLAS_CONTACTOS,
+)
+from backend.utils.query_compiler import compilar, ejecutar_plantilla
+from backend.utils.listados import (
+    LISTADOS,
+    CLAVES_PRESENTACION,
+    filtros_listado,
+    responder_listado,
 )
 
 usuarios_bp = Blueprint("usuarios_bp", __name__, url_prefix="/api")
 
+# Facetes del sidebar: nom → (expressió agrupada, joins que necessita)
+FACETAS_USUARIOS = {
+    "estado":     ("u.estado",     ()),
+    "master":     ("m.nomMaster",  ("master",)),
+    "edicion":    ("m.edicio",     ("master",)),
+    "interes":    ("m2.nomMaster", ("interes",)),
+    "publicidad": ("u.publicidad", ()),
+}
+
+FACETAS_CACHE_TTL = 60
+FACETAS_CACHE_STALE = 60
+
 
 @usuarios_bp.route("/usuarios", methods=["GET"])
 @login_required
+@con_etag(*TABLAS_CONTACTOS)
 def listar_usuarios():
     """
     Lista todos los usuarios (alumnos + postulados + otros) con:
@@ -20,75 +51,106 @@ def listar_usuarios():
       - intereses (postulado)
       - filtros básicos + dinámicos (atributos)
       - atributos dinámicos en 'atributos'
+      - paginación opcional: ?limit=N&cursor=... devuelve
+        {items, next_cursor} en vez de la lista completa
+      - con 'Accept: application/x-ndjson' se devuelve en streaming,
+        una fila JSON por línea
+      - ?fields=id,nombre,mail limita las columnas (y se omiten los
+        JOINs y la carga de atributos que no hagan falta)
     """
     try:
-        params = request.args.to_dict()
-
-        mapa = {
-            "nombre": "u.nombreUsuario LIKE %s",
-            "telefono": "u.telefon LIKE %s",
-            "mail":    "u.mail LIKE %s",
-            "master":  "m.nomMaster = %s",
-            "edicion": "m.edicio = %s",
-            "interes_master": "m2.nomMaster = %s",
-            "estado": "u.estado = %s",
-            "publicidad": "u.publicidad = %s",
-        }
-
-        filtros, valores = aplicar_filtros_basicos(params, mapa)
-        filtros, valores = aplicar_filtros_atributos(
-            params,
-            filtros,
-            valores,
-            claves_reservadas=set(mapa.keys()),
-        )
+        return responder_listado("usuarios", request.args.to_dict())
 
-        query = """
-            SELECT 
-                u.idUsuario AS id,
-                u.nombreUsuario AS nombre,
-                u.mail,
-                u.telefon AS telefono,
-                u.estado,
-                GROUP_CONCAT(DISTINCT m.nomMaster SEPARATOR ', ')  AS masters,
-                GROUP_CONCAT(DISTINCT m2.nomMaster SEPARATOR ', ') AS intereses
-            FROM usuario u
-            LEFT JOIN relacionusuariomaster rum ON rum.idUsuario = u.idUsuario
-            LEFT JOIN master m                  ON m.idMaster   = rum.idMaster
-            LEFT JOIN postulado p               ON p.idUsuario  = u.idUsuario
-            LEFT JOIN master m2                 ON m2.idMaster  = p.idInteresMaster
-            WHERE 1 = 1
-        """
-
-        if filtros:
-            query += " AND " + " AND ".join(filtros)
-
-        query += """
-            GROUP BY u.idUsuario, u.nombreUsuario, u.mail, u.telefon, u.estado
-            ORDER BY u.nombreUsuario ASC
-        """
-
-        with DBSession() as db:
-            db.execute(query, valores)
-            rows = db.fetchall()
-
-            if not rows:
-                return jsonify([]), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("❌ ERROR /usuarios GET:", e)
+        return jsonify({"error": str(e)}), 500
 
-            ids = [r["id"] for r in rows]
-            attrs = cargar_atributos(db, ids)
 
-            for r in rows:
-                r["atributos"] = attrs.get(r["id"], {})
 
-        return jsonify(rows), 200
+@usuarios_bp.route("/usuarios/facets", methods=["GET"])
+@login_required
+@con_etag(*TABLAS_CONTACTOS)
+def facetas_usuarios():
+    """
+    Recuentos agrupados para el sidebar de filtros (estado, master, edicion,
+    interes, publicidad) con los mismos parámetros que GET /usuarios.
+    Cada faceta es un único COUNT(DISTINCT) agrupado y solo hace los JOINs
+    que necesitan la faceta y los filtros activos.
+    El resultado se cachea por conjunto de filtros normalizado.
+    """
+    try:
+        params = request.args.to_dict()
+        # Les versions de dades a la clau: una escriptura invalida les facetes
+        cache_key = clave_generacional("listados", "facetas:usuarios:%r:%r" % (
+            normalizar_params(params, ignorar=CLAVES_PRESENTACION),
+            tuple(sorted(obtener_versiones(TABLAS_CONTACTOS).items())),
+        ))
+        # Les facetes agrupen per màster/edició: sempre sobre les taules base
+        spec = LISTADOS["usuarios"]
+        filtros, valores, joins_filtros = filtros_listado("usuarios", params, spec=spec)
+        joins_sql = spec["joins"]
+
+        def construir(select_expr, joins, group_by=""):
+            # La plantilla compilada depèn només de la forma dels filtres
+            query = f"""
+                SELECT {select_expr}
+                FROM usuario u
+                {"".join(sql for nombre, sql in joins_sql.items() if nombre in joins)}
+                WHERE 1 = 1
+            """
+            if filtros:
+                query += " AND " + " AND ".join(filtros)
+            return compilar(query + group_by)
+
+        def calcular():
+            resultado = {}
+
+            with DBSession() as db:
+                cur = ejecutar_plantilla(
+                    db,
+                    construir("COUNT(DISTINCT u.idUsuario) AS total", joins_filtros),
+                    valores,
+                )
+                resultado["total"] = cur.fetchall()[0]["total"]
+
+                for nombre, (expr, joins) in FACETAS_USUARIOS.items():
+                    cur = ejecutar_plantilla(
+                        db,
+                        construir(
+                            f"{expr} AS valor, COUNT(DISTINCT u.idUsuario) AS total",
+                            joins_filtros | set(joins),
+                            f" GROUP BY {expr} ORDER BY total DESC, valor ASC",
+                        ),
+                        valores,
+                    )
+                    resultado[nombre] = [
+                        {"valor": r["valor"], "total": r["total"]}
+                        for r in cur.fetchall()
+                        if r["valor"] is not None
+                    ]
+
+            return resultado
+
+        # Peticions simultànies comparteixen el càlcul; en caducar es serveix
+        # l'anterior mentre es refà en segon pla
+        resultado = obtener_o_calcular(
+            cache_key,
+            calcular,
+            ttl_seconds=FACETAS_CACHE_TTL,
+            stale_seconds=FACETAS_CACHE_STALE,
+            metrica="facetas_usuarios",
+        )
+        return jsonify(resultado), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print("❌ ERROR /usuarios GET:", e)
+        print("❌ ERROR /usuarios/facets GET:", e)
         return jsonify({"error": str(e)}), 500
 
 
-
 # CREAR USUARIO GENÉRICO
 @usuarios_bp.route("/usuarios", methods=["POST"])
 @login_required
@@ -112,16 +174,29 @@ def crear_usuario():
             return jsonify({"error": "Falta el nombre"}), 400
 
         with DBSession() as db:
+            # Possible duplicat (cerca per índex a mail_norm / telefono_norm)
+            duplicado = buscar_duplicado(db, mail, telefono)
+
             db.execute(
                 """
-                INSERT INTO usuario (nombreUsuario, mail, telefon, estado)
-                VALUES (%s, %s, %s, %s)
+                INSERT INTO usuario (nombreUsuario, mail, telefon, estado,
+                                     telefono_norm, mail_norm)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """,
-                (nombre, mail, telefono, estado),
+                (nombre, mail, telefono, estado,
+                 normalizar_telefono(telefono), normalizar_mail(mail)),
             )
             id_usuario = db.lastrowid
 
-        return jsonify({"mensaje": "Usuario creado correctamente", "id": id_usuario}), 201
+            indexar_trigramas_usuario(db, id_usuario, nombre, mail, telefono)
+            refrescar_resumen(db, [id_usuario])
+            incrementar_version(db, "usuario")
+
+        return jsonify({
+            "mensaje": "Usuario creado correctamente",
+            "id": id_usuario,
+            "duplicado_de": duplicado,
+        }), 201
 
     except Exception as e:
         print("❌ ERROR /usuarios POST:", e)
@@ -170,11 +245,15 @@ def editar_usuario(id_usuario):
                 SET nombreUsuario = %s,
                     mail          = %s,
                     telefon       = %s,
-                    publicidad    = %s
+                    publicidad    = %s,
+                    telefono_norm = %s,
+                    mail_norm     = %s
                 WHERE idUsuario = %s
                 """,
-                (nombre, mail, telefono,data.get("publicidad", 1), id_usuario),
+                (nombre, mail, telefono,data.get("publicidad", 1),
+                 normalizar_telefono(telefono), normalizar_mail(mail), id_usuario),
             )
+            indexar_trigramas_usuario(db, id_usuario, nombre, mail, telefono)
 
             # Atributos dinámicos: borro y re-inserto
             db.execute(
@@ -182,16 +261,21 @@ def editar_usuario(id_usuario):
                 (id_usuario,),
             )
 
+            insertados = {}
             if atributos:
-                db.execute("SELECT idAtributo, nombre FROM atributos")
-                filas_attr = db.fetchall()
-                mapa_attr = {f["nombre"]: f["idAtributo"] for f in filas_attr}
+                mapa_attr = obtener_catalogo_atributos(db)["por_nombre"]
+                recargado = False
 
                 for nombre_attr, valor in atributos.items():
                     valor = (valor or "").strip()
                     if not valor:
                         continue
                     id_attr = mapa_attr.get(nombre_attr)
+                    if not id_attr and not recargado:
+                        # pot ser un atribut creat des d'un altre worker
+                        recargado = True
+                        mapa_attr = obtener_catalogo_atributos(db, recargar=True)["por_nombre"]
+                        id_attr = mapa_attr.get(nombre_attr)
                     if not id_attr:
                         # si no existe el atributo, lo ignoramos
                         continue
@@ -203,6 +287,12 @@ def editar_usuario(id_usuario):
                         """,
                         (id_usuario, id_attr, valor),
                     )
+                    insertados[id_attr] = valor
+
+            # Índex de cerca d'atributs (mateixa transacció)
+            indexar_atributos_usuario(db, id_usuario, insertados)
+            refrescar_resumen(db, [id_usuario])
+            incrementar_version(db, "usuario", "valores_atributos")
 
         return jsonify({"mensaje": "Usuario actualizado correctamente"}), 200
 
@@ -0,0 +1,98 @@
+# backend/cli.py
+import click
+from flask import current_app
+from backend.utils.db_session import DBSession
+from backend.utils.busqueda import (
+    reconstruir_indice_atributos,
+    reconstruir_indice_trigramas,
+    rellenar_claves_normalizadas,
+)
+from backend.utils.migraciones import aplicar_migraciones, estado_migraciones
+from backend.utils.resumen import reconstruir_resumen
+from backend.utils.simple_cache import invalidar
+
+
+def registrar_comandos(app):
+    """
+    Comandes de manteniment (flask --app run <comanda>).
+    """
+
+    @app.cli.command("reindexar-atributos")
+    def reindexar_atributos():
+        """Reconstrueix l'índex de cerca d'atributs (atributos_busqueda)."""
+        with DBSession() as db:
+            total = reconstruir_indice_atributos(db)
+        click.echo(f"Valores de atributos indexados: {total}")
+
+    @app.cli.command("reindexar-trigramas")
+    def reindexar_trigramas():
+        """Reconstrueix l'índex de trigrames de nom/mail/telèfon (usuario_trigramas)."""
+        with DBSession() as db:
+            total = reconstruir_indice_trigramas(db)
+        click.echo(f"Usuarios indexados: {total}")
+
+    @app.cli.command("normalizar-contactos")
+    def normalizar_contactos():
+        """Omple telefono_norm / mail_norm de tots els usuaris."""
+        with DBSession() as db:
+            total = rellenar_claves_normalizadas(db)
+        click.echo(f"Usuarios normalizados: {total}")
+
+    @app.cli.command("reconstruir-resumen")
+    def reconstruir_resumen_cmd():
+        """Reconstrueix el model de lectura usuario_resumen des de les taules base."""
+        with DBSession() as db:
+            total = reconstruir_resumen(db)
+        click.echo(f"Usuarios en usuario_resumen: {total}")
+
+    @app.cli.command("invalidar-cache")
+    @click.argument("espacios", nargs=-1)
+    def invalidar_cache(espacios):
+        """
+        Invalida espais de la cache (per defecte: listados i referencia).
+        Només arriba als workers amb un backend compartit (CACHE_BACKEND=sqlite).
+        """
+        for espacio in espacios or ("listados", "referencia"):
+            invalidar(espacio)
+            click.echo(f"Espacio invalidado: {espacio}")
+
+    @app.cli.command("migrar")
+    @click.option("--hasta", type=int, default=None, help="Última versió a aplicar.")
+    @click.option("--estado", is_flag=True, help="Només mostra l'estat de les migracions.")
+    def migrar(hasta, estado):
+        """Aplica les migracions pendents de backend/migrations."""
+        if estado:
+            for version, nombre, situacion in estado_migraciones():
+                click.echo(f"{version:04d}_{nombre}: {situacion}")
+            return
+
+        aplicadas = aplicar_migraciones(hasta=hasta)
+        for version, nombre in aplicadas:
+            click.echo(f"Aplicada: {version:04d}_{nombre}")
+        click.echo(f"Migraciones aplicadas: {len(aplicadas)}")
+
+    @app.cli.command("asesor-indices")
+    @click.option("--min-filas", type=int, default=0,
+                  help="Ignora lectures senceres de taules amb menys files estimades.")
+    def asesor_indices(min_filas):
+        """
+        Fa EXPLAIN de les consultes de cada endpoint GET i d'una llista fixa
+        de llistats filtrats (limit + cursor, match=..., facetes, exportació
+        Excel) i marca les lectures senceres (type ALL / index). Amb
+        BUSQUEDA_TRIGRAMAS=1 s'hi inclou el prefiltre de trigrames.
+        """
+        from backend.utils.asesor_indices import analizar_consultas, capturar_consultas_endpoints
+
+        muestras, estados = capturar_consultas_endpoints(current_app._get_current_object())
+        for peticion, status in sorted(estados.items()):
+            if status >= 400:
+                click.echo(f"⚠ {peticion}: HTTP {status}")
+
+        hallazgos = analizar_consultas(muestras, min_filas=min_filas)
+        for h in hallazgos:
+            click.echo(
+                f"[{h['tipo']}] {h['endpoint']} tabla={h['tabla']} filas={h['filas']} "
+                f"posibles={h['posibles']} key={h['key']} extra={h['extra']}\n"
+                f"    {h['huella']} {h['sql'][:300]}"
+            )
+        click.echo(f"Consultas analizadas: {len(muestras)} — lecturas completas: {len(hallazgos)}")
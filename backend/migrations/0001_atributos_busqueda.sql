@@ -0,0 +1,16 @@
+-- Índex de cerca d'atributs dinàmics (backend/utils/busqueda.py)
+--
+-- Per cada valor de valores_atributos es guarda:
+--   - una fila completo = 1 amb el valor sencer normalitzat (filtres exact/prefix)
+--   - una fila completo = 0 per cada paraula normalitzada (filtre words)
+-- Els valors ja arriben normalitzats (minúscules, sense accents), per això
+-- la columna token és binària.
+
+CREATE TABLE IF NOT EXISTS atributos_busqueda (
+    idAtributo INT          NOT NULL,
+    completo   TINYINT(1)   NOT NULL DEFAULT 0,
+    token      VARCHAR(191) NOT NULL,
+    idUsuario  INT          NOT NULL,
+    PRIMARY KEY (idAtributo, completo, token, idUsuario),
+    KEY idx_atributos_busqueda_usuario (idUsuario)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
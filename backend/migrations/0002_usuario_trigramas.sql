@@ -0,0 +1,13 @@
+-- Índex de trigrames per a les cerques de text (backend/utils/busqueda.py)
+--
+-- Una fila per cada trigrama normalitzat (minúscules, sense accents) de
+-- nombreUsuario (campo = 1), mail (campo = 2) i telefon (campo = 3).
+-- Els filtres LIKE '%valor%' primer resolen els candidats per aquí.
+
+CREATE TABLE IF NOT EXISTS usuario_trigramas (
+    campo     TINYINT     NOT NULL,
+    trigrama  VARCHAR(3)  NOT NULL,
+    idUsuario INT         NOT NULL,
+    PRIMARY KEY (campo, trigrama, idUsuario),
+    KEY idx_usuario_trigramas_usuario (idUsuario)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
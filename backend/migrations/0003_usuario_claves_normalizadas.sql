@@ -0,0 +1,20 @@
+-- Claus normalitzades de contacte (backend/utils/busqueda.py)
+--
+--   telefono_norm: només dígits, sense prefix internacional d'Espanya
+--                  ("+34 600-12-34-56" → "600123456")
+--   mail_norm:     mail en minúscules i sense espais
+--
+-- S'omplen a cada INSERT/UPDATE de 'usuario'; per a les files existents:
+--   flask --app run normalizar-contactos
+
+--
+-- Una clàusula per sentència: si una ja existeix (error 1060/1061) es pot
+-- saltar sense deixar les altres per aplicar.
+
+ALTER TABLE usuario ADD COLUMN telefono_norm VARCHAR(32) NULL;
+
+ALTER TABLE usuario ADD COLUMN mail_norm VARCHAR(191) NULL;
+
+ALTER TABLE usuario ADD INDEX idx_usuario_telefono_norm (telefono_norm);
+
+ALTER TABLE usuario ADD INDEX idx_usuario_mail_norm (mail_norm);
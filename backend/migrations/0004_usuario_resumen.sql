@@ -0,0 +1,31 @@
+-- Model de lectura desnormalitzat dels contactes (backend/utils/resumen.py)
+--
+-- Una fila per usuari amb els masters, interessos, edicions i atributs ja
+-- calculats. El mantenen els endpoints d'escriptura; per reconstruir-lo:
+--   flask --app run reconstruir-resumen
+-- Els llistats el fan servir amb LISTADOS_DESDE_RESUMEN=1.
+
+CREATE TABLE IF NOT EXISTS usuario_resumen (
+    idUsuario         INT          NOT NULL,
+    nombreUsuario     VARCHAR(255) NOT NULL,
+    mail              VARCHAR(255) NULL,
+    telefon           VARCHAR(64)  NULL,
+    estado            VARCHAR(32)  NULL,
+    publicidad        TINYINT      NULL,
+    telefono_norm     VARCHAR(32)  NULL,
+    mail_norm         VARCHAR(191) NULL,
+    masters           TEXT         NULL,  -- nomMaster cursats
+    masters_ediciones TEXT         NULL,  -- "nomMaster — edicio" cursats
+    ediciones         TEXT         NULL,  -- edicions cursades
+    intereses         TEXT         NULL,  -- nomMaster d'interès (postulado)
+    es_postulado      TINYINT(1)   NOT NULL DEFAULT 0,
+    atributos         JSON         NULL,  -- { nombreAtributo: valor }
+    actualizado       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+                                   ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (idUsuario),
+    KEY idx_usuario_resumen_nombre (nombreUsuario, idUsuario),
+    KEY idx_usuario_resumen_estado (estado, nombreUsuario, idUsuario),
+    KEY idx_usuario_resumen_postulado (es_postulado, nombreUsuario, idUsuario),
+    KEY idx_usuario_resumen_telefono_norm (telefono_norm),
+    KEY idx_usuario_resumen_mail_norm (mail_norm)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,39 @@
+-- Comptadors de versió per taula (backend/utils/versiones.py)
+--
+-- Cada endpoint d'escriptura incrementa la versió de les taules que toca
+-- (incrementar_version) dins la seva transacció. Els GET amb ETag combinen
+-- aquestes versions amb els paràmetres de la petició.
+
+CREATE TABLE IF NOT EXISTS versiones_datos (
+    tabla   VARCHAR(64)     NOT NULL,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (tabla)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO versiones_datos (tabla, version) VALUES
+    ('usuario', 0),
+    ('valores_atributos', 0),
+    ('relacionusuariomaster', 0),
+    ('postulado', 0),
+    ('alumno', 0),
+    ('atributos', 0),
+    ('master', 0),
+    ('firmas_email', 0);
+
+-- La taula 'master' no té endpoints d'escriptura (es manté des de fora de
+-- l'API): els triggers n'incrementen la versió igualment.
+DROP TRIGGER IF EXISTS trg_master_version_ins;
+DROP TRIGGER IF EXISTS trg_master_version_upd;
+DROP TRIGGER IF EXISTS trg_master_version_del;
+
+CREATE TRIGGER trg_master_version_ins AFTER INSERT ON master FOR EACH ROW
+    INSERT INTO versiones_datos (tabla, version) VALUES ('master', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
+
+CREATE TRIGGER trg_master_version_upd AFTER UPDATE ON master FOR EACH ROW
+    INSERT INTO versiones_datos (tabla, version) VALUES ('master', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
+
+CREATE TRIGGER trg_master_version_del AFTER DELETE ON master FOR EACH ROW
+    INSERT INTO versiones_datos (tabla, version) VALUES ('master', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1;
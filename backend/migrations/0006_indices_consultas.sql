@@ -0,0 +1,45 @@
+-- Índexs de les consultes dels blueprints sobre les taules base
+--
+--   valores_atributos(idUsuario, idAtributo)   atributs per usuari (cargar_atributos,
+--                                              resum, filtres EXISTS d'atributs)
+--   postulado(idUsuario, idInteresMaster)       EXISTS d'interès, alta / baixa de postulats
+--   postulado(idInteresMaster, idUsuario)       filtre per màster d'interès
+--   relacionusuariomaster(idUsuario, idMaster)  màsters cursats per usuari, matrícula
+--   relacionusuariomaster(idMaster, idUsuario)  filtre per màster / edició
+--   usuario(nombreUsuario, idUsuario)           ordre i paginació per cursor dels llistats
+--   usuario(estado, nombreUsuario, idUsuario)   llistat d'alumnes
+--   usuario_historial(idUsuario, fecha)         historial d'un usuari (ORDER BY fecha DESC)
+--   comentarios_perfil(idUsuario, fecha)        comentaris d'un usuari (ORDER BY fecha DESC)
+--   preset_filtros(idUsuarioSistema)            presets de l'usuari del sistema
+--
+-- Per comprovar els plans: flask --app run asesor-indices
+
+ALTER TABLE valores_atributos
+    ADD INDEX idx_valores_atributos_usuario_atributo (idUsuario, idAtributo);
+
+ALTER TABLE postulado
+    ADD INDEX idx_postulado_usuario_interes (idUsuario, idInteresMaster);
+
+ALTER TABLE postulado
+    ADD INDEX idx_postulado_interes_usuario (idInteresMaster, idUsuario);
+
+ALTER TABLE relacionusuariomaster
+    ADD INDEX idx_rum_usuario_master (idUsuario, idMaster);
+
+ALTER TABLE relacionusuariomaster
+    ADD INDEX idx_rum_master_usuario (idMaster, idUsuario);
+
+ALTER TABLE usuario
+    ADD INDEX idx_usuario_nombre (nombreUsuario, idUsuario);
+
+ALTER TABLE usuario
+    ADD INDEX idx_usuario_estado_nombre (estado, nombreUsuario, idUsuario);
+
+ALTER TABLE usuario_historial
+    ADD INDEX idx_usuario_historial_usuario_fecha (idUsuario, fecha);
+
+ALTER TABLE comentarios_perfil
+    ADD INDEX idx_comentarios_perfil_usuario_fecha (idUsuario, fecha);
+
+ALTER TABLE preset_filtros
+    ADD INDEX idx_preset_filtros_usuario_sistema (idUsuarioSistema);
@@ -0,0 +1,192 @@
+# backend/utils/asesor_indices.py
+import logging
+import time
+from urllib.parse import urlencode
+
+import jwt
+from flask import current_app
+
+from backend.utils.consultas import capturar_consultas, huella_sql
+from backend.utils.db_session import DBSession
+from backend.utils.query_helpers import codificar_cursor
+from backend.utils.referencia import obtener_referencia
+from backend.utils.simple_cache import sin_cache
+
+logger = logging.getLogger("crm.asesor")
+
+# ---------------------------------------------------------
+# Assessor d'índexs
+# ---------------------------------------------------------
+# Crida cada endpoint GET de l'app i una llista fixa de peticions
+# representatives dels llistats (filtres, limit + cursor, match=exact /
+# prefix / words, facetes i POST /api/exportar/excel) amb el client de
+# proves (token d'admin temporal, sense cache perquè les consultes
+# s'executin), captura una mostra de cada consulta
+# (backend/utils/consultas.py) i en fa EXPLAIN. Els valors dels filtres
+# surten d'un contacte i un atribut reals. El prefiltre de trigrames només
+# apareix si el procés corre amb BUSQUEDA_TRIGRAMAS=1.
+# Marca les files del pla amb type = ALL (lectura sencera de la taula) o
+# index (lectura sencera d'un índex).
+ENDPOINTS_EXCLUIDOS = {"static", "health", "metricas_bp.obtener_metricas"}
+TIPOS_SOSPECHOSOS = {"ALL", "index"}
+
+
+def _token_admin():
+    with DBSession() as db:
+        db.execute("SELECT MIN(idUsuarioSistema) AS id FROM usuario_sistema")
+        fila = db.fetchone()
+    payload = {
+        "id": fila["id"] if fila else 0,
+        "username": "asesor-indices",
+        "rol": "admin",
+        "exp": int(time.time()) + 600,
+    }
+    return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
+
+
+def _ejemplos():
+    """Contacte i valor d'atribut reals per omplir els filtres."""
+    with DBSession() as db:
+        db.execute("""
+            SELECT idUsuario AS id, nombreUsuario AS nombre, mail, telefon
+            FROM usuario
+            ORDER BY idUsuario
+            LIMIT 1
+        """)
+        usuario = db.fetchone() or {}
+        db.execute("""
+            SELECT a.nombre, va.valor
+            FROM valores_atributos va
+            JOIN atributos a ON a.idAtributo = va.idAtributo
+            WHERE va.valor <> ''
+            LIMIT 1
+        """)
+        atributo = db.fetchone()
+    return usuario, atributo
+
+
+def _fragmento(texto, longitud=4):
+    texto = str(texto or "").strip()
+    return texto[:longitud] or "a"
+
+
+def peticiones_representativas(usuario, atributo):
+    """
+    [(metodo, url, cuerpo_json)] de les consultes calentes dels llistats.
+    'usuario' i 'atributo' (de _ejemplos) donen valors que existeixen.
+    """
+    nombre = _fragmento(usuario.get("nombre"))
+    mail = _fragmento(usuario.get("mail"), 6)
+    telefono = _fragmento(usuario.get("telefon"), 6)
+    cursor = codificar_cursor(usuario.get("nombre"), usuario.get("id") or 0)
+
+    consultas = [
+        {"nombre": nombre},
+        {"nombre": nombre, "limit": 50},
+        {"limit": 50, "cursor": cursor},
+        {"mail": mail, "match": "prefix", "limit": 50},
+        {"mail": usuario.get("mail") or mail, "match": "exact"},
+        {"telefono": telefono, "match": "prefix"},
+    ]
+    filtros_atributos = []
+    if atributo:
+        clave, valor = atributo["nombre"], atributo["valor"]
+        palabra = _fragmento((valor.split() or [valor])[0])
+        consultas += [
+            {clave: _fragmento(valor)},
+            {clave: valor, "match": "exact", "limit": 50},
+            {clave: _fragmento(valor), "match": "prefix", "limit": 50},
+            {clave: palabra, "match": "words", "limit": 50},
+        ]
+        filtros_atributos = [{"nombre": clave, "valor": palabra, "match": "words"}]
+
+    peticiones = []
+    for ruta in ("/api/usuarios", "/api/alumnos", "/api/postulados"):
+        for params in consultas:
+            peticiones.append(("GET", f"{ruta}?{urlencode(params)}", None))
+    peticiones.append(("GET", "/api/usuarios?" + urlencode({"estado": "alumno", "limit": 50}), None))
+    peticiones.append(("GET", "/api/usuarios/facets?" + urlencode({"nombre": nombre}), None))
+
+    for tipo in ("usuarios", "alumnos", "potenciales"):
+        peticiones.append(("POST", "/api/exportar/excel", {
+            "tipo": tipo,
+            "filtros": {"nombre": nombre},
+            "filtrosAtributos": filtros_atributos,
+            "columnas": ["id", "nombre", "mail", "telefono"],
+        }))
+    return peticiones
+
+
+def urls_get(app, id_ejemplo):
+    """[(endpoint, url)] de les rutes GET (els paràmetres enters → id_ejemplo)."""
+    adaptador = app.url_map.bind("localhost")
+    urls = []
+    for regla in app.url_map.iter_rules():
+        if "GET" not in regla.methods or regla.endpoint in ENDPOINTS_EXCLUIDOS:
+            continue
+        valores = {arg: id_ejemplo for arg in regla.arguments}
+        urls.append((regla.endpoint, adaptador.build(regla.endpoint, valores)))
+    return sorted(urls)
+
+
+def capturar_consultas_endpoints(app):
+    """
+    Executa cada endpoint GET (sense paràmetres) i les peticions
+    representatives, i retorna ({huella: (sql, params, endpoint)},
+    {"METODE url": status}).
+    La cache es desactiva només en aquest procés (sin_cache): invalidar-la
+    amb el backend sqlite buidaria la dels workers en producció.
+    """
+    token = _token_admin()
+    cabeceras = {"Authorization": f"Bearer {token}"}
+    cliente = app.test_client()
+    estados = {}
+
+    usuario, atributo = _ejemplos()
+    peticiones = [("GET", url, None) for _, url in urls_get(app, usuario.get("id") or 1)]
+    peticiones += peticiones_representativas(usuario, atributo)
+
+    with sin_cache(), capturar_consultas() as muestras:
+        for metodo, url, cuerpo in peticiones:
+            obtener_referencia(recargar=True)
+            respuesta = cliente.open(url, method=metodo, json=cuerpo, headers=cabeceras)
+            etiqueta = f"{metodo} {url}" + (f" tipo={cuerpo['tipo']}" if cuerpo else "")
+            estados[etiqueta] = respuesta.status_code
+    return muestras, estados
+
+
+def analizar_consultas(muestras, min_filas=0):
+    """
+    EXPLAIN de cada SELECT capturada. Retorna una llista de hallazgos:
+    {"endpoint", "huella", "sql", "tabla", "tipo", "filas", "posibles", "key", "extra"}.
+    """
+    hallazgos = []
+    with DBSession() as db:
+        for huella, (sql, params, endpoint) in sorted(muestras.items(), key=lambda kv: kv[1][2] or ""):
+            normalizado, _ = huella_sql(sql)
+            if not normalizado.lstrip("( ").upper().startswith("SELECT"):
+                continue
+            try:
+                db.execute("EXPLAIN " + sql, params)
+                plan = db.fetchall()
+            except Exception as e:
+                logger.error("Error en EXPLAIN %s (%s): %s", huella, endpoint, e)
+                continue
+
+            for fila in plan:
+                if fila.get("type") not in TIPOS_SOSPECHOSOS:
+                    continue
+                if (fila.get("rows") or 0) < min_filas:
+                    continue
+                hallazgos.append({
+                    "endpoint": endpoint,
+                    "huella": huella,
+                    "sql": normalizado,
+                    "tabla": fila.get("table"),
+                    "tipo": fila.get("type"),
+                    "filas": fila.get("rows"),
+                    "posibles": fila.get("possible_keys"),
+                    "key": fila.get("key"),
+                    "extra": fila.get("Extra"),
+                })
+    return hallazgos
@@ -0,0 +1,408 @@
+# backend/utils/busqueda.py
+import os
+import re
+import unicodedata
+
+# ---------------------------------------------------------
+# Modes de coincidència per als filtres (?match=...)
+# ---------------------------------------------------------
+#   exact    → valor sencer igual (sense majúscules/accents)   → seek per índex
+#   prefix   → el valor comença per...                          → seek per rang
+#   words    → cada paraula buscada és l'inici d'una paraula    → seek per paraula
+#              ("mad" troba "Madrid", no "Ámsterdam"; per a subcadenes
+#              arbitràries, sense 'match')
+# Sense 'match' es manté el LIKE '%valor%' de sempre.
+MODOS_COINCIDENCIA = ("exact", "prefix", "words")
+
+LONGITUD_TOKEN = 191
+
+
+def normalizar_texto(texto):
+    """Minúscules, sense accents i amb els espais compactats."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def tokenizar(texto):
+    """Paraules normalitzades (sense repetir) d'un text."""
+    return list(dict.fromkeys(re.findall(r"\w+", normalizar_texto(texto))))
+
+
+def escapar_like(valor):
+    """Escapa els comodins de LIKE perquè el valor es compari literalment."""
+    return valor.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def parsear_modo(raw):
+    """
+    Valida el paràmetre 'match'. Retorna None (mode clàssic) o un dels
+    MODOS_COINCIDENCIA. Llença ValueError si no és vàlid.
+    """
+    modo = (raw or "").strip().lower()
+    if not modo:
+        return None
+    if modo not in MODOS_COINCIDENCIA:
+        raise ValueError(f"'match' debe ser uno de: {', '.join(MODOS_COINCIDENCIA)}")
+    return modo
+
+
+# ---------------------------------------------------------
+# Índex d'atributs (taula atributos_busqueda)
+# ---------------------------------------------------------
+def condicion_atributo_indexada(nombre_attr, valor, modo, base_alias="u"):
+    """
+    Retorna (condiciones, valores) per filtrar l'atribut 'nombre_attr'
+    a través de atributos_busqueda en comptes de valores_atributos.valor LIKE.
+    Els tokens es guarden truncats a LONGITUD_TOKEN: amb un valor més llarg
+    l'índex només dona candidats i es verifica sobre valores_atributos.valor.
+    """
+    sub_attr = "(SELECT idAtributo FROM atributos WHERE nombre = %s)"
+    completo = normalizar_texto(valor)
+    norm = completo[:LONGITUD_TOKEN]
+
+    if modo in ("exact", "prefix"):
+        comparacion = "ab.token = %s" if modo == "exact" else "ab.token LIKE %s"
+        patron = norm if modo == "exact" else escapar_like(norm) + "%"
+        cond = f"""
+            {base_alias}.idUsuario IN (
+                SELECT ab.idUsuario
+                FROM atributos_busqueda ab
+                WHERE ab.idAtributo = {sub_attr}
+                  AND ab.completo = 1
+                  AND {comparacion}
+            )
+        """
+        condiciones, valores = [cond], [nombre_attr, patron]
+
+        if len(completo) > LONGITUD_TOKEN:
+            comparacion = "va.valor = %s" if modo == "exact" else "va.valor LIKE %s"
+            patron = completo if modo == "exact" else escapar_like(completo) + "%"
+            condiciones.append(f"""
+                EXISTS (
+                    SELECT 1
+                    FROM valores_atributos va
+                    WHERE va.idUsuario = {base_alias}.idUsuario
+                      AND va.idAtributo = {sub_attr}
+                      AND {comparacion}
+                )
+            """)
+            valores.extend([nombre_attr, patron])
+        return condiciones, valores
+
+    # words: totes les paraules han de començar alguna paraula del valor
+    condiciones = []
+    valores = []
+    for token in tokenizar(valor):
+        condiciones.append(f"""
+            {base_alias}.idUsuario IN (
+                SELECT ab.idUsuario
+                FROM atributos_busqueda ab
+                WHERE ab.idAtributo = {sub_attr}
+                  AND ab.completo = 0
+                  AND ab.token LIKE %s
+            )
+        """)
+        valores.extend([nombre_attr, escapar_like(token[:LONGITUD_TOKEN]) + "%"])
+    return condiciones, valores
+
+
+def filas_indice_atributo(id_usuario, id_atributo, valor):
+    """Files (idAtributo, completo, token, idUsuario) d'un valor d'atribut."""
+    norm = normalizar_texto(valor)
+    if not norm:
+        return []
+
+    filas = [(id_atributo, 1, norm[:LONGITUD_TOKEN], id_usuario)]
+    tokens = {t[:LONGITUD_TOKEN] for t in tokenizar(norm)}
+    filas.extend((id_atributo, 0, t, id_usuario) for t in sorted(tokens))
+    return filas
+
+
+def indexar_atributos_usuario(cursor, id_usuario, valores_por_atributo):
+    """
+    Substitueix l'índex de cerca d'un usuari.
+    valores_por_atributo: { idAtributo: valor }
+    S'ha de cridar dins la mateixa transacció que escriu valores_atributos.
+    """
+    cursor.execute(
+        "DELETE FROM atributos_busqueda WHERE idUsuario = %s",
+        (id_usuario,),
+    )
+
+    filas = []
+    for id_atributo, valor in valores_por_atributo.items():
+        filas.extend(filas_indice_atributo(id_usuario, id_atributo, valor))
+
+    if filas:
+        cursor.executemany(
+            """
+            INSERT IGNORE INTO atributos_busqueda (idAtributo, completo, token, idUsuario)
+            VALUES (%s, %s, %s, %s)
+            """,
+            filas,
+        )
+
+
+def reconstruir_indice_atributos(cursor, tamano_lote=1000):
+    """
+    Reconstrueix atributos_busqueda sencer a partir de valores_atributos.
+    Retorna el nombre de valors indexats.
+    """
+    cursor.execute("DELETE FROM atributos_busqueda")
+    cursor.execute("SELECT idUsuario, idAtributo, valor FROM valores_atributos")
+    valores = cursor.fetchall()
+
+    total = 0
+    for i in range(0, len(valores), tamano_lote):
+        filas = []
+        for row in valores[i:i + tamano_lote]:
+            filas.extend(filas_indice_atributo(row["idUsuario"], row["idAtributo"], row["valor"]))
+            total += 1
+        if filas:
+            cursor.executemany(
+                """
+                INSERT IGNORE INTO atributos_busqueda (idAtributo, completo, token, idUsuario)
+                VALUES (%s, %s, %s, %s)
+                """,
+                filas,
+            )
+
+    return total
+
+
+# ---------------------------------------------------------
+# Índex de trigrames (taula usuario_trigramas)
+# ---------------------------------------------------------
+# Columna de 'usuario' → codi de camp a usuario_trigramas
+CAMPOS_TRIGRAMA = {
+    "nombreUsuario": 1,
+    "mail": 2,
+    "telefon": 3,
+}
+
+# Amb més trigrames la intersecció ja és prou selectiva i el GROUP BY creix
+MAX_TRIGRAMAS_CONSULTA = 8
+
+# El prefiltre només és correcte si l'índex cobreix tots els usuaris: cal
+# haver executat 'flask reindexar-trigramas' i que totes les escriptures a
+# 'usuario' passin pels endpoints que l'actualitzen (no importacions ni SQL
+# manual). Per això és opt-in: BUSQUEDA_TRIGRAMAS=1.
+TRIGRAMAS_ACTIVOS = os.getenv("BUSQUEDA_TRIGRAMAS", "0") == "1"
+
+
+def trigramas(texto):
+    """Trigrames (sense repetir) del text normalitzat."""
+    norm = normalizar_texto(texto)
+    return list(dict.fromkeys(norm[i:i + 3] for i in range(len(norm) - 2)))
+
+
+def campo_trigrama(columna):
+    """Codi de camp per 'u.mail', 'mail'... o None si la columna no està indexada."""
+    return CAMPOS_TRIGRAMA.get(columna.split(".")[-1])
+
+
+def condicion_trigramas(campo, valor, base_alias="u"):
+    """
+    Retorna (condiciones, valores) que limiten els candidats als usuaris que
+    tenen tots els trigrames de 'valor' al camp indicat.
+    No substitueix el LIKE (que continua verificant la coincidència exacta),
+    només fa que MySQL no hagi de recórrer tota la taula usuario.
+    Valors de menys de 3 caràcters, o amb TRIGRAMAS_ACTIVOS desactivat, no
+    generen cap condició. El LIKE ha d'escapar el valor (escapar_like):
+    els trigrames el prenen literalment.
+    """
+    if not TRIGRAMAS_ACTIVOS:
+        return [], []
+
+    tris = trigramas(valor)
+    if not tris:
+        return [], []
+
+    if len(tris) > MAX_TRIGRAMAS_CONSULTA:
+        pas = len(tris) / MAX_TRIGRAMAS_CONSULTA
+        tris = [tris[int(i * pas)] for i in range(MAX_TRIGRAMAS_CONSULTA - 1)] + [tris[-1]]
+
+    placeholders = ", ".join(["%s"] * len(tris))
+    cond = f"""
+        {base_alias}.idUsuario IN (
+            SELECT ut.idUsuario
+            FROM usuario_trigramas ut
+            WHERE ut.campo = %s
+              AND ut.trigrama IN ({placeholders})
+            GROUP BY ut.idUsuario
+            HAVING COUNT(DISTINCT ut.trigrama) = %s
+        )
+    """
+    return [cond], [campo, *tris, len(tris)]
+
+
+def filas_trigramas_usuario(id_usuario, nombre, mail, telefono):
+    """Files (campo, trigrama, idUsuario) dels camps de text d'un usuari."""
+    filas = []
+    for columna, texto in (("nombreUsuario", nombre), ("mail", mail), ("telefon", telefono)):
+        campo = CAMPOS_TRIGRAMA[columna]
+        filas.extend((campo, tri, id_usuario) for tri in trigramas(texto))
+    return filas
+
+
+def indexar_trigramas_usuario(cursor, id_usuario, nombre, mail, telefono):
+    """
+    Substitueix els trigrames d'un usuari.
+    S'ha de cridar dins la mateixa transacció que escriu a 'usuario'.
+    """
+    cursor.execute(
+        "DELETE FROM usuario_trigramas WHERE idUsuario = %s",
+        (id_usuario,),
+    )
+
+    filas = filas_trigramas_usuario(id_usuario, nombre, mail, telefono)
+    if filas:
+        cursor.executemany(
+            """
+            INSERT IGNORE INTO usuario_trigramas (campo, trigrama, idUsuario)
+            VALUES (%s, %s, %s)
+            """,
+            filas,
+        )
+
+
+def reconstruir_indice_trigramas(cursor, tamano_lote=1000):
+    """
+    Reconstrueix usuario_trigramas sencer a partir de 'usuario'.
+    Retorna el nombre d'usuaris indexats.
+    """
+    cursor.execute("DELETE FROM usuario_trigramas")
+    cursor.execute("SELECT idUsuario, nombreUsuario, mail, telefon FROM usuario")
+    usuarios = cursor.fetchall()
+
+    for i in range(0, len(usuarios), tamano_lote):
+        filas = []
+        for u in usuarios[i:i + tamano_lote]:
+            filas.extend(filas_trigramas_usuario(
+                u["idUsuario"], u["nombreUsuario"], u["mail"], u["telefon"]
+            ))
+        if filas:
+            cursor.executemany(
+                """
+                INSERT IGNORE INTO usuario_trigramas (campo, trigrama, idUsuario)
+                VALUES (%s, %s, %s)
+                """,
+                filas,
+            )
+
+    return len(usuarios)
+
+
+# ---------------------------------------------------------
+# Claus normalitzades de telèfon i mail (usuario.telefono_norm / mail_norm)
+# ---------------------------------------------------------
+COLUMNAS_NORMALIZADAS = {
+    "telefon": "telefono_norm",
+    "mail": "mail_norm",
+}
+
+
+def normalizar_telefono(telefono):
+    """
+    Només dígits i sense el prefix d'Espanya:
+    "+34 600-12-34-56", "0034600123456" i "600123456" → "600123456".
+    Retorna None si no hi ha cap dígit.
+    """
+    raw = str(telefono or "").strip()
+    digitos = re.sub(r"\D", "", raw)
+    internacional = raw.startswith("+") or digitos.startswith("00")
+
+    if digitos.startswith("00"):
+        digitos = digitos[2:]
+    if digitos.startswith("34") and (internacional or len(digitos) == 11):
+        digitos = digitos[2:]
+
+    return digitos[:32] or None
+
+
+def normalizar_mail(mail):
+    """Mail en minúscules i sense espais. Retorna None si és buit."""
+    return str(mail or "").strip().lower()[:191] or None
+
+
+def condicion_clave_normalizada(columna, valor, modo, base_alias="u"):
+    """
+    Per a telèfon/mail amb modo exact o prefix retorna (condiciones, valores)
+    sobre la columna normalitzada indexada. En qualsevol altre cas retorna
+    None i s'aplica el LIKE '%x%' de sempre.
+    """
+    columna = columna.split(".")[-1]
+    columna_norm = COLUMNAS_NORMALIZADAS.get(columna)
+    if not columna_norm or modo not in ("exact", "prefix"):
+        return None
+
+    if columna == "telefon":
+        norm = normalizar_telefono(valor)
+    else:
+        norm = normalizar_mail(valor)
+    if not norm:
+        return None
+
+    if modo == "exact":
+        return [f"{base_alias}.{columna_norm} = %s"], [norm]
+    return [f"{base_alias}.{columna_norm} LIKE %s"], [escapar_like(norm) + "%"]
+
+
+def buscar_duplicado(cursor, mail, telefono, excluir_id=None):
+    """
+    Retorna l'idUsuario d'un contacte existent amb el mateix mail o telèfon
+    normalitzat (o None). Són dues cerques per índex, no un recorregut.
+    """
+    for columna, norm in (
+        ("mail_norm", normalizar_mail(mail)),
+        ("telefono_norm", normalizar_telefono(telefono)),
+    ):
+        if not norm:
+            continue
+        query = f"SELECT idUsuario FROM usuario WHERE {columna} = %s"
+        valores = [norm]
+        if excluir_id is not None:
+            query += " AND idUsuario <> %s"
+            valores.append(excluir_id)
+        cursor.execute(query + " LIMIT 1", valores)
+        row = cursor.fetchone()
+        if row:
+            return row["idUsuario"]
+    return None
+
+
+def rellenar_claves_normalizadas(cursor, tamano_lote=1000):
+    """
+    Omple telefono_norm / mail_norm de tota la taula 'usuario' per lots
+    (seek per idUsuario). Retorna el nombre d'usuaris actualitzats.
+    """
+    total = 0
+    ultimo_id = 0
+
+    while True:
+        cursor.execute(
+            """
+            SELECT idUsuario, mail, telefon
+            FROM usuario
+            WHERE idUsuario > %s
+            ORDER BY idUsuario
+            LIMIT %s
+            """,
+            (ultimo_id, tamano_lote),
+        )
+        lote = cursor.fetchall()
+        if not lote:
+            break
+
+        cursor.executemany(
+            "UPDATE usuario SET telefono_norm = %s, mail_norm = %s WHERE idUsuario = %s",
+            [
+                (normalizar_telefono(u["telefon"]), normalizar_mail(u["mail"]), u["idUsuario"])
+                for u in lote
+            ],
+        )
+        total += len(lote)
+        ultimo_id = lote[-1]["idUsuario"]
+
+    return total
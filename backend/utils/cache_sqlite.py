@@ -0,0 +1,246 @@
+# backend/utils/cache_sqlite.py
+import logging
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+
+from backend.utils.simple_cache import BackendCache
+
+logger = logging.getLogger("crm.cache")
+
+# ---------------------------------------------------------
+# Backend de cache compartit: fitxer SQLite local
+# ---------------------------------------------------------
+# Tots els workers de gunicorn d'un mateix node obren el mateix fitxer
+# (CACHE_SQLITE_PATH). Els valors es guarden amb pickle i les generacions
+# dels espais viuen en una taula: invalidar() en un worker es veu a la
+# següent lectura de qualsevol altre.
+# WAL permet lectures concurrents amb una escriptura; cada thread (i cada
+# procés, després del fork) obre la seva pròpia connexió.
+#
+# Seguretat: el fitxer conté dades personals i els valors es llegeixen amb
+# pickle (qui pugui escriure-hi pot executar codi a l'app). Per això la ruta
+# s'ha d'indicar explícitament (no hi ha ruta per defecte a /tmp), el
+# directori ha de ser de l'usuari de l'app i no escrivible per altres, i el
+# fitxer (i els -wal / -shm) es creen amb permisos 0600.
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH")
+PURGA_CADA = 200  # escriptures entre purgues de caducades / excedents
+
+
+def _preparar_fichero(ruta):
+    """
+    Comprova que el directori és de l'usuari de l'app i no escrivible per
+    altres, i crea el fitxer amb permisos 0600 (o els hi restringeix).
+    """
+    directorio = os.path.dirname(ruta)
+    info = os.stat(directorio)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{directorio} no pertenece al usuario de la aplicación")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{directorio} es escribible por otros usuarios")
+
+    fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o600)
+    os.close(fd)
+    if hasattr(os, "getuid") and os.stat(ruta).st_uid != os.getuid():
+        raise PermissionError(f"{ruta} no pertenece al usuario de la aplicación")
+    _restringir_permisos(ruta)
+
+
+def _restringir_permisos(ruta):
+    for fichero in (ruta, ruta + "-wal", ruta + "-shm"):
+        if os.path.exists(fichero):
+            os.chmod(fichero, 0o600)
+
+
+class BackendSQLite(BackendCache):
+    """Cache clau → valor (pickle) amb TTL en un fitxer SQLite compartit."""
+
+    def __init__(self, ruta=CACHE_SQLITE_PATH, max_entradas=1024, timeout=5.0):
+        if not ruta:
+            raise ValueError("CACHE_BACKEND=sqlite requiere CACHE_SQLITE_PATH")
+        self.ruta = os.path.abspath(ruta)
+        _preparar_fichero(self.ruta)
+        self.max_entradas = max_entradas
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.errores = 0
+
+        self._crear_tablas()
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _restringir_permisos(self.ruta)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _crear_tablas(self):
+        conn = self._conexion()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                clave  TEXT PRIMARY KEY,
+                valor  BLOB NOT NULL,
+                expira REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache (expira)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS generaciones (
+                espacio    TEXT PRIMARY KEY,
+                generacion INTEGER NOT NULL
+            )
+            """
+        )
+
+    def _contar(self, atributo):
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + 1)
+
+    def get(self, key, default=None):
+        try:
+            row = self._conexion().execute(
+                "SELECT valor, expira FROM cache WHERE clave = ?", (str(key),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            # La cache no ha de fer caure la petició: es tracta com un miss
+            logger.error("Error cache sqlite get: %s", e)
+            self._contar("errores")
+            self._contar("misses")
+            return default
+
+        if row is None or row[1] < time.time():
+            self._contar("misses")
+            return default
+
+        try:
+            valor = pickle.loads(row[0])
+        except Exception as e:
+            # Fila corrupta: miss (i es descarta)
+            logger.error("Valor corrupto en cache sqlite (%s): %s", key, e)
+            self._contar("errores")
+            self._contar("misses")
+            self.delete(key)
+            return default
+
+        self._contar("hits")
+        return valor
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = 60 if ttl_seconds is None else ttl_seconds
+        try:
+            datos = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # Valors no serialitzables (generadors, locks, lambdas...): en
+            # memòria es guarden, aquí no; l'escriptura no ha de fallar
+            logger.error(
+                "Error cache sqlite set (%s no serializable): %s", type(value).__name__, e
+            )
+            self._contar("errores")
+            return
+
+        try:
+            conn = self._conexion()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)",
+                (str(key), sqlite3.Binary(datos), time.time() + ttl),
+            )
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite set: %s", e)
+            self._contar("errores")
+            return
+
+        with self._lock:
+            self._escrituras += 1
+            purgar = self._escrituras % PURGA_CADA == 0
+        if purgar:
+            self.purgar()
+
+    def purgar(self):
+        """Esborra les caducades i, si cal, les que expiren abans fins a max_entradas."""
+        try:
+            conn = self._conexion()
+            conn.execute("DELETE FROM cache WHERE expira < ?", (time.time(),))
+            conn.execute(
+                """
+                DELETE FROM cache WHERE clave IN (
+                    SELECT clave FROM cache ORDER BY expira ASC
+                    LIMIT MAX((SELECT COUNT(*) FROM cache) - ?, 0)
+                )
+                """,
+                (self.max_entradas,),
+            )
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite purgar: %s", e)
+            self._contar("errores")
+
+    def delete(self, key):
+        try:
+            self._conexion().execute("DELETE FROM cache WHERE clave = ?", (str(key),))
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite delete: %s", e)
+            self._contar("errores")
+
+    def clear(self):
+        try:
+            self._conexion().execute("DELETE FROM cache")
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite clear: %s", e)
+            self._contar("errores")
+
+    def generacion(self, espacio):
+        try:
+            row = self._conexion().execute(
+                "SELECT generacion FROM generaciones WHERE espacio = ?", (espacio,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite generacion: %s", e)
+            self._contar("errores")
+            return 0
+        return row[0] if row else 0
+
+    def invalidar(self, espacio):
+        try:
+            self._conexion().execute(
+                """
+                INSERT INTO generaciones (espacio, generacion) VALUES (?, 1)
+                ON CONFLICT(espacio) DO UPDATE SET generacion = generacion + 1
+                """,
+                (espacio,),
+            )
+        except sqlite3.Error as e:
+            logger.error("Error cache sqlite invalidar: %s", e)
+            self._contar("errores")
+
+    def stats(self):
+        try:
+            entradas = self._conexion().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            entradas = None
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "sqlite",
+                "ruta": self.ruta,
+                "entradas": entradas,
+                "max_entradas": self.max_entradas,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "errores": self.errores,
+            }
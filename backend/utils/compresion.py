@@ -0,0 +1,172 @@
+# backend/utils/compresion.py
+import os
+import time
+import zlib
+
+from flask import request
+
+from backend.utils.metricas import contadores, incrementar, registrar_fuente
+
+try:
+    import brotli
+except ImportError:  # brotli és opcional
+    brotli = None
+
+# ---------------------------------------------------------
+# Compressió de respostes (gzip / brotli)
+# ---------------------------------------------------------
+# after_request: comprimeix les respostes de tipus text/JSON/NDJSON que
+# superen COMPRESION_MIN_BYTES si el client ho accepta. Els formats ja
+# comprimits (xlsx, zip, imatges...) no entren a TIPOS_COMPRIMIBLES.
+# Les respostes en streaming es comprimeixen per trossos (amb flush per
+# tros, perquè cada lot NDJSON arribi al client quan es genera).
+COMPRESION_ACTIVA = os.getenv("COMPRESION_ACTIVA", "1") == "1"
+COMPRESION_MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+
+TIPOS_COMPRIMIBLES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "text/html",
+    "text/plain",
+    "text/csv",
+    "text/css",
+    "text/xml",
+}
+
+SECCION_METRICAS = "compresion_contadores"
+
+
+def elegir_codificacion():
+    """'br', 'gzip' o None segons Accept-Encoding (i si brotli hi és)."""
+    ofertas = ["br", "gzip"] if brotli else ["gzip"]
+    return request.accept_encodings.best_match(ofertas)
+
+
+class _Compresor:
+    """Compressor incremental amb la mateixa interfície per gzip i brotli."""
+
+    def __init__(self, codificacion):
+        self.codificacion = codificacion
+        if codificacion == "br":
+            self._obj = brotli.Compressor(quality=NIVEL_BROTLI)
+        else:
+            self._obj = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def trozo(self, datos):
+        """Comprimeix un tros i el buida (flush) perquè es pugui enviar ja."""
+        if self.codificacion == "br":
+            return self._obj.process(datos) + self._obj.flush()
+        return self._obj.compress(datos) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def final(self, datos=b""):
+        if self.codificacion == "br":
+            return self._obj.process(datos) + self._obj.finish()
+        return self._obj.compress(datos) + self._obj.flush(zlib.Z_FINISH)
+
+
+def _registrar(codificacion, bytes_entrada, bytes_salida, segundos):
+    incrementar(SECCION_METRICAS, f"{codificacion}_respuestas")
+    incrementar(SECCION_METRICAS, f"{codificacion}_bytes_entrada", bytes_entrada)
+    incrementar(SECCION_METRICAS, f"{codificacion}_bytes_salida", bytes_salida)
+    incrementar(SECCION_METRICAS, f"{codificacion}_segundos", segundos)
+
+
+def resumen_compresion():
+    """Ràtio (sortida / entrada) i temps mitjà per codificació."""
+    datos = contadores(SECCION_METRICAS)
+    resultado = {}
+    for codificacion in ("gzip", "br"):
+        respuestas = datos.get(f"{codificacion}_respuestas", 0)
+        if not respuestas:
+            continue
+        entrada = datos.get(f"{codificacion}_bytes_entrada", 0)
+        salida = datos.get(f"{codificacion}_bytes_salida", 0)
+        segundos = datos.get(f"{codificacion}_segundos", 0)
+        resultado[codificacion] = {
+            "respuestas": int(respuestas),
+            "bytes_entrada": int(entrada),
+            "bytes_salida": int(salida),
+            "ratio": round(salida / entrada, 4) if entrada else None,
+            "ms_medio": round(segundos * 1000 / respuestas, 3),
+        }
+    return resultado
+
+
+def _comprimir_stream(iterable, codificacion):
+    compresor = _Compresor(codificacion)
+    entrada = salida = 0
+    segundos = 0.0
+    try:
+        for trozo in iterable:
+            if isinstance(trozo, str):
+                trozo = trozo.encode("utf-8")
+            if not trozo:
+                continue
+            inicio = time.perf_counter()
+            comprimido = compresor.trozo(trozo)
+            segundos += time.perf_counter() - inicio
+            entrada += len(trozo)
+            salida += len(comprimido)
+            yield comprimido
+
+        inicio = time.perf_counter()
+        comprimido = compresor.final()
+        segundos += time.perf_counter() - inicio
+        salida += len(comprimido)
+        yield comprimido
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+        _registrar(codificacion, entrada, salida, segundos)
+
+
+def comprimir_respuesta(response):
+    """Hook after_request de create_app."""
+    if not COMPRESION_ACTIVA or request.method == "HEAD":
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in TIPOS_COMPRIMIBLES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    codificacion = elegir_codificacion()
+    if not codificacion:
+        return response
+
+    if response.is_streamed:
+        response.response = _comprimir_stream(response.response, codificacion)
+        response.headers.pop("Content-Length", None)
+    else:
+        if response.direct_passthrough:
+            return response
+        datos = response.get_data()
+        if len(datos) < COMPRESION_MIN_BYTES:
+            return response
+
+        inicio = time.perf_counter()
+        comprimido = _Compresor(codificacion).final(datos)
+        _registrar(codificacion, len(datos), len(comprimido), time.perf_counter() - inicio)
+        response.set_data(comprimido)
+
+    response.headers["Content-Encoding"] = codificacion
+
+    # Cada codificació és una representació diferent: ETag propi
+    etag, debil = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{codificacion}", weak=debil)
+
+    return response
+
+
+def registrar_compresion(app):
+    """Activa la compressió a l'app (create_app)."""
+    app.after_request(comprimir_respuesta)
+    registrar_fuente("compresion", resumen_compresion)
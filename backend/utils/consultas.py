@@ -0,0 +1,269 @@
+# backend/utils/consultas.py
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import has_request_context, request
+
+from backend.utils.metricas import registrar_fuente
+
+logger = logging.getLogger("crm.sql")
+
+# ---------------------------------------------------------
+# Instrumentació de consultes
+# ---------------------------------------------------------
+# Els cursors que retornen DBSession / get_connection són CursorInstrumentado:
+# cada sentència es mesura (execute + fetch, sense comptar el temps entre
+# lots d'un streaming) i s'acumula sota una empremta de l'SQL normalitzat
+# (literals i llistes IN → ?), amb el nombre de files retornades.
+# - Sentències per sobre de DB_CONSULTA_LENTA segons → warning amb l'SQL
+#   normalitzat i els paràmetres redactats (només el tipus).
+# - Una mostra (DB_EXPLAIN_MUESTREO) de les SELECT lentes es torna a
+#   executar amb EXPLAIN quan la connexió es torna al pool (el resultat ja
+#   està llegit) i el pla es guarda per empremta.
+# Tot surt a GET /api/metricas (seccions "consultas" i "consultas_planes").
+CONSULTA_LENTA = float(os.getenv("DB_CONSULTA_LENTA", "0.2"))
+EXPLAIN_MUESTREO = float(os.getenv("DB_EXPLAIN_MUESTREO", "0.1"))
+MAX_HUELLAS = int(os.getenv("DB_CONSULTAS_MAX_HUELLAS", "500"))
+MAX_PLANES = 100
+TOP_CONSULTAS = 25
+
+_RE_CADENA = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@lru_cache(maxsize=1024)
+def huella_sql(sql):
+    """
+    (SQL normalitzat, empremta) d'una sentència: espais compactats, literals
+    i placeholders → ?, llistes IN de qualsevol mida → (?+).
+    """
+    normalizado = " ".join(sql.split())
+    normalizado = _RE_CADENA.sub("?", normalizado)
+    normalizado = normalizado.replace("%s", "?")
+    normalizado = _RE_NUMERO.sub("?", normalizado)
+    normalizado = _RE_LISTA.sub("(?+)", normalizado)
+    huella = hashlib.sha1(normalizado.encode("utf-8")).hexdigest()[:16]
+    return normalizado, huella
+
+
+def redactar(params):
+    """Paràmetres per al log: només el tipus de cada valor."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in params.items()}
+    return [f"<{type(v).__name__}>" for v in params]
+
+
+class EstadisticasConsultas:
+    """Latència i files per empremta (per procés)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_huella = {}  # huella → [sql, n, segundos_total, segundos_max, filas]
+        self.lentas = 0
+        self.planes = {}      # huella → {"sql", "plan", "segundos", "capturado"}
+
+    def registrar(self, sql, huella, segundos, filas):
+        with self._lock:
+            item = self.por_huella.get(huella)
+            if item is None:
+                if len(self.por_huella) >= MAX_HUELLAS:
+                    huella, sql = "otras", "(otras)"
+                item = self.por_huella.setdefault(huella, [sql, 0, 0.0, 0.0, 0])
+            item[1] += 1
+            item[2] += segundos
+            item[3] = max(item[3], segundos)
+            item[4] += filas
+            if segundos > CONSULTA_LENTA:
+                self.lentas += 1
+
+    def quiere_plan(self, huella):
+        with self._lock:
+            return huella not in self.planes and len(self.planes) < MAX_PLANES
+
+    def guardar_plan(self, huella, sql, plan, segundos):
+        with self._lock:
+            self.planes[huella] = {
+                "sql": sql,
+                "plan": plan,
+                "segundos": round(segundos, 3),
+                "capturado": time.time(),
+            }
+
+    def instantanea(self):
+        with self._lock:
+            top = sorted(self.por_huella.items(), key=lambda kv: kv[1][2], reverse=True)
+            return {
+                "umbral_lenta_s": CONSULTA_LENTA,
+                "lentas": self.lentas,
+                "huellas": len(self.por_huella),
+                "top": [
+                    {
+                        "huella": huella,
+                        "sql": sql[:300],
+                        "n": n,
+                        "total_ms": round(total * 1000, 3),
+                        "media_ms": round(total * 1000 / n, 3),
+                        "max_ms": round(maximo * 1000, 3),
+                        "filas_media": round(filas / n, 1),
+                    }
+                    for huella, (sql, n, total, maximo, filas) in top[:TOP_CONSULTAS]
+                ],
+            }
+
+    def instantanea_planes(self):
+        with self._lock:
+            return dict(self.planes)
+
+
+_stats = EstadisticasConsultas()
+registrar_fuente("consultas", _stats.instantanea)
+registrar_fuente("consultas_planes", _stats.instantanea_planes)
+
+# Mostres executables per empremta mentre dura capturar_consultas()
+_captura = None
+
+
+@contextmanager
+def capturar_consultas():
+    """
+    Durant el bloc, guarda la primera execució de cada empremta:
+    {huella: (sql, params, endpoint)} (l'usa l'assessor d'índexs).
+    """
+    global _captura
+    _captura = {}
+    try:
+        yield _captura
+    finally:
+        _captura = None
+
+
+def _finalizar(sql, params, segundos, filas, explicar=None):
+    normalizado, huella = huella_sql(sql)
+    _stats.registrar(normalizado, huella, segundos, filas)
+    if _captura is not None:
+        endpoint = request.endpoint if has_request_context() else None
+        _captura.setdefault(huella, (sql, params, endpoint))
+    if segundos <= CONSULTA_LENTA:
+        return
+
+    logger.warning(
+        "Consulta lenta %.3fs [%s] filas=%s %s params=%s",
+        segundos, huella, filas, normalizado[:500], redactar(params),
+    )
+    if (
+        explicar is not None
+        and normalizado.lstrip("( ").upper().startswith("SELECT")
+        and random.random() < EXPLAIN_MUESTREO
+        and _stats.quiere_plan(huella)
+    ):
+        explicar(huella, sql, params, segundos)
+
+
+@contextmanager
+def medir_consulta(sql, params=None, explicar=None):
+    """Mesura una sentència executada fora d'un CursorInstrumentado (p. ex. preparada)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _finalizar(sql, params, time.perf_counter() - inicio, 0, explicar)
+
+
+class CursorInstrumentado:
+    """
+    Embolcall d'un cursor: mesura execute / executemany i els fetch posteriors
+    i ho registra en passar a la sentència següent o en tancar el cursor.
+    La resta d'atributs (lastrowid, rowcount, description...) es deleguen.
+    """
+
+    def __init__(self, cursor, explicar=None):
+        self._cursor = cursor
+        self._explicar = explicar
+        self._actual = None  # [sql, params, segundos, filas]
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _cerrar_actual(self):
+        actual, self._actual = self._actual, None
+        if actual is not None:
+            _finalizar(*actual, explicar=self._explicar)
+
+    def _medir(self, metodo, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        finally:
+            if self._actual is not None:
+                self._actual[2] += time.perf_counter() - inicio
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._cerrar_actual()
+        self._actual = [operation, params, 0.0, 0]
+        return self._medir(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._cerrar_actual()
+        self._actual = [operation, None, 0.0, 0]
+        return self._medir(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _contar(self, filas):
+        if self._actual is not None:
+            self._actual[3] += filas
+
+    def fetchone(self):
+        fila = self._medir(self._cursor.fetchone)
+        if fila is not None:
+            self._contar(1)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        filas = self._medir(self._cursor.fetchmany, *args, **kwargs)
+        self._contar(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(self._cursor.fetchall)
+        self._contar(len(filas))
+        return filas
+
+    def __iter__(self):
+        while True:
+            fila = self.fetchone()
+            if fila is None:
+                return
+            yield fila
+
+    def close(self):
+        self._cerrar_actual()
+        return self._cursor.close()
+
+
+def ejecutar_explains(conn, pendientes):
+    """
+    Executa els EXPLAIN programats sobre 'conn' (connexió física, sense
+    resultats pendents) i en desa els plans. Els errors només es registren.
+    """
+    for huella, sql, params, segundos in pendientes:
+        cursor = None
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = cursor.fetchall()
+            _stats.guardar_plan(huella, huella_sql(sql)[0], plan, segundos)
+            logger.info("EXPLAIN capturado para %s", huella)
+        except Exception as e:
+            logger.warning("No se pudo capturar EXPLAIN de %s: %s", huella, e)
+        finally:
+            if cursor is not None:
+                cursor.close()
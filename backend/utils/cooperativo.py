@@ -0,0 +1,55 @@
+# backend/utils/cooperativo.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------------------------------------------------
+# Mode cooperatiu (gevent)
+# ---------------------------------------------------------
+# Les vistes són síncrones i passen molt temps esperant MySQL o SMTP. Amb
+# gevent (gunicorn -k gevent, o wsgi_gevent.py) cada petició és una
+# greenlet i els sockets cedeixen el control mentre esperen: un sol procés
+# atén centenars de peticions lentes alhora amb el mateix codi.
+# Requisits quan està actiu:
+#   - mysql-connector en Python pur (use_pure): l'extensió C bloqueja el bucle
+#     (db.py ho decideix en crear el pool, ja dins el worker)
+#   - el pool continua limitat a DB_POOL_SIZE: la resta de greenlets esperen
+#     el torn a la cua justa del pool (backend/utils/db.py)
+#   - el treball de CPU (p. ex. generar l'Excel amb pandas) no cedeix
+# Sense gevent (o sense monkey patching) tot funciona com sempre.
+try:
+    from gevent import monkey as _monkey
+    from gevent.pool import Pool as _PoolGevent
+except ImportError:  # pragma: no cover - dependència opcional
+    _monkey = None
+    _PoolGevent = None
+
+
+def modo_cooperativo():
+    """True si el procés corre amb els sockets de gevent (monkey patching)."""
+    if os.getenv("SERVIDOR_COOPERATIVO") == "1":
+        return True
+    return _monkey is not None and _monkey.is_module_patched("socket")
+
+
+def ejecutar_concurrente(funcion, elementos, limite):
+    """
+    Crida funcion(e) per cada element amb com a molt 'limite' crides alhora
+    (greenlets en mode cooperatiu, threads si no). Retorna [(element, error)]
+    en el mateix ordre; error és None si ha anat bé.
+    """
+    def protegido(elemento):
+        try:
+            funcion(elemento)
+            return elemento, None
+        except Exception as e:
+            return elemento, e
+
+    elementos = list(elementos)
+    if not elementos:
+        return []
+
+    if _PoolGevent is not None and modo_cooperativo():
+        return list(_PoolGevent(limite).imap(protegido, elementos))
+
+    with ThreadPoolExecutor(max_workers=min(limite, len(elementos))) as executor:
+        return list(executor.map(protegido, elementos))
@@ -1,7 +1,21 @@
 # backend/utils/db.py
+import heapq
+import itertools
+import logging
 import os
+import threading
+import time
+
 import mysql.connector
 import mysql.connector.pooling
+from flask import current_app, g, has_app_context, has_request_context, jsonify, request
+
+from backend.utils.consultas import CursorInstrumentado, ejecutar_explains
+from backend.utils.cooperativo import modo_cooperativo
+from backend.utils.metricas import registrar_fuente
+from backend.utils.query_compiler import olvidar_preparadas
+
+logger = logging.getLogger("crm.db")
 
 DB_CONFIG = {
     "host": os.getenv("DB_HOST", "localhost"),
@@ -14,42 +28,484 @@ DB_CONFIG = {
     "collation": "utf8mb4_unicode_ci",
 }
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "15"))  # una mica més alt
+
+# Amb reset de sessió MySQL allibera les sentències preparades a cada checkout
+POOL_RESET_SESSION = os.getenv("DB_POOL_RESET_SESSION", "1") == "1"
+
+# Checkouts més lents que això (o connexions retingudes més temps) es
+# registren com a warning
+POOL_ESPERA_LENTA = float(os.getenv("DB_POOL_ESPERA_LENTA", "0.5"))
+POOL_RETENCION_LARGA = float(os.getenv("DB_POOL_RETENCION_LARGA", "10"))
+
+# ---------------------------------------------------------
+# Rèplica de lectura (opcional)
+# ---------------------------------------------------------
+# Amb DB_REPLICA_HOST hi ha un segon pool contra una rèplica. Per defecte hi
+# van les peticions GET i tot el blueprint d'exportació (també el POST
+# /excel, que només llegeix). Per llegir les pròpies escriptures:
+#   - @usar_primario en una vista (p. ex. GETs que escriuen o fitxes que es
+#     consulten just després de desar)
+#   - capçalera 'X-Leer-Primario: 1' a la petició
+#   - get_connection(lectura=False)
+# Si la rèplica no respon es fa servir el primari durant REPLICA_REINTENTO s.
+REPLICA_CONFIG = {
+    **DB_CONFIG,
+    "host": os.getenv("DB_REPLICA_HOST"),
+    "user": os.getenv("DB_REPLICA_USER", DB_CONFIG["user"]),
+    "password": os.getenv("DB_REPLICA_PASSWORD", DB_CONFIG["password"]),
+    "database": os.getenv("DB_REPLICA_NAME", DB_CONFIG["database"]),
+    "port": int(os.getenv("DB_REPLICA_PORT", str(DB_CONFIG["port"]))),
+} if os.getenv("DB_REPLICA_HOST") else None
+
+DB_REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", str(DB_POOL_SIZE)))
+REPLICA_REINTENTO = float(os.getenv("DB_REPLICA_REINTENTO", "30"))
+BLUEPRINTS_LECTURA = {"export_bp"}
+
+# ---------------------------------------------------------
+# Cua d'espera del pool
+# ---------------------------------------------------------
+# El pool de mysql-connector falla a l'instant si no hi ha connexions
+# lliures. Davant seu hi ha una cua justa: cada checkout espera el seu torn
+# (FIFO dins la mateixa prioritat) fins a DB_POOL_TIMEOUT segons. Si la cua
+# ja té DB_POOL_COLA_MAX peticions o s'acaba el temps → PoolAgotadoError,
+# que l'app retorna com a 503 amb Retry-After.
+# Prioritats: les consultes curtes (login, fitxa) passen davant de les
+# exportacions pesades.
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+POOL_COLA_MAX = int(os.getenv("DB_POOL_COLA_MAX", "100"))
+POOL_RETRY_AFTER = int(os.getenv("DB_POOL_RETRY_AFTER", "2"))
+
+PRIORIDAD_ALTA = 0
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_BAJA = 2
+
+# Prioritat per blueprint (la resta: normal). g.prioridad_pool la sobreescriu.
+PRIORIDAD_POR_BLUEPRINT = {
+    "auth_bp": PRIORIDAD_ALTA,
+    "usuario_detalle_bp": PRIORIDAD_ALTA,
+    "export_bp": PRIORIDAD_BAJA,
+}
+
 _pool = None
+_cola = None
+_pool_replica = None
+_cola_replica = None
+_replica_caida_hasta = 0.0
+_init_lock = threading.Lock()
+
+
+class PoolAgotadoError(Exception):
+    """No s'ha pogut obtenir una connexió del pool dins el temps d'espera."""
+
+    def __init__(self, motivo):
+        super().__init__(f"Pool de conexiones agotado ({motivo})")
+        self.motivo = motivo
+
+
+class ColaPool:
+    """
+    Semàfor just amb prioritats: 'permisos' connexions, i els que esperen
+    s'ordenen per (prioritat, ordre d'arribada).
+    """
+
+    def __init__(self, permisos, cola_max):
+        self._cond = threading.Condition()
+        self._libres = permisos
+        self._cola = []  # heap de (prioridad, seq)
+        self._seq = itertools.count()
+        self.cola_max = cola_max
+
+    def en_cola(self):
+        return len(self._cola)
+
+    def adquirir(self, prioridad, timeout, n=1):
+        """
+        Reserva 'n' connexions alhora (totes o cap: qui en necessita dues no
+        en reté una mentre espera l'altra). Retorna True si ha hagut d'esperar.
+        """
+        with self._cond:
+            if self._libres >= n and not self._cola:
+                self._libres -= n
+                return False
+
+            if len(self._cola) >= self.cola_max:
+                raise PoolAgotadoError("cola llena")
+
+            turno = (prioridad, next(self._seq))
+            heapq.heappush(self._cola, turno)
+            limite = time.monotonic() + timeout
+            try:
+                while not (self._libres >= n and self._cola[0] == turno):
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolAgotadoError("timeout")
+                    self._cond.wait(restante)
+            except PoolAgotadoError:
+                self._cola.remove(turno)
+                heapq.heapify(self._cola)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._cola)
+            self._libres -= n
+            if self._libres > 0 and self._cola:
+                self._cond.notify_all()
+            return True
+
+    def liberar(self, n=1):
+        with self._cond:
+            self._libres += n
+            self._cond.notify_all()
+
+
+# ---------------------------------------------------------
+# Estadístiques del pool
+# ---------------------------------------------------------
+class EstadisticasPool:
+    """
+    Comptadors del pool (per procés): espera de checkout, temps de retenció
+    per endpoint, connexions en ús / lliures, esgotaments i edat de les
+    connexions físiques (des del seu primer checkout).
+    """
+
+    def __init__(self, tamano):
+        self._lock = threading.Lock()
+        self.tamano = tamano
+        self.cola = None
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.agotamientos = 0
+        self.encoladas = 0
+        self.rechazos = {}      # motiu → n
+        self.por_endpoint = {}  # endpoint → [n, segundos_total, segundos_max]
+        self.creadas = {}       # id(connexió física) → moment de creació
+
+    def checkout(self, espera, cnx):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+            self.creadas.setdefault(id(cnx), time.time())
+
+    def devolucion(self, endpoint, retencion):
+        with self._lock:
+            self.en_uso -= 1
+            item = self.por_endpoint.setdefault(endpoint, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += retencion
+            item[2] = max(item[2], retencion)
+
+    def agotado(self):
+        with self._lock:
+            self.agotamientos += 1
+
+    def encolada(self):
+        with self._lock:
+            self.encoladas += 1
+
+    def rechazo(self, motivo):
+        with self._lock:
+            self.rechazos[motivo] = self.rechazos.get(motivo, 0) + 1
+
+    def instantanea(self):
+        ahora = time.time()
+        with self._lock:
+            edades = [ahora - creada for creada in self.creadas.values()]
+            return {
+                "tamano": self.tamano,
+                "en_uso": self.en_uso,
+                "libres": max(self.tamano - self.en_uso, 0),
+                "max_en_uso": self.max_en_uso,
+                "checkouts": self.checkouts,
+                "espera_media_ms": round(self.espera_total * 1000 / self.checkouts, 3)
+                if self.checkouts else None,
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "agotamientos": self.agotamientos,
+                "encoladas": self.encoladas,
+                "en_cola": self.cola.en_cola() if self.cola else 0,
+                "rechazos": dict(self.rechazos),
+                "conexiones_vistas": len(edades),
+                "edad_conexion_s": {
+                    "min": round(min(edades), 1),
+                    "max": round(max(edades), 1),
+                } if edades else None,
+                "retencion_por_endpoint": {
+                    endpoint: {
+                        "n": n,
+                        "media_ms": round(total * 1000 / n, 3),
+                        "max_ms": round(maximo * 1000, 3),
+                    }
+                    for endpoint, (n, total, maximo) in self.por_endpoint.items()
+                },
+            }
+
+
+_stats = EstadisticasPool(DB_POOL_SIZE)
+_stats_replica = EstadisticasPool(DB_REPLICA_POOL_SIZE)
+
+
+def estadisticas_pool():
+    """Estat del pool per a mètriques (GET /api/metricas)."""
+    return _stats.instantanea()
+
+
+registrar_fuente("pool", estadisticas_pool)
+if REPLICA_CONFIG:
+    registrar_fuente("pool_replica", _stats_replica.instantanea)
+
+
+class ConexionInstrumentada:
+    """
+    Embolcall d'una connexió del pool: delega-ho tot, dona cursors
+    instrumentats (backend/utils/consultas.py) i, en close(), executa els
+    EXPLAIN pendents i registra quant de temps s'ha retingut i per quin endpoint.
+    """
+
+    def __init__(self, conn, endpoint, cola, stats):
+        self._conn = conn
+        self._endpoint = endpoint
+        self._cola = cola
+        self._stats = stats
+        self._inicio = time.perf_counter()
+        self._cerrada = False
+        self._explains = []
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conn.cursor(*args, **kwargs), self._programar_explain)
+
+    def _programar_explain(self, huella, sql, params, segundos):
+        # No es pot executar ara: el cursor pot tenir files pendents de llegir
+        self._explains.append((huella, sql, params, segundos))
+
+    def close(self):
+        if self._cerrada:
+            return
+        self._cerrada = True
+        retencion = time.perf_counter() - self._inicio
+        try:
+            if self._explains:
+                ejecutar_explains(self._conn, self._explains)
+            self._conn.close()
+        finally:
+            self._cola.liberar()
+            self._stats.devolucion(self._endpoint, retencion)
+            if retencion > POOL_RETENCION_LARGA:
+                logger.warning(
+                    "Conexión retenida %.2fs por %s", retencion, self._endpoint
+                )
+
+
+def _config_driver(config):
+    """
+    Configuració per crear un pool. Amb gevent cal el driver en Python pur
+    (l'extensió C no cedeix en esperar). Es decideix en crear el pool i no en
+    importar el mòdul: amb 'gunicorn --preload' l'app s'importa al màster,
+    abans que el worker gevent faci el monkey patching.
+    """
+    if modo_cooperativo() or os.getenv("DB_USE_PURE") == "1":
+        return {**config, "use_pure": True}
+    return config
 
 
 def _init_pool():
     """Inicialitza el pool de connexions només una vegada."""
-    global _pool
-    if _pool is not None:
-        return
-
-    print("🔧 Inicializando pool MySQL:", {
-        "host": DB_CONFIG["host"],
-        "user": DB_CONFIG["user"],
-        "db": DB_CONFIG["database"],
-    })
+    global _pool, _cola
+    with _init_lock:
+        if _pool is not None:
+            return
+
+        logger.info(
+            "Inicializando pool MySQL host=%s user=%s db=%s size=%s",
+            DB_CONFIG["host"], DB_CONFIG["user"], DB_CONFIG["database"], DB_POOL_SIZE,
+        )
+
+        _pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="crm_pool",
+            pool_size=DB_POOL_SIZE,
+            pool_reset_session=POOL_RESET_SESSION,
+            **_config_driver(DB_CONFIG),
+        )
+        _cola = ColaPool(DB_POOL_SIZE, POOL_COLA_MAX)
+        _stats.cola = _cola
+
+
+def _init_replica():
+    """Inicialitza el pool de la rèplica (si està configurada)."""
+    global _pool_replica, _cola_replica
+    with _init_lock:
+        if _pool_replica is not None:
+            return
+
+        logger.info(
+            "Inicializando pool réplica host=%s db=%s size=%s",
+            REPLICA_CONFIG["host"], REPLICA_CONFIG["database"], DB_REPLICA_POOL_SIZE,
+        )
+
+        _pool_replica = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="crm_pool_replica",
+            pool_size=DB_REPLICA_POOL_SIZE,
+            pool_reset_session=POOL_RESET_SESSION,
+            **_config_driver(REPLICA_CONFIG),
+        )
+        _cola_replica = ColaPool(DB_REPLICA_POOL_SIZE, POOL_COLA_MAX)
+        _stats_replica.cola = _cola_replica
+
+
+def _endpoint_actual():
+    if has_request_context():
+        return request.endpoint or request.path
+    return "sin_peticion"
+
+
+def _prioridad_actual():
+    if has_app_context() and "prioridad_pool" in g:
+        return g.prioridad_pool
+    if has_request_context():
+        return PRIORIDAD_POR_BLUEPRINT.get(request.blueprint, PRIORIDAD_NORMAL)
+    return PRIORIDAD_NORMAL
+
 
-    _pool = mysql.connector.pooling.MySQLConnectionPool(
-        pool_name="crm_pool",
-        pool_size=int(os.getenv("DB_POOL_SIZE", "15")),  # una mica més alt
-        pool_reset_session=True,
-        **DB_CONFIG,
-    )
+def usar_primario(f):
+    """Decorador de vista: les seves consultes van sempre al primari."""
+    f._usar_primario = True
+    return f
 
 
-def get_connection():
-    """Retorna una connexió des del pool."""
-    global _pool
+def _lectura_actual():
+    """True si la petició actual pot llegir de la rèplica."""
+    if not REPLICA_CONFIG or not has_request_context():
+        return False
+    vista = current_app.view_functions.get(request.endpoint)
+    if getattr(vista, "_usar_primario", False):
+        return False
+    if request.headers.get("X-Leer-Primario") == "1":
+        return False
+    return request.method in ("GET", "HEAD") or request.blueprint in BLUEPRINTS_LECTURA
+
+
+def _rechazar(motivo, endpoint, stats):
+    stats.rechazo(motivo)
+    logger.warning("Checkout rechazado (%s) en %s", motivo, endpoint)
+    # Els blueprints capturen Exception i retornen 500: la marca permet a
+    # respuesta_pool_agotado convertir-ho en 503
+    if has_app_context():
+        g.pool_agotado = True
+    raise PoolAgotadoError(motivo)
+
+
+def get_connection(prioridad=None, lectura=None):
+    """
+    Retorna una connexió des del pool, esperant el torn si cal.
+    Llença PoolAgotadoError si no n'hi ha cap dins DB_POOL_TIMEOUT.
+    'lectura' (per defecte segons la petició) la demana a la rèplica.
+    """
+    return get_connections(1, prioridad, lectura)[0]
+
+
+def get_connections(n, prioridad=None, lectura=None):
+    """
+    Retorna 'n' connexions reservades d'una sola vegada a la cua del pool.
+    Per a qui en necessita més d'una alhora (p. ex. l'streaming NDJSON):
+    demanar-les una a una reté la primera mentre s'espera la segona.
+    """
+    global _replica_caida_hasta
+
+    endpoint = _endpoint_actual()
+    if prioridad is None:
+        prioridad = _prioridad_actual()
+    if lectura is None:
+        lectura = _lectura_actual()
+
+    if lectura and REPLICA_CONFIG and time.time() >= _replica_caida_hasta:
+        try:
+            if _pool_replica is None:
+                _init_replica()
+            return _checkout(_pool_replica, _cola_replica, _stats_replica, prioridad, endpoint, n)
+        except PoolAgotadoError:
+            raise
+        except mysql.connector.Error as e:
+            _replica_caida_hasta = time.time() + REPLICA_REINTENTO
+            logger.warning("Réplica no disponible, se usa el primario: %s", e)
+
     if _pool is None:
         _init_pool()
+    return _checkout(_pool, _cola, _stats, prioridad, endpoint, n)
+
 
-    conn = _pool.get_connection()
+def _checkout(pool, cola, stats, prioridad, endpoint, n=1):
+    inicio = time.perf_counter()
+    try:
+        if cola.adquirir(prioridad, POOL_TIMEOUT, n):
+            stats.encolada()
+    except PoolAgotadoError as e:
+        _rechazar(e.motivo, endpoint, stats)
 
-    # 👇 Debug lleuger (pots comentar-lo si molesta)
-    print("CONECTANDO A BD:", {
-        "host": DB_CONFIG["host"],
-        "user": DB_CONFIG["user"],
-        "db": DB_CONFIG["database"],
+    conexiones = []
+    try:
+        for _ in range(n):
+            conexiones.append(pool.get_connection())
+    except mysql.connector.errors.PoolError:
+        _devolver(conexiones)
+        cola.liberar(n)
+        stats.agotado()
+        logger.warning("Pool %s agotado (%s conexiones) en %s", pool.pool_name, stats.tamano, endpoint)
+        _rechazar("pool mysql", endpoint, stats)
+    except Exception:
+        _devolver(conexiones)
+        cola.liberar(n)
+        raise
+
+    espera = time.perf_counter() - inicio
+    if espera > POOL_ESPERA_LENTA:
+        logger.warning("Checkout lento del pool: %.3fs en %s", espera, endpoint)
+    logger.debug("Checkout de %s conexión(es) para %s (%.1f ms)", n, endpoint, espera * 1000)
+
+    resultado = []
+    for conn in conexiones:
+        stats.checkout(espera, getattr(conn, "_cnx", conn))
+        if POOL_RESET_SESSION:
+            olvidar_preparadas(conn)
+        resultado.append(ConexionInstrumentada(conn, endpoint, cola, stats))
+    return resultado
+
+
+def _devolver(conexiones):
+    for conn in conexiones:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _respuesta_503():
+    response = jsonify({
+        "error": "Servidor ocupado, inténtalo de nuevo en unos segundos",
     })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(POOL_RETRY_AFTER)
+    return response
+
+
+def respuesta_pool_agotado(response):
+    """
+    after_request: si la petició ha fallat perquè el pool estava esgotat,
+    retorna 503 + Retry-After en lloc del 500 genèric.
+    """
+    if g.get("pool_agotado") and response.status_code >= 500:
+        return _respuesta_503()
+    return response
+
 
-    return conn
+def registrar_pool(app):
+    """Resposta 503 per PoolAgotadoError (create_app)."""
+    app.after_request(respuesta_pool_agotado)
+    app.register_error_handler(PoolAgotadoError, lambda e: _respuesta_503())
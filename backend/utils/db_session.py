@@ -1,6 +1,39 @@
 # backend/utils/db_session.py
+import logging
+
+from flask import g, has_request_context, jsonify
+
 from backend.utils.db import get_connection
 
+logger = logging.getLogger("crm.db")
+
+# ---------------------------------------------------------
+# Connexió per petició (unitat de treball)
+# ---------------------------------------------------------
+# Dins d'una petició HTTP, tots els DBSession (i registrar_historial, la
+# foto de referència, les versions...) comparteixen una sola connexió,
+# agafada del pool la primera vegada que cal. No es fa commit a cada
+# DBSession: finalizar_unidad (after_request) fa un sol commit si la
+# resposta és < 400 i cap DBSession ha fallat; si no, rollback.
+# Fora d'una petició (CLI, threads de refresc en segon pla) cada DBSession
+# continua tenint la seva pròpia connexió i commit.
+# Les vistes que després fan feina només de CPU (Excel, serialitzar un
+# llistat gran, streaming) criden terminar_unidad() abans, per no retenir
+# la connexió mentrestant.
+# al_confirmar(funcion) difereix efectes locals (p. ex. invalidar caches
+# en memòria) fins que el commit de la unitat ha anat bé.
+
+
+def conexion_peticion():
+    """Connexió compartida de la petició actual (None fora d'una petició)."""
+    if not has_request_context():
+        return None
+    conn = g.get("_conexion_peticion")
+    if conn is None:
+        conn = get_connection()
+        g._conexion_peticion = conn
+    return conn
+
 
 class DBSession:
     """
@@ -13,17 +46,100 @@ class DBSession:
     """
 
     def __enter__(self):
-        self.conn = get_connection()
+        self.compartida = conexion_peticion()
+        self.conn = self.compartida or get_connection()
         # cursor dict per defecte
         self.cursor = self.conn.cursor(dictionary=True)
         return self.cursor
 
     def __exit__(self, exc_type, exc, tb):
         try:
-            if exc_type:
+            if self.compartida is not None:
+                # El commit/rollback es fa en acabar la petició
+                if exc_type:
+                    g._unidad_fallida = True
+            elif exc_type:
                 self.conn.rollback()
             else:
                 self.conn.commit()
         finally:
             self.cursor.close()
-            self.conn.close()
+            if self.compartida is None:
+                self.conn.close()
+
+
+def al_confirmar(funcion):
+    """
+    Crida 'funcion' quan es confirmi la unitat de treball de la petició (si
+    es fa rollback, no es crida). Fora d'una petició cada DBSession fa el
+    seu commit en sortir: es crida ara mateix.
+    """
+    if has_request_context() and g.get("_conexion_peticion") is not None:
+        g.setdefault("_al_confirmar", []).append(funcion)
+    else:
+        funcion()
+
+
+def _ejecutar_al_confirmar(funciones):
+    for funcion in funciones:
+        try:
+            funcion()
+        except Exception:
+            logger.exception("Error en una acción posterior al commit")
+
+
+def terminar_unidad(confirmar=True):
+    """
+    Tanca ara la unitat de treball de la petició: commit (si 'confirmar' i
+    cap DBSession ha fallat) o rollback, i torna la connexió al pool.
+    Un DBSession posterior en la mateixa petició n'agafa una de nova.
+    Llença l'error si el commit falla.
+    """
+    if not has_request_context():
+        return
+    conn = g.pop("_conexion_peticion", None)
+    fallida = g.pop("_unidad_fallida", False)
+    pendientes = g.pop("_al_confirmar", [])
+    if conn is None:
+        return
+
+    try:
+        if confirmar and not fallida:
+            conn.commit()
+        else:
+            conn.rollback()
+            pendientes = []
+    finally:
+        conn.close()
+    _ejecutar_al_confirmar(pendientes)
+
+
+def finalizar_unidad(response):
+    """after_request: commit (o rollback) i devolució de la connexió de la petició."""
+    try:
+        terminar_unidad(confirmar=response.status_code < 400)
+    except Exception:
+        logger.exception("Error confirmando la transacción de la petición")
+        response = jsonify({"error": "Error guardando los cambios"})
+        response.status_code = 500
+    return response
+
+
+def cerrar_unidad(exc=None):
+    """teardown_request: si after_request no s'ha executat (excepció), rollback."""
+    conn = g.pop("_conexion_peticion", None)
+    g.pop("_al_confirmar", None)
+    if conn is None:
+        return
+    try:
+        conn.rollback()
+    except Exception:
+        logger.exception("Error deshaciendo la transacción de la petición")
+    finally:
+        conn.close()
+
+
+def registrar_unidad_trabajo(app):
+    """Connexió per petició amb un sol commit al final (create_app)."""
+    app.after_request(finalizar_unidad)
+    app.teardown_request(cerrar_unidad)
@@ -0,0 +1,72 @@
+# backend/utils/json_provider.py
+import logging
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson és opcional
+    orjson = None
+
+logger = logging.getLogger("crm.json")
+
+# ---------------------------------------------------------
+# Proveïdor JSON de l'app
+# ---------------------------------------------------------
+# JSON_PROVIDER=auto (per defecte) fa servir orjson si està instal·lat i
+# si no el de Flask (stdlib). La sortida és equivalent: les dates i els
+# datetimes passen pel mateix 'default' de Flask (format HTTP date), els
+# Decimal i UUID surten com a string i les claus s'ordenen igual.
+# Si orjson no pot serialitzar un valor (p. ex. un enter de més de 64 bits)
+# es torna a provar amb la implementació de Flask.
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "auto").lower()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider amb dumps/loads d'orjson."""
+
+    def _opciones(self, indent=None):
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indent:
+            opciones |= orjson.OPT_INDENT_2
+        return opciones
+
+    def dumps(self, obj, **kwargs):
+        # Arguments que orjson no entén → implementació de Flask
+        indent = kwargs.pop("indent", None)
+        separators = kwargs.pop("separators", None)
+        if kwargs or separators not in (None, (",", ":")) or indent not in (None, 2):
+            if indent is not None:
+                kwargs["indent"] = indent
+            if separators is not None:
+                kwargs["separators"] = separators
+            return super().dumps(obj, **kwargs)
+
+        try:
+            return orjson.dumps(
+                obj, default=self.default, option=self._opciones(indent)
+            ).decode("utf-8")
+        except TypeError:
+            # orjson.JSONEncodeError és subclasse de TypeError
+            if indent:
+                return super().dumps(obj, indent=indent)
+            return super().dumps(obj, separators=separators or (",", ":"))
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def configurar_json(app):
+    """Assigna el proveïdor JSON a l'app segons JSON_PROVIDER (create_app)."""
+    if JSON_PROVIDER == "std":
+        return
+    if orjson is None:
+        if JSON_PROVIDER == "orjson":
+            logger.warning("JSON_PROVIDER=orjson però orjson no està instal·lat; es fa servir stdlib")
+        return
+    app.json = OrjsonProvider(app)
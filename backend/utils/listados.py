@@ -0,0 +1,483 @@
+# backend/utils/listados.py
+import os
+
+from flask import jsonify
+from backend.utils.db_session import DBSession, terminar_unidad
+from backend.utils.busqueda import parsear_modo
+from backend.utils.ndjson import quiere_ndjson, respuesta_ndjson
+from backend.utils.resumen import atributos_resumen
+from backend.utils.simple_cache import obtener_o_calcular, clave_generacional
+from backend.utils.versiones import obtener_versiones, TABLAS_CONTACTOS
+from backend.utils.query_compiler import compilar, ejecutar_plantilla
+from backend.utils.query_helpers import (
+    aplicar_filtros_basicos,
+    aplicar_filtros_atributos,
+    cargar_atributos,
+    diccionario_atributos,
+    parsear_paginacion,
+    aplicar_cursor,
+    pagina_y_cursor,
+    CLAVES_PAGINACION,
+    normalizar_params,
+)
+
+# Paràmetres del query string que no són filtres. Els de presentació no
+# canvien quines files compleixen els filtres (es poden ignorar a les claus
+# de cache de recomptes); 'match' sí que en canvia la semàntica.
+CLAVES_PRESENTACION = CLAVES_PAGINACION | {"fields", "formato_atributos"}
+CLAVES_CONTROL = CLAVES_PRESENTACION | {"match"}
+
+JOIN_MASTER = """
+    LEFT JOIN relacionusuariomaster rum ON rum.idUsuario = u.idUsuario
+    LEFT JOIN master m                  ON m.idMaster   = rum.idMaster
+"""
+
+JOIN_INTERES = """
+    LEFT JOIN postulado p               ON p.idUsuario  = u.idUsuario
+    LEFT JOIN master m2                 ON m2.idMaster  = p.idInteresMaster
+"""
+
+# ---------------------------------------------------------
+# Definició dels llistats (/usuarios, /alumnos, /postulados)
+# ---------------------------------------------------------
+# columnas: camp → (expressió SELECT, joins que necessita)
+# filtros:  clau del query string → condició SQL
+# joins_filtros: clau del query string → joins que necessita el filtre
+# Només s'afegeixen els JOINs (i el GROUP BY) que demanen els camps i filtres.
+LISTADOS = {
+    "usuarios": {
+        "from": "FROM usuario u",
+        "where": "1 = 1",
+        "joins": {"master": JOIN_MASTER, "interes": JOIN_INTERES},
+        "agrupar_siempre": False,
+        "group_by": "u.idUsuario, u.nombreUsuario, u.mail, u.telefon, u.estado",
+        "columnas": {
+            "id":        ("u.idUsuario AS id", ()),
+            "nombre":    ("u.nombreUsuario AS nombre", ()),
+            "mail":      ("u.mail", ()),
+            "telefono":  ("u.telefon AS telefono", ()),
+            "estado":    ("u.estado", ()),
+            "masters":   ("GROUP_CONCAT(DISTINCT m.nomMaster SEPARATOR ', ') AS masters", ("master",)),
+            "intereses": ("GROUP_CONCAT(DISTINCT m2.nomMaster SEPARATOR ', ') AS intereses", ("interes",)),
+        },
+        "filtros": {
+            "nombre": "u.nombreUsuario LIKE %s",
+            "telefono": "u.telefon LIKE %s",
+            "mail":    "u.mail LIKE %s",
+            "master":  "m.nomMaster = %s",
+            "edicion": "m.edicio = %s",
+            "interes_master": "m2.nomMaster = %s",
+            "estado": "u.estado = %s",
+            "publicidad": "u.publicidad = %s",
+        },
+        "joins_filtros": {
+            "master": ("master",),
+            "edicion": ("master",),
+            "interes_master": ("interes",),
+        },
+    },
+    "alumnos": {
+        "from": "FROM usuario u",
+        "where": "u.estado = 'alumno'",
+        "joins": {"master": JOIN_MASTER},
+        "agrupar_siempre": False,
+        "group_by": "u.idUsuario, u.nombreUsuario, u.mail, u.telefon",
+        "columnas": {
+            "id":       ("u.idUsuario AS id", ()),
+            "nombre":   ("u.nombreUsuario AS nombre", ()),
+            "mail":     ("u.mail", ()),
+            "telefono": ("u.telefon AS telefono", ()),
+            "master": ("""GROUP_CONCAT(
+                    DISTINCT CONCAT(m.nomMaster, ' — ', m.edicio)
+                    SEPARATOR ', '
+                ) AS master""", ("master",)),
+        },
+        "filtros": {
+            "nombre":  "u.nombreUsuario LIKE %s",
+            "telefono": "u.telefon LIKE %s",
+            "mail":    "u.mail LIKE %s",
+            "master":  "m.nomMaster = %s",
+            "edicion": "m.edicio   = %s",
+        },
+        "joins_filtros": {
+            "master": ("master",),
+            "edicion": ("master",),
+        },
+    },
+    "postulados": {
+        # El JOIN amb postulado/master defineix qui és postulat: sempre hi és
+        "from": """FROM postulado p
+            JOIN usuario u ON u.idUsuario = p.idUsuario
+            JOIN master  m ON m.idMaster = p.idInteresMaster""",
+        "where": "1 = 1",
+        "joins": {},
+        "agrupar_siempre": True,
+        "group_by": "u.idUsuario, u.nombreUsuario, u.mail, u.telefon",
+        "columnas": {
+            "id":       ("u.idUsuario AS id", ()),
+            "nombre":   ("u.nombreUsuario AS nombre", ()),
+            "mail":     ("u.mail", ()),
+            "telefono": ("u.telefon AS telefono", ()),
+            "master":   ("GROUP_CONCAT(DISTINCT m.nomMaster SEPARATOR ', ') AS master", ()),
+        },
+        "filtros": {
+            "nombre":  "u.nombreUsuario LIKE %s",
+            "telefono": "u.telefon LIKE %s",
+            "mail":    "u.mail LIKE %s",
+            "master":  "m.nomMaster = %s",
+            "interes_master": "m.nomMaster = %s",
+            "edicion": "m.edicio = %s",
+        },
+        "joins_filtros": {},
+    },
+}
+
+# ---------------------------------------------------------
+# Mateixos llistats llegint usuario_resumen (backend/utils/resumen.py)
+# ---------------------------------------------------------
+# Una fila per usuari amb masters/interessos/atributs ja calculats: sense
+# JOINs ni GROUP BY. Els filtres de màster/edició passen a EXISTS; quan
+# arriben junts es combinen en una sola condició (mateix màster i edició).
+# LISTADOS_DESDE_RESUMEN=1 ho activa (cal la taula plena: reconstruir-resumen).
+USAR_RESUMEN = os.getenv("LISTADOS_DESDE_RESUMEN", "0") == "1"
+
+EXISTS_MASTER = """EXISTS (
+    SELECT 1
+    FROM relacionusuariomaster rum
+    JOIN master m ON m.idMaster = rum.idMaster
+    WHERE rum.idUsuario = u.idUsuario AND {cond}
+)"""
+
+EXISTS_INTERES = """EXISTS (
+    SELECT 1
+    FROM postulado p
+    JOIN master m2 ON m2.idMaster = p.idInteresMaster
+    WHERE p.idUsuario = u.idUsuario AND {cond}
+)"""
+
+COLUMNAS_RESUMEN = {
+    "id":       ("u.idUsuario AS id", ()),
+    "nombre":   ("u.nombreUsuario AS nombre", ()),
+    "mail":     ("u.mail", ()),
+    "telefono": ("u.telefon AS telefono", ()),
+}
+
+FILTROS_TEXTO_RESUMEN = {
+    "nombre":  "u.nombreUsuario LIKE %s",
+    "telefono": "u.telefon LIKE %s",
+    "mail":    "u.mail LIKE %s",
+}
+
+LISTADOS_RESUMEN = {
+    "usuarios": {
+        "from": "FROM usuario_resumen u",
+        "where": "1 = 1",
+        "joins": {},
+        "agrupar_siempre": False,
+        "group_by": "",
+        "atributos": "u.atributos AS atributos_json",
+        "columnas": {
+            **COLUMNAS_RESUMEN,
+            "estado":    ("u.estado", ()),
+            "masters":   ("u.masters", ()),
+            "intereses": ("u.intereses", ()),
+        },
+        "filtros": {
+            **FILTROS_TEXTO_RESUMEN,
+            "master":  EXISTS_MASTER.format(cond="m.nomMaster = %s"),
+            "edicion": EXISTS_MASTER.format(cond="m.edicio = %s"),
+            "interes_master": EXISTS_INTERES.format(cond="m2.nomMaster = %s"),
+            "estado": "u.estado = %s",
+            "publicidad": "u.publicidad = %s",
+        },
+        "filtros_combinados": [
+            (("master", "edicion"), EXISTS_MASTER.format(cond="m.nomMaster = %s AND m.edicio = %s")),
+        ],
+        "joins_filtros": {},
+    },
+    "alumnos": {
+        "from": "FROM usuario_resumen u",
+        "where": "u.estado = 'alumno'",
+        "joins": {},
+        "agrupar_siempre": False,
+        "group_by": "",
+        "atributos": "u.atributos AS atributos_json",
+        "columnas": {
+            **COLUMNAS_RESUMEN,
+            "master": ("u.masters_ediciones AS master", ()),
+        },
+        "filtros": {
+            **FILTROS_TEXTO_RESUMEN,
+            "master":  EXISTS_MASTER.format(cond="m.nomMaster = %s"),
+            "edicion": EXISTS_MASTER.format(cond="m.edicio = %s"),
+        },
+        "filtros_combinados": [
+            (("master", "edicion"), EXISTS_MASTER.format(cond="m.nomMaster = %s AND m.edicio = %s")),
+        ],
+        "joins_filtros": {},
+    },
+    "postulados": {
+        "from": "FROM usuario_resumen u",
+        "where": "u.es_postulado = 1",
+        "joins": {},
+        "agrupar_siempre": False,
+        "group_by": "",
+        "atributos": "u.atributos AS atributos_json",
+        "columnas": {
+            **COLUMNAS_RESUMEN,
+            "master": ("u.intereses AS master", ()),
+        },
+        "filtros": {
+            **FILTROS_TEXTO_RESUMEN,
+            "master":  EXISTS_INTERES.format(cond="m2.nomMaster = %s"),
+            "interes_master": EXISTS_INTERES.format(cond="m2.nomMaster = %s"),
+            "edicion": EXISTS_INTERES.format(cond="m2.edicio = %s"),
+        },
+        "filtros_combinados": [
+            (("master", "edicion"), EXISTS_INTERES.format(cond="m2.nomMaster = %s AND m2.edicio = %s")),
+            (("interes_master", "edicion"), EXISTS_INTERES.format(cond="m2.nomMaster = %s AND m2.edicio = %s")),
+        ],
+        "joins_filtros": {},
+    },
+}
+
+
+# ---------------------------------------------------------
+# Cache de resultats dels llistats
+# ---------------------------------------------------------
+# Clau = tipus + paràmetres normalitzats + versions de TABLAS_CONTACTOS:
+# qualsevol escriptura (incrementar_version) canvia la clau i el resultat
+# antic deixa de fer-se servir. El TTL per llistat és només una xarxa de
+# seguretat (canvis fets fora de l'API; també 'flask invalidar-cache').
+# Quan caduca per TTL, durant LISTADOS_CACHE_STALE es serveix el resultat
+# anterior mentre es recalcula en segon pla; les peticions simultànies d'un
+# llistat que no és a la cache comparteixen una sola consulta.
+# L'NDJSON no es cacheja.
+LISTADOS_CACHE_TTL = {
+    "usuarios": 60,
+    "alumnos": 300,
+    "postulados": 300,
+}
+LISTADOS_CACHE_STALE = {
+    "usuarios": 60,
+    "alumnos": 120,
+    "postulados": 120,
+}
+
+
+def clave_cache_listado(tipo, params):
+    """Clau de cache d'un llistat per aquests paràmetres i versions de dades."""
+    versiones = obtener_versiones(TABLAS_CONTACTOS)
+    return clave_generacional("listados", "%s:%r:%r" % (
+        tipo,
+        normalizar_params(params),
+        tuple(sorted(versiones.items())),
+    ))
+
+
+def spec_listado(tipo):
+    """Definició activa d'un llistat (taules base o usuario_resumen)."""
+    return LISTADOS_RESUMEN[tipo] if USAR_RESUMEN else LISTADOS[tipo]
+
+
+def aplicar_filtros_combinados(spec, params):
+    """
+    Retorna (filtros, valores, params_restants): les parelles de filtres que
+    han d'anar a la mateixa fila (p. ex. màster + edició) en una sola condició.
+    """
+    filtros = []
+    valores = []
+    usadas = set()
+
+    for claves, cond in spec.get("filtros_combinados", ()):
+        if usadas.intersection(claves):
+            continue
+        vals = [(params.get(k) or "").strip() for k in claves]
+        if all(vals):
+            filtros.append(cond)
+            valores.extend(vals)
+            usadas.update(claves)
+
+    if not usadas:
+        return filtros, valores, params
+    return filtros, valores, {k: v for k, v in params.items() if k not in usadas}
+
+
+def parsear_campos(tipo, params):
+    """
+    Llegeix 'fields=id,nombre,mail' (sparse fieldsets).
+    Retorna (campos_sql, incluir_atributos). Sense 'fields' es retorna tot.
+    Llença ValueError si es demana un camp que no existeix.
+    """
+    columnas = list(spec_listado(tipo)["columnas"])
+    raw = (params.get("fields") or "").strip()
+    if not raw:
+        return columnas, True
+
+    pedidos = [c.strip() for c in raw.split(",") if c.strip()]
+    desconocidos = [c for c in pedidos if c not in columnas and c != "atributos"]
+    if desconocidos:
+        raise ValueError(f"Campos no válidos: {', '.join(desconocidos)}")
+
+    return [c for c in columnas if c in pedidos], "atributos" in pedidos
+
+
+def filtros_listado(tipo, params, spec=None):
+    """
+    Retorna (filtros, valores, joins) per un llistat:
+    filtres fixos + filtres per atributs dinàmics i els JOINs que necessiten.
+    'spec' força una definició concreta (per defecte, la de spec_listado).
+    """
+    spec = spec or spec_listado(tipo)
+
+    modo = parsear_modo(params.get("match"))
+
+    combinados, valores_combinados, params_filtros = aplicar_filtros_combinados(spec, params)
+    filtros, valores = aplicar_filtros_basicos(params_filtros, spec["filtros"], modo=modo)
+    filtros += combinados
+    valores += valores_combinados
+    filtros, valores = aplicar_filtros_atributos(
+        params,
+        filtros,
+        valores,
+        claves_reservadas=set(spec["filtros"]) | CLAVES_CONTROL,
+        modo=modo,
+    )
+
+    joins = set()
+    for key, joins_filtro in spec["joins_filtros"].items():
+        if (params.get(key) or "").strip():
+            joins.update(joins_filtro)
+
+    return filtros, valores, joins
+
+
+def construir_listado(tipo, params, campos, cursor=None, limit=None, atributos=False):
+    """
+    Construeix (plantilla, valores) del llistat amb només les columnes 'campos'.
+    Els JOINs i GROUP_CONCAT que cap camp ni filtre necessita no s'afegeixen.
+    Amb atributos=True i un llistat sobre usuario_resumen, s'hi afegeix la
+    columna JSON d'atributs (atributos_json).
+    La plantilla és la forma compilada (i cachejada) del SQL.
+    """
+    spec = spec_listado(tipo)
+
+    filtros, valores, joins = filtros_listado(tipo, params)
+    filtros, valores = aplicar_cursor(cursor, filtros, valores)
+
+    select = []
+    for campo in campos:
+        expr, joins_campo = spec["columnas"][campo]
+        select.append(expr)
+        joins.update(joins_campo)
+
+    if atributos and spec.get("atributos"):
+        select.append(spec["atributos"])
+
+    query = "SELECT " + ",\n    ".join(select) + "\n" + spec["from"] + "\n"
+    query += "".join(sql for nombre, sql in spec["joins"].items() if nombre in joins)
+    query += "WHERE " + spec["where"]
+
+    if filtros:
+        query += " AND " + " AND ".join(filtros)
+
+    # Sense JOINs cada usuari és una sola fila: no cal GROUP BY
+    if joins or spec["agrupar_siempre"]:
+        query += "\nGROUP BY " + spec["group_by"]
+
+    query += "\nORDER BY u.nombreUsuario ASC, u.idUsuario ASC"
+
+    if limit:
+        query += " LIMIT %s"
+        valores.append(limit)
+
+    return compilar(query), valores
+
+
+def responder_listado(tipo, params):
+    """
+    Executa un llistat i retorna la resposta Flask:
+      - llista JSON (per defecte)
+      - {items, next_cursor} si hi ha 'limit'
+      - streaming NDJSON si el client ho demana
+    Amb 'formato_atributos=compacto' els atributs de cada fila van indexats
+    per idAtributo i la resposta és {atributos: {id: nom}, items, ...}
+    (en NDJSON, el diccionari és la primera línia).
+    Llença ValueError si els paràmetres no són vàlids.
+    """
+    limit, cursor = parsear_paginacion(params)
+    campos, incluir_atributos = parsear_campos(tipo, params)
+    compacto = (params.get("formato_atributos") or "").strip() == "compacto"
+
+    # 'id' (atributs) i 'nombre' (cursor) sempre es llegeixen; si no s'han
+    # demanat es treuen de la resposta.
+    campos_sql = campos + [c for c in ("id", "nombre") if c not in campos]
+    quitar = [c for c in campos_sql if c not in campos]
+
+    # Sobre usuario_resumen els atributs ja venen a la fila (JSON)
+    atributos_en_fila = incluir_atributos and bool(spec_listado(tipo).get("atributos"))
+
+    ndjson = quiere_ndjson()
+    # limit + 1 per saber si hi ha pàgina següent (també en NDJSON, on el
+    # cursor va a l'última línia)
+    limit_sql = limit + 1 if limit else None
+
+    plantilla, valores = construir_listado(
+        tipo, params, campos_sql, cursor, limit_sql, atributos=atributos_en_fila
+    )
+
+    if ndjson:
+        return respuesta_ndjson(
+            plantilla.sql,
+            valores,
+            incluir_atributos=incluir_atributos,
+            quitar=quitar,
+            atributos_en_fila=atributos_en_fila,
+            limit=limit or None,
+            compacto=compacto,
+        )
+
+    def calcular():
+        with DBSession() as db:
+            rows = ejecutar_plantilla(db, plantilla, valores).fetchall()
+
+            next_cursor = None
+            if limit:
+                rows, next_cursor = pagina_y_cursor(rows, limit)
+
+            diccionario = {}
+            if rows and incluir_atributos:
+                if atributos_en_fila:
+                    attrs = atributos_resumen(db, rows, compacto=compacto)
+                else:
+                    attrs = cargar_atributos(db, [r["id"] for r in rows], compacto=compacto)
+                if compacto:
+                    diccionario = diccionario_atributos(db, attrs)
+
+                for r in rows:
+                    r["atributos"] = attrs.get(r["id"], {})
+
+        if quitar:
+            for r in rows:
+                for c in quitar:
+                    r.pop(c, None)
+
+        if compacto:
+            payload = {"atributos": diccionario, "items": rows}
+            if limit:
+                payload["next_cursor"] = next_cursor
+            return payload
+        if limit:
+            return {"items": rows, "next_cursor": next_cursor}
+        return rows
+
+    payload = obtener_o_calcular(
+        clave_cache_listado(tipo, params),
+        calcular,
+        ttl_seconds=LISTADOS_CACHE_TTL[tipo],
+        stale_seconds=LISTADOS_CACHE_STALE[tipo],
+        metrica=f"listado_{tipo}",
+    )
+    # Serialitzar és només CPU: la connexió torna abans al pool
+    terminar_unidad()
+    return jsonify(payload), 200
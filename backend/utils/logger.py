@@ -1,17 +1,13 @@
-from backend.utils.db import get_connection
+from backend.utils.db_session import DBSession
 
 def registrar_historial(id_usuario, accion, detalle=None):
     """
     Guarda un movimiento en la tabla usuario_historial.
+    Dentro de una petición usa la misma conexión (y transacción) que el
+    cambio que registra.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO usuario_historial (idUsuario, accion, detalle)
-        VALUES (%s, %s, %s)
-    """, (id_usuario, accion, detalle))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with DBSession() as db:
+        db.execute("""
+            INSERT INTO usuario_historial (idUsuario, accion, detalle)
+            VALUES (%s, %s, %s)
+        """, (id_usuario, accion, detalle))
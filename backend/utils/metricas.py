@@ -0,0 +1,47 @@
+# backend/utils/metricas.py
+import threading
+from collections import defaultdict
+
+# ---------------------------------------------------------
+# Mètriques en memòria (per procés)
+# ---------------------------------------------------------
+# Comptadors simples (suma) agrupats per secció, més "fonts": funcions que
+# retornen un dict amb l'estat d'un component (cache, plantilles, pool...).
+# GET /api/metricas (admin) ho retorna tot.
+
+_lock = threading.Lock()
+_contadores = defaultdict(lambda: defaultdict(float))
+_fuentes = {}
+
+
+def incrementar(seccion, nombre, valor=1):
+    """Suma 'valor' al comptador seccion.nombre."""
+    with _lock:
+        _contadores[seccion][nombre] += valor
+
+
+def registrar_fuente(nombre, funcion):
+    """Afegeix una secció calculada en el moment de llegir les mètriques."""
+    _fuentes[nombre] = funcion
+
+
+def contadores(seccion):
+    """Còpia dels comptadors d'una secció."""
+    with _lock:
+        return dict(_contadores.get(seccion, {}))
+
+
+def instantanea():
+    """Totes les mètriques: comptadors + fonts registrades."""
+    with _lock:
+        resultado = {
+            seccion: dict(valores) for seccion, valores in _contadores.items()
+        }
+
+    for nombre, funcion in _fuentes.items():
+        try:
+            resultado[nombre] = funcion()
+        except Exception as e:
+            resultado[nombre] = {"error": str(e)}
+
+    return resultado
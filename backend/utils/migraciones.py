@@ -0,0 +1,131 @@
+# backend/utils/migraciones.py
+import hashlib
+import logging
+import os
+import re
+
+import mysql.connector
+
+from backend.utils.db_session import DBSession
+
+logger = logging.getLogger("crm.migraciones")
+
+# ---------------------------------------------------------
+# Migracions d'esquema versionades
+# ---------------------------------------------------------
+# backend/migrations/NNNN_descripcio.sql, aplicades en ordre per
+#   flask --app run migrar
+# La taula schema_migraciones guarda quines s'han aplicat (i el checksum de
+# les seves sentències: corregir un comentari no la marca com a modificada). Cada fitxer són sentències separades per ';' a final de línia
+# (sense DELIMITER: els triggers han de ser d'una sola sentència).
+# Els errors "ja existeix" (taula, columna, índex) s'ignoren perquè les
+# bases de dades on els scripts es van aplicar a mà es puguin adoptar.
+DIRECTORIO_MIGRACIONES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations"
+)
+TABLA_MIGRACIONES = "schema_migraciones"
+
+# 1050 taula ja existent, 1060 columna duplicada, 1061 índex duplicat
+ERRORES_YA_APLICADO = {1050, 1060, 1061}
+
+_RE_FICHERO = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_RE_FIN_SENTENCIA = re.compile(r";\s*$", re.MULTILINE)
+
+
+def listar_migraciones(directorio=DIRECTORIO_MIGRACIONES):
+    """[(version, nombre, ruta)] ordenades per versió."""
+    migraciones = []
+    for fichero in os.listdir(directorio):
+        m = _RE_FICHERO.match(fichero)
+        if m:
+            migraciones.append((int(m.group(1)), m.group(2), os.path.join(directorio, fichero)))
+    return sorted(migraciones)
+
+
+def leer_migracion(ruta):
+    """(sentències, checksum) d'un fitxer de migració."""
+    with open(ruta, encoding="utf-8") as f:
+        texto = f.read()
+    sin_comentarios = "\n".join(
+        linea for linea in texto.splitlines() if not linea.lstrip().startswith("--")
+    )
+    sentencias = [s.strip() for s in _RE_FIN_SENTENCIA.split(sin_comentarios)]
+    sentencias = [s for s in sentencias if s]
+    checksum = hashlib.sha1(";\n".join(sentencias).encode("utf-8")).hexdigest()
+    return sentencias, checksum
+
+
+def crear_tabla_migraciones(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLA_MIGRACIONES} (
+            version  INT          NOT NULL,
+            nombre   VARCHAR(191) NOT NULL,
+            checksum CHAR(40)     NOT NULL,
+            aplicada TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (version)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def migraciones_aplicadas(cursor):
+    """{version: checksum} de les migracions ja aplicades."""
+    crear_tabla_migraciones(cursor)
+    cursor.execute(f"SELECT version, checksum FROM {TABLA_MIGRACIONES}")
+    return {row["version"]: row["checksum"] for row in cursor.fetchall()}
+
+
+def estado_migraciones():
+    """[(version, nombre, estado)] amb estado: aplicada / pendiente / modificada."""
+    with DBSession() as db:
+        aplicadas = migraciones_aplicadas(db)
+
+    resultado = []
+    for version, nombre, ruta in listar_migraciones():
+        _, checksum = leer_migracion(ruta)
+        if version not in aplicadas:
+            estado = "pendiente"
+        elif aplicadas[version] != checksum:
+            estado = "modificada"
+        else:
+            estado = "aplicada"
+        resultado.append((version, nombre, estado))
+    return resultado
+
+
+def _ejecutar_sentencia(cursor, sentencia):
+    try:
+        cursor.execute(sentencia)
+    except mysql.connector.Error as e:
+        if e.errno not in ERRORES_YA_APLICADO:
+            raise
+        logger.info("Ya aplicado (%s): %s", e.errno, sentencia.splitlines()[0])
+
+
+def aplicar_migraciones(hasta=None):
+    """
+    Aplica les migracions pendents (fins a 'hasta', si s'indica) en ordre.
+    Cada migració es registra en acabar; si una falla, les anteriors queden
+    aplicades. Retorna [(version, nombre)] de les aplicades.
+    """
+    with DBSession() as db:
+        aplicadas = migraciones_aplicadas(db)
+
+    hechas = []
+    for version, nombre, ruta in listar_migraciones():
+        if version in aplicadas:
+            continue
+        if hasta is not None and version > hasta:
+            break
+
+        sentencias, checksum = leer_migracion(ruta)
+        logger.info("Aplicando migración %04d_%s (%s sentencias)", version, nombre, len(sentencias))
+        # El DDL de MySQL fa commit implícit: cada migració va en la seva sessió
+        with DBSession() as db:
+            for sentencia in sentencias:
+                _ejecutar_sentencia(db, sentencia)
+            db.execute(
+                f"INSERT INTO {TABLA_MIGRACIONES} (version, nombre, checksum) VALUES (%s, %s, %s)",
+                (version, nombre, checksum),
+            )
+        hechas.append((version, nombre))
+    return hechas
@@ -0,0 +1,140 @@
+# backend/utils/ndjson.py
+from flask import Response, request, current_app, stream_with_context
+from backend.utils.db import get_connections
+from backend.utils.db_session import terminar_unidad
+from backend.utils.query_helpers import (
+    cargar_atributos,
+    codificar_cursor,
+    obtener_catalogo_atributos,
+)
+from backend.utils.resumen import atributos_resumen
+
+MIMETYPE_NDJSON = "application/x-ndjson"
+TAMANO_LOTE = 500
+
+
+def quiere_ndjson():
+    """
+    True si el client demana 'Accept: application/x-ndjson'
+    per davant de 'application/json'.
+    """
+    best = request.accept_mimetypes.best_match(["application/json", MIMETYPE_NDJSON])
+    return best == MIMETYPE_NDJSON
+
+
+def respuesta_ndjson(query, valores, incluir_atributos=True, quitar=(),
+                     tamano_lote=TAMANO_LOTE, atributos_en_fila=False, limit=None,
+                     compacto=False):
+    """
+    Retorna una resposta en streaming: una línia JSON per fila.
+
+    Les files es llegeixen amb un cursor no bufferitzat en lots de 'tamano_lote'
+    i els atributs dinàmics es carreguen per lot amb una segona connexió
+    (una connexió amb un resultat pendent no pot executar altres consultes).
+    Les connexions es reserven abans de retornar la resposta i totes alhora:
+    si el pool està esgotat el client rep un 503 (no un stream tallat) i no
+    se'n reté una mentre s'espera l'altra.
+    La memòria queda limitada per la mida del lot, no per la taula.
+    'quitar' són columnes llegides només per ús intern (no es retornen).
+    Amb atributos_en_fila (llistats sobre usuario_resumen) els atributs surten
+    de la columna JSON de cada fila i no cal la segona consulta.
+    Amb 'limit' la consulta ha de demanar limit + 1 files: se n'envien
+    'limit' i l'última línia és {"next_cursor": ...} (None si no n'hi ha més).
+    Amb 'compacto' els atributs de cada fila van indexats per idAtributo i
+    la primera línia és el diccionari {"atributos": {idAtributo: nombre}}.
+    """
+    # El catàleg es resol ara, amb la connexió de la petició. Dins l'streaming
+    # només es torna a consultar (versions, recàrrega) pel cursor dels
+    # atributs: mai amb una connexió que no s'hagi reservat aquí.
+    catalogo = None
+    if incluir_atributos:
+        actual = obtener_catalogo_atributos(None)
+        if compacto:
+            catalogo = actual
+
+    # La connexió de la petició (versions, ETag...) es torna abans: si no,
+    # es retindria mentre s'esperen les de l'streaming
+    terminar_unidad()
+    # Amb els atributs a la fila no cal la segona connexió
+    segunda = incluir_atributos and not atributos_en_fila
+    conexiones = get_connections(2 if segunda else 1)
+    conn_filas = conexiones[0]
+    conn_attrs = conexiones[1] if segunda else None
+
+    def cerrar():
+        for conn in conexiones:
+            conn.close()
+
+    def generar():
+        cur_filas = cur_attrs = None
+        try:
+            if catalogo is not None:
+                yield current_app.json.dumps({"atributos": catalogo["por_id"]}) + "\n"
+
+            cur_filas = conn_filas.cursor(dictionary=True, buffered=False)
+            if conn_attrs is not None:
+                cur_attrs = conn_attrs.cursor(dictionary=True)
+
+            cur_filas.execute(query, valores)
+            enviadas = 0
+            ultima = None      # (nombre, id) de l'última fila enviada
+            hay_mas = False
+            while True:
+                lote = cur_filas.fetchmany(tamano_lote)
+                if not lote:
+                    break
+
+                if limit is not None and enviadas + len(lote) > limit:
+                    # Hi ha més files que la pàgina
+                    hay_mas = True
+                    lote = lote[:limit - enviadas]
+                    if not lote:
+                        break
+
+                attrs = {}
+                if atributos_en_fila:
+                    attrs = atributos_resumen(cur_attrs, lote)
+                    if catalogo is not None:
+                        por_nombre = catalogo["por_nombre"]
+                        attrs = {
+                            uid: {por_nombre[n]: v for n, v in valores.items() if n in por_nombre}
+                            for uid, valores in attrs.items()
+                        }
+                elif incluir_atributos:
+                    attrs = cargar_atributos(
+                        cur_attrs, [r["id"] for r in lote], compacto=catalogo is not None
+                    )
+
+                lineas = []
+                ultima = (lote[-1]["nombre"], lote[-1]["id"])
+                for r in lote:
+                    if incluir_atributos:
+                        r["atributos"] = attrs.get(r["id"], {})
+                    for c in quitar:
+                        r.pop(c, None)
+                    lineas.append(current_app.json.dumps(r))
+                yield "\n".join(lineas) + "\n"
+                enviadas += len(lote)
+                if hay_mas:
+                    break
+
+            if limit is not None:
+                next_cursor = codificar_cursor(*ultima) if hay_mas and ultima else None
+                yield current_app.json.dumps({"next_cursor": next_cursor}) + "\n"
+        finally:
+            # Si el client talla la connexió, descartem les files pendents
+            # abans de retornar la connexió al pool.
+            try:
+                conn_filas.consume_results()
+            except Exception:
+                pass
+            for cur in (cur_filas, cur_attrs):
+                if cur is not None:
+                    cur.close()
+            cerrar()
+
+    response = Response(stream_with_context(generar()), mimetype=MIMETYPE_NDJSON)
+    # Si el generador no arriba a començar, les connexions es tornen igualment
+    # (ConexionInstrumentada.close és idempotent)
+    response.call_on_close(cerrar)
+    return response
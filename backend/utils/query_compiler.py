@@ -0,0 +1,105 @@
+# backend/utils/query_compiler.py
+import hashlib
+import os
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from backend.utils.consultas import medir_consulta
+from backend.utils.metricas import registrar_fuente
+
+# ---------------------------------------------------------
+# Plantilles SQL compilades
+# ---------------------------------------------------------
+# Els filtres sempre generen el mateix SQL per la mateixa "forma" (quines
+# claus hi ha, quants atributs, quin mode...) perquè els valors van com a
+# paràmetres. Per això el text SQL ja és la clau de la forma: se li calcula
+# una sola vegada una empremta estable (per monitoratge) i es pot executar
+# com a sentència preparada al servidor.
+#
+# DB_PREPARED_STATEMENTS=1 activa l'execució preparada. Les sentències
+# preparades es guarden per connexió física; amb DB_POOL_RESET_SESSION=0
+# sobreviuen entre checkouts del pool (si el pool fa reset de sessió, MySQL
+# les allibera i la cache de la connexió es buida a cada checkout).
+USAR_PREPARADAS = os.getenv("DB_PREPARED_STATEMENTS", "0") == "1"
+MAX_PREPARADAS_POR_CONEXION = int(os.getenv("DB_PREPARED_MAX", "32"))
+TAMANO_CACHE_PLANTILLAS = 512
+
+Plantilla = namedtuple("Plantilla", ["sql", "huella"])
+
+
+@lru_cache(maxsize=TAMANO_CACHE_PLANTILLAS)
+def compilar(sql):
+    """
+    Retorna la Plantilla (SQL + empremta) d'un text SQL.
+    L'SQL es conserva tal qual (només strip: un literal pot contenir espais);
+    la versió amb espais compactats només serveix per calcular l'empremta.
+    """
+    compacto = " ".join(sql.split())
+    huella = hashlib.sha1(compacto.encode("utf-8")).hexdigest()[:16]
+    return Plantilla(sql.strip(), huella)
+
+
+def estadisticas_plantillas():
+    """Hits/misses de la cache de plantilles (per a mètriques)."""
+    info = compilar.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "plantillas": info.currsize,
+        "max": info.maxsize,
+        "preparadas": USAR_PREPARADAS,
+    }
+
+
+registrar_fuente("plantillas", estadisticas_plantillas)
+
+
+def _conexion_fisica(cursor):
+    """Connexió física d'un cursor (C extension: _cnx, Python pur: _connection)."""
+    return getattr(cursor, "_cnx", None) or getattr(cursor, "_connection", None)
+
+
+def olvidar_preparadas(conn):
+    """
+    Buida la cache de sentències preparades d'una connexió del pool
+    (cal després d'un reset de sessió, que les allibera al servidor).
+    """
+    cnx = getattr(conn, "_cnx", conn)
+    cache = getattr(cnx, "_crm_preparadas", None)
+    if cache:
+        cache.clear()
+
+
+def ejecutar_plantilla(cursor, plantilla, valores):
+    """
+    Executa una plantilla i retorna el cursor d'on s'han de llegir les files.
+    Sense sentències preparades és el mateix 'cursor' (dict); amb elles és
+    un cursor preparat (dict) reutilitzat per aquesta connexió i plantilla.
+    """
+    cnx = _conexion_fisica(cursor) if USAR_PREPARADAS else None
+    if cnx is None:
+        cursor.execute(plantilla.sql, valores)
+        return cursor
+
+    cache = getattr(cnx, "_crm_preparadas", None)
+    if cache is None:
+        cache = OrderedDict()
+        cnx._crm_preparadas = cache
+
+    preparado = cache.get(plantilla.huella)
+    if preparado is None:
+        preparado = cnx.cursor(prepared=True, dictionary=True)
+        cache[plantilla.huella] = preparado
+        while len(cache) > MAX_PREPARADAS_POR_CONEXION:
+            _, viejo = cache.popitem(last=False)
+            try:
+                viejo.close()
+            except Exception:
+                pass
+    else:
+        cache.move_to_end(plantilla.huella)
+
+    # El cursor preparat no està instrumentat: es mesura aquí
+    with medir_consulta(plantilla.sql, valores, getattr(cursor, "_explicar", None)):
+        preparado.execute(plantilla.sql, valores)
+    return preparado
@@ -1,9 +1,27 @@
 # backend/utils/query_helpers.py
+import base64
+import json
 
-def aplicar_filtros_basicos(params, mapa_condiciones):
+from backend.utils.busqueda import (
+    condicion_atributo_indexada,
+    condicion_trigramas,
+    campo_trigrama,
+    condicion_clave_normalizada,
+    escapar_like,
+)
+from backend.utils.query_compiler import compilar, ejecutar_plantilla
+from backend.utils.referencia import obtener_referencia, invalidar_referencia
+
+
+def aplicar_filtros_basicos(params, mapa_condiciones, modo=None):
     """
     Construeix la llista de condicions SQL i els valors
     a partir d'un dict de paràmetres i un mapa de claus → condicions.
+    Els LIKE comparen el valor literalment (% i _ escapats) i, sobre columnes
+    amb índex de trigrames (nom, mail, telèfon), afegeixen la condició de
+    candidats de condicion_trigramas (si està activada).
+    Amb modo exact/prefix, mail i telèfon es comparen per la seva columna
+    normalitzada (mail_norm / telefono_norm).
     """
     filtros = []
     valores = []
@@ -17,20 +35,38 @@ def aplicar_filtros_basicos(params, mapa_condiciones):
         if not valor:
             continue
 
-        if "LIKE" in cond:
-            valores.append(f"%{valor}%")
-        else:
+        if "LIKE" not in cond:
+            filtros.append(cond)
             valores.append(valor)
+            continue
+
+        columna = cond.split()[0]
+        normalizada = condicion_clave_normalizada(columna, valor, modo)
+        if normalizada:
+            filtros.extend(normalizada[0])
+            valores.extend(normalizada[1])
+            continue
 
         filtros.append(cond)
+        valores.append(f"%{escapar_like(valor)}%")
+
+        # LIKE '%x%' sobre nom/mail/telèfon: candidats via índex de trigrames
+        campo = campo_trigrama(columna)
+        if campo:
+            conds, vals = condicion_trigramas(campo, valor)
+            filtros.extend(conds)
+            valores.extend(vals)
 
     return filtros, valores
 
 
-def aplicar_filtros_atributos(params, filtros_actuales, valores_actuales, claves_reservadas=None):
+def aplicar_filtros_atributos(params, filtros_actuales, valores_actuales, claves_reservadas=None,
+                              modo=None):
     """
     Afegeix filtres EXISTS sobre valores_atributos per qualsevol clau
     que no estigui a 'claves_reservadas'.
+    Amb modo = exact / prefix / words el filtre passa per l'índex
+    atributos_busqueda (veure backend/utils/busqueda.py).
     """
     claves_reservadas = claves_reservadas or set()
 
@@ -58,42 +94,207 @@ def aplicar_filtros_atributos(params, filtros_actuales, valores_actuales, claves
         if not valor:
             continue
 
+        if modo:
+            conds, vals = condicion_atributo_indexada(key, valor, modo)
+            if conds:
+                filtros.extend(conds)
+                valores.extend(vals)
+                continue
+
         filtros.append(cond_exists)
         valores.append(key)
-        valores.append(f"%{valor}%")
+        valores.append(f"%{escapar_like(valor)}%")
 
     return filtros, valores
 
 
-def cargar_atributos(cursor, ids_usuarios):
+# ---------------------------------------------------------
+# Catàleg d'atributs (idAtributo ↔ nombre)
+# ---------------------------------------------------------
+# Forma part de la foto de dades de referència (backend/utils/referencia.py):
+# es llegeix una vegada i es comparteix per tot el procés. POST /api/atributos
+# l'invalida i el TTL cobreix els canvis fets fora de l'API.
+TAMANO_BLOQUE_IN = 1000
+
+
+def obtener_catalogo_atributos(cursor, recargar=False):
+    """
+    Retorna {"por_id": {idAtributo: nombre}, "por_nombre": {nombre: idAtributo}, ...}.
+    'cursor' ha de ser un cursor dict (DBSession).
+    """
+    return obtener_referencia(cursor, recargar=recargar)["atributos"]
+
+
+def invalidar_catalogo_atributos():
+    """Força que la propera lectura torni a carregar el catàleg (a tots els workers)."""
+    invalidar_referencia()
+
+
+def cargar_atributos(cursor, ids_usuarios, compacto=False):
     """
     Retorna un dict:
         { idUsuario: { nombreAtributo: valor, ... }, ... }
+    o, amb compacto=True, els atributs codificats pel seu id:
+        { idUsuario: { idAtributo: valor, ... }, ... }
+    (el diccionari id → nom és obtener_catalogo_atributos()["por_id"]).
 
-    Un sol SELECT per tots els usuaris.
+    Només llegeix valores_atributos (els noms surten del catàleg) i parteix
+    llistes d'ids molt grans en blocs de TAMANO_BLOQUE_IN.
     """
     if not ids_usuarios:
         return {}
 
-    placeholders = ", ".join(["%s"] * len(ids_usuarios))
+    ids_usuarios = list(ids_usuarios)
+    mapa = {}
 
-    cursor.execute(f"""
-        SELECT 
-            va.idUsuario,
-            a.nombre AS atributo,
-            va.valor
-        FROM valores_atributos va
-        JOIN atributos a ON a.idAtributo = va.idAtributo
-        WHERE va.idUsuario IN ({placeholders})
-    """, ids_usuarios)
+    for i in range(0, len(ids_usuarios), TAMANO_BLOQUE_IN):
+        bloque = ids_usuarios[i:i + TAMANO_BLOQUE_IN]
+        placeholders = ", ".join(["%s"] * len(bloque))
 
-    mapa = {}
-    for row in cursor.fetchall():
-        uid = row["idUsuario"]
-        attr = row["atributo"]
-        val = row["valor"]
-        if uid not in mapa:
-            mapa[uid] = {}
-        mapa[uid][attr] = val
-
-    return mapa
+        plantilla = compilar(f"""
+            SELECT idUsuario, idAtributo, valor
+            FROM valores_atributos
+            WHERE idUsuario IN ({placeholders})
+        """)
+
+        for row in ejecutar_plantilla(cursor, plantilla, bloque).fetchall():
+            uid = row["idUsuario"]
+            if uid not in mapa:
+                mapa[uid] = {}
+            mapa[uid][row["idAtributo"]] = row["valor"]
+
+    if compacto:
+        return mapa
+
+    por_id = obtener_catalogo_atributos(cursor)["por_id"]
+    if any(id_attr not in por_id for attrs in mapa.values() for id_attr in attrs):
+        # Atribut creat després de carregar el catàleg (p. ex. des d'un altre worker)
+        por_id = obtener_catalogo_atributos(cursor, recargar=True)["por_id"]
+
+    return {
+        uid: {por_id[id_attr]: val for id_attr, val in attrs.items() if id_attr in por_id}
+        for uid, attrs in mapa.items()
+    }
+
+
+def diccionario_atributos(cursor, mapa_compacto):
+    """
+    Diccionari { idAtributo: nombre } dels atributs que apareixen en un
+    resultat de cargar_atributos(..., compacto=True).
+    """
+    usados = {id_attr for attrs in mapa_compacto.values() for id_attr in attrs}
+    por_id = obtener_catalogo_atributos(cursor)["por_id"]
+    if not usados.issubset(por_id):
+        por_id = obtener_catalogo_atributos(cursor, recargar=True)["por_id"]
+    return {id_attr: por_id[id_attr] for id_attr in usados if id_attr in por_id}
+
+
+# ---------------------------------------------------------
+# Paginació per cursor (keyset) sobre (nombreUsuario, idUsuario)
+# ---------------------------------------------------------
+LIMITE_PAGINA_MAX = 500
+CLAVES_PAGINACION = {"limit", "cursor"}
+
+
+def codificar_cursor(nombre, id_usuario):
+    """
+    Converteix l'última fila d'una pàgina en un cursor opac (base64 url-safe).
+    Un nom NULL es conserva (null): no és el mateix que '' per al seek.
+    """
+    payload = json.dumps([nombre, id_usuario], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor):
+    """
+    Retorna (nombre, idUsuario) a partir d'un cursor generat per codificar_cursor.
+    Llença ValueError si el cursor no és vàlid.
+    """
+    try:
+        nombre, id_usuario = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (None if nombre is None else str(nombre)), int(id_usuario)
+    except Exception:
+        raise ValueError("Cursor no válido")
+
+
+def parsear_paginacion(params):
+    """
+    Llegeix 'limit' i 'cursor' dels paràmetres.
+    Retorna (limit, cursor_decodificat) o (None, None) si no es demana paginació.
+    """
+    raw_limit = (params.get("limit") or "").strip()
+    if not raw_limit:
+        return None, None
+
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise ValueError("'limit' debe ser un entero")
+
+    if limit < 1:
+        raise ValueError("'limit' debe ser mayor que 0")
+    limit = min(limit, LIMITE_PAGINA_MAX)
+
+    raw_cursor = (params.get("cursor") or "").strip()
+    cursor = decodificar_cursor(raw_cursor) if raw_cursor else None
+    return limit, cursor
+
+
+def aplicar_cursor(cursor, filtros_actuales, valores_actuales, base_alias="u"):
+    """
+    Afegeix la condició de seek (nombreUsuario, idUsuario) > cursor.
+    Es fa servir en lloc d'OFFSET perquè el cost no creixi amb la pàgina.
+    L'ORDER BY ASC posa els noms NULL primer: un cursor amb nom NULL
+    continua pels NULL restants i després per tots els noms no NULL
+    (sense COALESCE, perquè l'índex (nombreUsuario, idUsuario) serveixi).
+    """
+    filtros = list(filtros_actuales)
+    valores = list(valores_actuales)
+
+    if cursor is None:
+        return filtros, valores
+
+    nombre, id_usuario = cursor
+    if nombre is None:
+        filtros.append(
+            f"(({base_alias}.nombreUsuario IS NULL AND {base_alias}.idUsuario > %s)"
+            f" OR {base_alias}.nombreUsuario IS NOT NULL)"
+        )
+        valores.append(id_usuario)
+        return filtros, valores
+
+    filtros.append(
+        f"({base_alias}.nombreUsuario > %s"
+        f" OR ({base_alias}.nombreUsuario = %s AND {base_alias}.idUsuario > %s))"
+    )
+    valores.extend([nombre, nombre, id_usuario])
+    return filtros, valores
+
+
+def pagina_y_cursor(rows, limit):
+    """
+    Les consultes paginades demanen limit + 1 files per saber si hi ha més.
+    Retorna (files_de_la_pagina, next_cursor | None).
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    pagina = rows[:limit]
+    ultima = pagina[-1]
+    return pagina, codificar_cursor(ultima["nombre"], ultima["id"])
+
+
+def normalizar_params(params, ignorar=()):
+    """
+    Forma canònica d'un dict de filtres (per fer servir com a clau de cache):
+    tupla ordenada de (clau, valor) sense valors buits ni claus ignorades.
+    """
+    normalizados = []
+    for key, raw in params.items():
+        if key in ignorar or raw is None:
+            continue
+        valor = str(raw).strip()
+        if not valor:
+            continue
+        normalizados.append((key, valor))
+    return tuple(sorted(normalizados))
@@ -0,0 +1,128 @@
+# backend/utils/referencia.py
+import os
+import threading
+import time
+
+from backend.utils.db_session import DBSession
+from backend.utils.simple_cache import generacion, invalidar
+
+# ---------------------------------------------------------
+# Dades de referència en memòria
+# ---------------------------------------------------------
+# masters, edicions, atributs i firmes: taules petites que gairebé no
+# canvien. Es llegeixen juntes en una "foto" (snapshot) per procés i els
+# endpoints que les serveixen no toquen la BD.
+#
+# La foto es recarrega:
+#   - quan una escriptura crida invalidar_referencia() (atributos,
+#     firmas_email); amb un backend de cache compartit ho veuen tots els workers
+#   - quan canvia la versió de dades (versiones_datos) d'alguna de les seves
+#     taules: així la foto i l'ETag d'aquests endpoints no es desquadren
+#     (la taula master la versionen triggers)
+#   - quan passa REFERENCIA_TTL
+# Cada recàrrega incrementa 'version'. La foto és només de lectura.
+REFERENCIA_TTL = int(os.getenv("REFERENCIA_TTL", "60"))
+TABLAS_REFERENCIA = ("master", "atributos", "firmas_email")
+
+_snapshot = None
+_version = 0
+_lock = threading.Lock()
+
+
+def _cargar(cursor):
+    cursor.execute("""
+        SELECT
+            idMaster,
+            nomMaster AS nombre,
+            edicio AS edicion
+        FROM master
+        ORDER BY nomMaster ASC, edicio ASC
+    """)
+    masters = cursor.fetchall()
+
+    cursor.execute("SELECT DISTINCT edicio FROM master ORDER BY edicio")
+    ediciones = [row["edicio"] for row in cursor.fetchall()]
+
+    cursor.execute("SELECT idAtributo, nombre FROM atributos ORDER BY nombre")
+    filas_attr = cursor.fetchall()
+    por_id = {row["idAtributo"]: row["nombre"] for row in filas_attr}
+
+    cursor.execute("""
+        SELECT idFirma, nombre, html, es_defecto
+        FROM firmas_email
+        WHERE activa = 1
+        ORDER BY es_defecto DESC, nombre
+    """)
+    firmas = cursor.fetchall()
+
+    return {
+        "masters": masters,
+        "ediciones": ediciones,
+        "atributos": {
+            "nombres": [row["nombre"] for row in filas_attr],
+            "por_id": por_id,
+            "por_nombre": {nombre: id_attr for id_attr, nombre in por_id.items()},
+        },
+        "firmas": firmas,
+    }
+
+
+def obtener_referencia(cursor=None, recargar=False):
+    """
+    Retorna la foto de dades de referència:
+        {"version", "masters", "ediciones", "atributos": {"nombres", "por_id",
+         "por_nombre"}, "firmas", ...}
+    'cursor' (dict) és opcional: si no n'hi ha i cal consultar (versions o
+    recàrrega), es fa servir un DBSession (la connexió de la petició, si n'hi ha).
+    """
+    global _snapshot, _version
+
+    # Import local: versiones → ndjson → query_helpers → referencia
+    from backend.utils.versiones import obtener_versiones
+
+    gen = generacion("referencia")
+    versiones = obtener_versiones(TABLAS_REFERENCIA, cursor)
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and not recargar
+        and snapshot["expira"] >= time.time()
+        and snapshot["generacion"] == gen
+        and snapshot["versiones"] == versiones
+    ):
+        return snapshot
+
+    with _lock:
+        # Un altre thread pot haver-la recarregat mentre esperàvem
+        snapshot = _snapshot
+        if (
+            snapshot is not None
+            and not recargar
+            and snapshot["expira"] >= time.time()
+            and snapshot["generacion"] == gen
+            and snapshot["versiones"] == versiones
+        ):
+            return snapshot
+
+        if cursor is not None:
+            datos = _cargar(cursor)
+        else:
+            with DBSession() as cur:
+                datos = _cargar(cur)
+
+        _version += 1
+        datos.update({
+            "version": _version,
+            "generacion": gen,
+            "versiones": versiones,
+            "expira": time.time() + REFERENCIA_TTL,
+        })
+        _snapshot = datos
+        return datos
+
+
+def invalidar_referencia():
+    """Força la recàrrega de la foto (en aquest i, si és compartida, als altres workers)."""
+    global _snapshot
+    _snapshot = None
+    invalidar("referencia")
@@ -0,0 +1,165 @@
+# backend/utils/resumen.py
+import json
+
+from backend.utils.query_helpers import obtener_catalogo_atributos
+
+# ---------------------------------------------------------
+# Model de lectura usuario_resumen
+# ---------------------------------------------------------
+# Cada escriptura que canvia un contacte (dades, masters, interessos,
+# atributs) crida refrescar_resumen amb els seus ids dins la mateixa
+# transacció. Els llistats poden llegir llavors una sola taula indexada
+# sense JOINs ni GROUP BY.
+
+SELECT_RESUMEN = """
+    SELECT
+        u.idUsuario,
+        u.nombreUsuario,
+        u.mail,
+        u.telefon,
+        u.estado,
+        u.publicidad,
+        u.telefono_norm,
+        u.mail_norm,
+        (
+            SELECT GROUP_CONCAT(DISTINCT m.nomMaster SEPARATOR ', ')
+            FROM relacionusuariomaster rum
+            JOIN master m ON m.idMaster = rum.idMaster
+            WHERE rum.idUsuario = u.idUsuario
+        ),
+        (
+            SELECT GROUP_CONCAT(DISTINCT CONCAT(m.nomMaster, ' — ', m.edicio) SEPARATOR ', ')
+            FROM relacionusuariomaster rum
+            JOIN master m ON m.idMaster = rum.idMaster
+            WHERE rum.idUsuario = u.idUsuario
+        ),
+        (
+            SELECT GROUP_CONCAT(DISTINCT m.edicio SEPARATOR ', ')
+            FROM relacionusuariomaster rum
+            JOIN master m ON m.idMaster = rum.idMaster
+            WHERE rum.idUsuario = u.idUsuario
+        ),
+        (
+            SELECT GROUP_CONCAT(DISTINCT m2.nomMaster SEPARATOR ', ')
+            FROM postulado p
+            JOIN master m2 ON m2.idMaster = p.idInteresMaster
+            WHERE p.idUsuario = u.idUsuario
+        ),
+        EXISTS (
+            SELECT 1
+            FROM postulado p
+            JOIN master m2 ON m2.idMaster = p.idInteresMaster
+            WHERE p.idUsuario = u.idUsuario
+        ),
+        (
+            SELECT JSON_OBJECTAGG(a.nombre, va.valor)
+            FROM valores_atributos va
+            JOIN atributos a ON a.idAtributo = va.idAtributo
+            WHERE va.idUsuario = u.idUsuario
+        )
+    FROM usuario u
+"""
+
+INSERT_RESUMEN = """
+    INSERT INTO usuario_resumen (
+        idUsuario, nombreUsuario, mail, telefon, estado, publicidad,
+        telefono_norm, mail_norm,
+        masters, masters_ediciones, ediciones, intereses, es_postulado, atributos
+    )
+"""
+
+
+def refrescar_resumen(cursor, ids_usuarios):
+    """
+    Recalcula les files de usuario_resumen dels usuaris indicats
+    (i esborra les dels que ja no existeixen).
+    S'ha de cridar dins la mateixa transacció que l'escriptura.
+    """
+    ids = list(dict.fromkeys(i for i in ids_usuarios if i is not None))
+    if not ids:
+        return
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(
+        f"DELETE FROM usuario_resumen WHERE idUsuario IN ({placeholders})",
+        ids,
+    )
+    cursor.execute(
+        INSERT_RESUMEN + SELECT_RESUMEN + f" WHERE u.idUsuario IN ({placeholders})",
+        ids,
+    )
+
+
+def borrar_resumen(cursor, id_usuario):
+    """Esborra la fila d'un usuari eliminat."""
+    cursor.execute(
+        "DELETE FROM usuario_resumen WHERE idUsuario = %s",
+        (id_usuario,),
+    )
+
+
+def reconstruir_resumen(cursor, tamano_lote=1000):
+    """
+    Reconstrucció completa (recuperació o després de canvis fets fora de l'API,
+    p. ex. reanomenar un màster). Recorre 'usuario' per lots d'ids.
+    Retorna el nombre d'usuaris processats.
+    """
+    cursor.execute("DELETE FROM usuario_resumen")
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT idUsuario
+            FROM usuario
+            WHERE idUsuario > %s
+            ORDER BY idUsuario
+            LIMIT %s
+            """,
+            (ultimo_id, tamano_lote),
+        )
+        ids = [row["idUsuario"] for row in cursor.fetchall()]
+        if not ids:
+            break
+
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            INSERT_RESUMEN + SELECT_RESUMEN + f" WHERE u.idUsuario IN ({placeholders})",
+            ids,
+        )
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+    return total
+
+
+def atributos_resumen(cursor, rows, compacto=False, columna="atributos_json"):
+    """
+    Mateix format que cargar_atributos però a partir de la columna JSON
+    d'usuario_resumen (que es treu de cada fila):
+        { idUsuario: { nombreAtributo: valor } }  o, amb compacto=True,
+        { idUsuario: { idAtributo: valor } }
+    """
+    mapa = {}
+    for r in rows:
+        raw = r.pop(columna, None)
+        if raw is None:
+            continue
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode("utf-8")
+        attrs = json.loads(raw) if isinstance(raw, str) else dict(raw)
+        if attrs:
+            mapa[r["id"]] = attrs
+
+    if not compacto or not mapa:
+        return mapa
+
+    por_nombre = obtener_catalogo_atributos(cursor)["por_nombre"]
+    if any(nombre not in por_nombre for attrs in mapa.values() for nombre in attrs):
+        por_nombre = obtener_catalogo_atributos(cursor, recargar=True)["por_nombre"]
+
+    return {
+        uid: {por_nombre[nombre]: val for nombre, val in attrs.items() if nombre in por_nombre}
+        for uid, attrs in mapa.items()
+    }
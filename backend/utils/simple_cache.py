@@ -1,20 +1,389 @@
 # backend/utils/simple_cache.py
+import logging
+import os
+import sys
+import threading
 import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, has_app_context
+
+from backend.utils.metricas import incrementar, registrar_fuente
+
+logger = logging.getLogger("crm.cache")
+
+# ---------------------------------------------------------
+# Cache LRU + TTL en memòria (per procés)
+# ---------------------------------------------------------
+# - get/set O(1) sobre un OrderedDict (l'entrada usada passa al final;
+#   quan se supera el límit s'expulsen les del principi)
+# - TTL per entrada (les caducades s'eliminen en llegir-les o en expulsar)
+# - límit d'entrades i, opcionalment, de bytes aproximats
+# - tot sota un lock: es pot fer servir des de threads de gunicorn
+# cache_get / cache_set mantenen la interfície d'abans sobre la cache global.
+#
+# Backends (CACHE_BACKEND):
+#   memoria  LRUCache d'aquest procés (per defecte)
+#   sqlite   fitxer SQLite compartit per tots els workers del node
+#            (CACHE_SQLITE_PATH, veure backend/utils/cache_sqlite.py)
+# Invalidació per generacions: invalidar(espacio) incrementa la generació
+# d'un espai i les claus construïdes amb clave_generacional() canvien. Amb
+# el backend sqlite la generació és compartida: tots els workers la veuen.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria").lower()
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))
+
+_SIN_VALOR = object()
+
+
+def tamano_aproximado(valor, _profundidad=0):
+    """
+    Mida aproximada (bytes) d'un valor: suma de sys.getsizeof dels
+    contenidors i els seus elements (dicts, llistes, tuples, sets).
+    """
+    tamano = sys.getsizeof(valor)
+    if _profundidad > 8:
+        return tamano
+    if isinstance(valor, dict):
+        for k, v in valor.items():
+            tamano += tamano_aproximado(k, _profundidad + 1)
+            tamano += tamano_aproximado(v, _profundidad + 1)
+    elif isinstance(valor, (list, tuple, set, frozenset)):
+        for v in valor:
+            tamano += tamano_aproximado(v, _profundidad + 1)
+    return tamano
+
+
+class BackendCache(ABC):
+    """
+    Interfície dels backends de cache.
+    get / set / delete / clear sobre claus; generacion / invalidar per espais.
+    """
+
+    @abstractmethod
+    def get(self, key, default=None):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ttl_seconds=None):
+        ...
+
+    @abstractmethod
+    def delete(self, key):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def generacion(self, espacio):
+        ...
+
+    @abstractmethod
+    def invalidar(self, espacio):
+        ...
+
+    def stats(self):
+        return {}
+
+
+class LRUCache(BackendCache):
+    """
+    Cache LRU amb TTL per entrada i límits d'entrades / bytes.
+
+    Ús:
+        cache = LRUCache(max_entradas=500)
+        cache.set("clau", valor, ttl_seconds=30)
+        valor = cache.get("clau")      # None si no hi és o ha caducat
+    """
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS, max_bytes=None, ttl_defecto=60):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl_defecto = ttl_defecto
+
+        self._datos = OrderedDict()  # clau → (valor, expira, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expulsiones = 0
+        self.caducadas = 0
+
+        self._generaciones = {}
+
+    def _quitar(self, key):
+        _, _, tamano = self._datos.pop(key)
+        self._bytes -= tamano
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._datos.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            valor, expira, _ = item
+            if expira < time.time():
+                self._quitar(key)
+                self.caducadas += 1
+                self.misses += 1
+                return default
+
+            self._datos.move_to_end(key)
+            self.hits += 1
+            return valor
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_defecto if ttl_seconds is None else ttl_seconds
+        tamano = tamano_aproximado(value) if self.max_bytes else 0
+
+        # Un valor més gran que tot el pressupost no es guarda
+        if self.max_bytes and tamano > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._datos:
+                self._quitar(key)
+
+            self._datos[key] = (value, time.time() + ttl, tamano)
+            self._bytes += tamano
+            self._expulsar()
+
+    def _expulsar(self):
+        while self._datos and (
+            len(self._datos) > self.max_entradas
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            key, (_, expira, tamano) = self._datos.popitem(last=False)
+            self._bytes -= tamano
+            if expira < time.time():
+                self.caducadas += 1
+            else:
+                self.expulsiones += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._datos:
+                self._quitar(key)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def generacion(self, espacio):
+        return self._generaciones.get(espacio, 0)
+
+    def invalidar(self, espacio):
+        with self._lock:
+            self._generaciones[espacio] = self._generaciones.get(espacio, 0) + 1
+
+    def __len__(self):
+        return len(self._datos)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "memoria",
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "max_entradas": self.max_entradas,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "expulsiones": self.expulsiones,
+                "caducadas": self.caducadas,
+            }
+
+
+def crear_backend(nombre=CACHE_BACKEND):
+    """Backend de la cache global segons CACHE_BACKEND."""
+    if nombre == "sqlite":
+        from backend.utils.cache_sqlite import BackendSQLite
+        return BackendSQLite(max_entradas=CACHE_MAX_ENTRADAS)
+    return LRUCache(max_entradas=CACHE_MAX_ENTRADAS, max_bytes=CACHE_MAX_BYTES)
+
+
+_cache = crear_backend()
+registrar_fuente("cache", lambda: _cache.stats())
 
-_cache = {}
 
 def cache_get(key):
+    return _cache.get(key)
+
+
+def cache_set(key, value, ttl_seconds=60):
+    _cache.set(key, value, ttl_seconds=ttl_seconds)
+
+
+def cache_delete(key):
+    _cache.delete(key)
+
+
+def generacion(espacio):
+    """Generació actual d'un espai de claus."""
+    return _cache.generacion(espacio)
+
+
+def invalidar(espacio):
+    """Invalida totes les claus generacionals d'un espai (a tots els workers amb sqlite)."""
+    _cache.invalidar(espacio)
+
+
+@contextmanager
+def sin_cache():
+    """
+    Durant el bloc, la cache global d'aquest procés és una LRUCache buida
+    que no guarda res: totes les lectures fallen i invalidar() no arriba al
+    backend compartit. Només per a comandes (canvia la cache de tot el procés).
+    """
+    global _cache
+    anterior = _cache
+    _cache = LRUCache(max_entradas=0)
+    try:
+        yield
+    finally:
+        _cache = anterior
+
+
+def clave_generacional(espacio, key):
+    """Clau que queda invalidada quan es crida invalidar(espacio)."""
+    return f"{espacio}:{generacion(espacio)}:{key}"
+
+
+def cacheado(ttl_seconds=60, cache=None):
+    """
+    Decorador: memoritza el resultat d'una funció per (args, kwargs).
+    Els arguments han de ser hashables.
+    """
+    destino = cache if cache is not None else _cache
+
+    def decorador(f):
+        prefijo = (f.__module__, f.__qualname__)
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = (prefijo, args, tuple(sorted(kwargs.items())))
+            valor = destino.get(key, _SIN_VALOR)
+            if valor is not _SIN_VALOR:
+                return valor
+            valor = f(*args, **kwargs)
+            destino.set(key, valor, ttl_seconds=ttl_seconds)
+            return valor
+
+        return decorated
+
+    return decorador
+
+
+# ---------------------------------------------------------
+# Single-flight + stale-while-revalidate
+# ---------------------------------------------------------
+# obtener_o_calcular(clave, calcular, ...):
+#   - valor fresc a la cache → es retorna
+#   - valor caducat però dins 'stale_seconds' → es retorna el vell i un sol
+#     thread en segon pla el recalcula
+#   - sense valor → el primer thread el calcula i els altres que demanen la
+#     mateixa clau alhora esperen aquest resultat (una sola consulta pesada)
+# La coalescència és per procés (threads d'un worker).
+class _Vuelo:
+    """Càlcul en curs d'una clau."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+
+def _single_flight(key, cargar, metrica):
+    with _vuelos_lock:
+        vuelo = _vuelos.get(key)
+        lider = vuelo is None
+        if lider:
+            vuelo = _Vuelo()
+            _vuelos[key] = vuelo
+
+    if not lider:
+        incrementar("cache_calculada", f"{metrica}_coalescidas")
+        if not vuelo.evento.wait(SINGLE_FLIGHT_TIMEOUT):
+            # El líder triga massa: es calcula pel nostre compte
+            return cargar()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    try:
+        vuelo.resultado = cargar()
+        return vuelo.resultado
+    except Exception as e:
+        vuelo.error = e
+        raise
+    finally:
+        with _vuelos_lock:
+            _vuelos.pop(key, None)
+        vuelo.evento.set()
+
+
+def _refrescar_en_segundo_plano(key, cargar, metrica):
+    with _vuelos_lock:
+        if key in _vuelos:
+            return
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def ejecutar():
+        try:
+            if app is not None:
+                with app.app_context():
+                    _single_flight(key, cargar, metrica)
+            else:
+                _single_flight(key, cargar, metrica)
+        except Exception:
+            # El valor vell continua servint-se fins que caduqui del tot
+            incrementar("cache_calculada", f"{metrica}_errores")
+            logger.exception("Error refrescando cache (%s)", metrica)
+
+    threading.Thread(target=ejecutar, name=f"refresco-{metrica}", daemon=True).start()
+
+
+def obtener_o_calcular(key, calcular, ttl_seconds=60, stale_seconds=0, metrica="general"):
+    """
+    Retorna el valor de 'key' a la cache o el de calcular() (que es desa).
+    'stale_seconds' > 0 activa stale-while-revalidate durant aquest temps
+    després de caducar. 'metrica' agrupa els comptadors a /api/metricas.
+    """
     item = _cache.get(key)
-    if not item:
-        return None
+    if item is not None:
+        valor, fresco_hasta = item
+        if time.time() < fresco_hasta:
+            incrementar("cache_calculada", f"{metrica}_hits")
+            return valor
+        if stale_seconds:
+            incrementar("cache_calculada", f"{metrica}_stale")
+            _refrescar_en_segundo_plano(key, _cargador(key, calcular, ttl_seconds, stale_seconds), metrica)
+            return valor
 
-    value, expires = item
-    if expires < time.time():
-        del _cache[key]
-        return None
+    incrementar("cache_calculada", f"{metrica}_misses")
+    return _single_flight(key, _cargador(key, calcular, ttl_seconds, stale_seconds), metrica)
 
-    return value
 
-def cache_set(key, value, ttl_seconds=60):
-    expires = time.time() + ttl_seconds
-    _cache[key] = (value, expires)
+def _cargador(key, calcular, ttl_seconds, stale_seconds):
+    def cargar():
+        valor = calcular()
+        _cache.set(key, (valor, time.time() + ttl_seconds), ttl_seconds=ttl_seconds + stale_seconds)
+        return valor
+
+    return cargar
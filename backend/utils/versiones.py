@@ -0,0 +1,166 @@
+# backend/utils/versiones.py
+import hashlib
+import json
+import logging
+import os
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from backend.utils.db_session import DBSession, al_confirmar
+from backend.utils.ndjson import quiere_ndjson
+
+logger = logging.getLogger("crm.versiones")
+
+# ---------------------------------------------------------
+# Versions de dades + GET condicional (ETag / 304)
+# ---------------------------------------------------------
+# Cada escriptura incrementa la versió de les taules que toca
+# (versiones_datos). Un GET amb @con_etag(...) calcula l'ETag a partir
+# d'aquestes versions + ruta + query string, i si coincideix amb
+# If-None-Match respon 304 sense executar la vista.
+#
+# Les versions es guarden en memòria ETAG_VERSIONES_TTL segons: una
+# revalidació dins d'aquest interval no fa cap consulta. Les escriptures
+# d'aquest mateix procés les invaliden en confirmar-se (no abans: un GET
+# concurrent tornaria a guardar la versió vella); les d'altres workers es
+# veuen com a molt al cap del TTL.
+VERSIONES_TTL = float(os.getenv("ETAG_VERSIONES_TTL", "1"))
+
+# Taules que alimenten els llistats de contactes (/usuarios, /alumnos, ...)
+TABLAS_CONTACTOS = (
+    "usuario",
+    "valores_atributos",
+    "relacionusuariomaster",
+    "postulado",
+    "master",
+    "atributos",
+)
+
+_versiones = {}  # tabla → (version, expira)
+
+
+def incrementar_version(cursor, *tablas):
+    """
+    Incrementa la versió de 'tablas'. S'ha de cridar dins la transacció
+    de l'escriptura (el canvi de versió es confirma amb les dades); la cache
+    local de versions s'invalida després del commit.
+    """
+    for tabla in tablas:
+        cursor.execute(
+            """
+            INSERT INTO versiones_datos (tabla, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+            """,
+            (tabla,),
+        )
+    al_confirmar(lambda: _olvidar_versiones(tablas))
+
+
+def _olvidar_versiones(tablas):
+    for tabla in tablas:
+        _versiones.pop(tabla, None)
+
+
+def obtener_versiones(tablas, cursor=None):
+    """
+    Retorna {tabla: version} (0 si la taula encara no té comptador).
+    Només consulta la BD per les versions caducades de la cache local.
+    'cursor' (dict) és opcional: qui ja té una connexió reservada (p. ex.
+    l'streaming NDJSON) l'ha de passar per no demanar-ne una altra al pool.
+    """
+    ahora = time.time()
+    resultado = {}
+    pendientes = []
+
+    for tabla in tablas:
+        item = _versiones.get(tabla)
+        if item and item[1] > ahora:
+            resultado[tabla] = item[0]
+        else:
+            pendientes.append(tabla)
+
+    if pendientes:
+        if cursor is not None:
+            leidas = _leer_versiones(cursor, pendientes)
+        else:
+            with DBSession() as db:
+                leidas = _leer_versiones(db, pendientes)
+
+        expira = ahora + VERSIONES_TTL
+        for tabla in pendientes:
+            version = int(leidas.get(tabla, 0))
+            _versiones[tabla] = (version, expira)
+            resultado[tabla] = version
+
+    return resultado
+
+
+def _leer_versiones(cursor, tablas):
+    placeholders = ", ".join(["%s"] * len(tablas))
+    cursor.execute(
+        f"SELECT tabla, version FROM versiones_datos WHERE tabla IN ({placeholders})",
+        list(tablas),
+    )
+    return {row["tabla"]: row["version"] for row in cursor.fetchall()}
+
+
+def calcular_etag(tablas):
+    """
+    ETag fort de la petició actual: versions de 'tablas' + ruta +
+    query string (ordenat) + format demanat (JSON / NDJSON).
+    """
+    versiones = obtener_versiones(tablas)
+    base = json.dumps(
+        [
+            request.path,
+            sorted(versiones.items()),
+            sorted(request.args.items(multi=True)),
+            quiere_ndjson(),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def con_etag(*tablas):
+    """
+    Decorador per GETs que només depenen de 'tablas'.
+    Va per sota de login_required (l'autenticació es comprova abans).
+    """
+
+    def decorador(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                etag = calcular_etag(tablas)
+            except Exception:
+                # Sense versions (p. ex. BD no disponible) es respon sense ETag
+                logger.exception("Error calculando ETag")
+                return f(*args, **kwargs)
+
+            # La compressió afegeix '-gzip' / '-br' a l'ETag de la resposta
+            coincidente = next(
+                (
+                    candidato
+                    for candidato in (etag, f"{etag}-gzip", f"{etag}-br")
+                    if request.if_none_match.contains_weak(candidato)
+                ),
+                None,
+            )
+            if coincidente:
+                resp = current_app.response_class(status=304)
+                resp.set_etag(coincidente)
+                resp.headers["Cache-Control"] = "private, no-cache"
+                return resp
+
+            resp = make_response(f(*args, **kwargs))
+            if resp.status_code == 200:
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+
+        return decorated
+
+    return decorador
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: serialització d'un payload tipus GET /api/usuarios amb
+el proveïdor JSON de Flask (stdlib) i amb OrjsonProvider.
+
+    python -m benchmarks.json_provider [--filas 5000] [--repeticiones 20]
+"""
+import argparse
+import datetime
+import decimal
+import random
+import timeit
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from backend.utils.json_provider import OrjsonProvider, orjson
+
+MASTERS = [
+    "Máster en Dirección de Empresas",
+    "Máster en Marketing Digital",
+    "Máster en Recursos Humanos",
+    "Máster en Finanzas",
+]
+ATRIBUTOS = ["ciudad", "empresa", "cargo", "origen", "idioma", "sector", "beca"]
+
+
+def generar_payload(filas, semilla=42):
+    """Files com les de responder_listado (amb atributs, dates i decimals)."""
+    rnd = random.Random(semilla)
+    base = datetime.datetime(2024, 1, 1, 9, 0, 0)
+    payload = []
+    for i in range(filas):
+        payload.append({
+            "id": i + 1,
+            "nombre": f"Nombre Apellido {i}",
+            "mail": f"contacto{i}@example.com",
+            "telefono": f"6{rnd.randint(10000000, 99999999)}",
+            "estado": rnd.choice(["alumno", "postulado", "otro"]),
+            "masters": ", ".join(rnd.sample(MASTERS, rnd.randint(0, 2))) or None,
+            "intereses": rnd.choice(MASTERS + [None]),
+            "fecha": base + datetime.timedelta(minutes=rnd.randint(0, 500000)),
+            "importe": decimal.Decimal(rnd.randint(0, 900000)) / 100,
+            "atributos": {
+                nombre: f"valor {rnd.randint(1, 50)}"
+                for nombre in rnd.sample(ATRIBUTOS, rnd.randint(2, 6))
+            },
+        })
+    return payload
+
+
+def medir(provider_class, payload, repeticiones):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    with app.app_context():
+        # Mateix camí que jsonify: provider.response()
+        tiempo = timeit.timeit(lambda: app.json.response(payload), number=repeticiones)
+        tamano = len(app.json.response(payload).get_data())
+    return tiempo / repeticiones, tamano
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=5000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = generar_payload(args.filas)
+
+    proveedores = [("stdlib", DefaultJSONProvider)]
+    if orjson is not None:
+        proveedores.append(("orjson", OrjsonProvider))
+    else:
+        print("orjson no està instal·lat: només es mesura stdlib")
+
+    resultados = {}
+    for nombre, clase in proveedores:
+        segundos, tamano = medir(clase, payload, args.repeticiones)
+        resultados[nombre] = segundos
+        print(f"{nombre:>7}: {segundos * 1000:8.2f} ms/resposta  ({tamano / 1024:.0f} KiB)")
+
+    if len(resultados) == 2:
+        print(f"speedup: x{resultados['stdlib'] / resultados['orjson']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
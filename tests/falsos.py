@@ -0,0 +1,85 @@
+# tests/falsos.py
+# Pool / connexió / cursor de mentida per provar sense MySQL. Les files de
+# cada sentència les decideix 'responder(sql, params)' (llista de dicts).
+import mysql.connector
+
+from backend.utils import db
+
+
+class CursorFalso:
+    def __init__(self, pool):
+        self._pool = pool
+        self._filas = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self._pool.consultas.append((sql, params))
+        self._filas = [dict(f) for f in self._pool.responder(sql, params)]
+        self.rowcount = len(self._filas)
+
+    def fetchmany(self, n):
+        lote, self._filas = self._filas[:n], self._filas[n:]
+        return lote
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchone(self):
+        return self._filas.pop(0) if self._filas else None
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def cursor(self, *args, **kwargs):
+        return CursorFalso(self._pool)
+
+    def consume_results(self):
+        pass
+
+    def commit(self):
+        self._pool.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self._pool.en_uso -= 1
+
+
+class PoolFalso:
+    pool_name = "crm_pool"
+
+    def __init__(self, tamano, responder=lambda sql, params: []):
+        self.tamano = tamano
+        self.responder = responder
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.commits = 0
+        self.consultas = []
+
+    def get_connection(self):
+        if self.en_uso >= self.tamano:
+            raise mysql.connector.errors.PoolError("pool exhausted")
+        self.en_uso += 1
+        self.max_en_uso = max(self.max_en_uso, self.en_uso)
+        return ConexionFalsa(self)
+
+    def sql(self, fragmento):
+        """Sentències executades que contenen 'fragmento'."""
+        return [sql for sql, _ in self.consultas if fragmento in sql]
+
+
+def instalar_pool(monkeypatch, pool):
+    """Fa que get_connection / DBSession facin servir 'pool' (sense rèplica)."""
+    monkeypatch.setattr(db, "REPLICA_CONFIG", None)
+    monkeypatch.setattr(db, "POOL_TIMEOUT", 0.05)
+    monkeypatch.setattr(db, "_pool", pool)
+    monkeypatch.setattr(db, "_cola", db.ColaPool(pool.tamano, 10))
+    return pool
@@ -0,0 +1,54 @@
+# tests/test_asesor_indices.py
+# L'assessor ha de capturar les consultes calentes (filtres, cursor, match,
+# exportació), no només les dels GET sense paràmetres.
+import pytest
+
+from backend import create_app
+from backend.utils import asesor_indices, simple_cache, versiones
+from tests.falsos import PoolFalso, instalar_pool
+
+USUARIO = {"id": 7, "nombre": "Anna Puig", "mail": "anna@example.com", "telefon": "600123123"}
+ATRIBUTO = {"nombre": "ciudad", "valor": "Sant Cugat"}
+
+
+def responder(sql, params):
+    if "AS total" in sql and "GROUP BY" not in sql:
+        return [{"total": 0}]
+    if sql.startswith("SELECT idAtributo, nombre FROM atributos"):
+        return [{"idAtributo": 1, "nombre": "ciudad"}]
+    return []
+
+
+@pytest.fixture
+def app(monkeypatch):
+    instalar_pool(monkeypatch, PoolFalso(4, responder))
+    monkeypatch.setattr(versiones, "_versiones", {})
+    monkeypatch.setattr(simple_cache, "_cache", simple_cache.LRUCache())
+    monkeypatch.setattr(asesor_indices, "_ejemplos", lambda: (USUARIO, ATRIBUTO))
+    monkeypatch.setattr(asesor_indices, "_token_admin", lambda: "x")
+    app = create_app()
+    # El token de mentida no es valida: login_required el deixa passar
+    monkeypatch.setattr("jwt.decode", lambda *a, **k: {"id": 1, "rol": "admin"})
+    return app
+
+
+def test_captura_listados_filtrados_y_exportacion(app):
+    with app.app_context():
+        muestras, estados = asesor_indices.capturar_consultas_endpoints(app)
+
+    # Sense dades, les fitxes per id poden respondre 404: només es miren les
+    # peticions representatives
+    representativas = {
+        f"{metodo} {url}" + (f" tipo={cuerpo['tipo']}" if cuerpo else "")
+        for metodo, url, cuerpo in asesor_indices.peticiones_representativas(USUARIO, ATRIBUTO)
+    }
+    assert representativas <= set(estados)
+    assert not {p: estados[p] for p in representativas if estados[p] >= 400}
+
+    sqls = [sql for sql, _, _ in muestras.values()]
+    endpoints = {endpoint for _, _, endpoint in muestras.values()}
+    assert any("atributos_busqueda" in sql for sql in sqls)         # match=exact/prefix/words
+    assert any("nombreUsuario >" in sql for sql in sqls)            # limit + cursor
+    assert any("mail_norm" in sql for sql in sqls)                  # mail normalitzat
+    assert "export_bp.exportar_excel" in endpoints
+    assert any("POST /api/exportar/excel" in peticion for peticion in estados)
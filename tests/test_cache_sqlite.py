@@ -0,0 +1,37 @@
+# tests/test_cache_sqlite.py
+import threading
+
+import pytest
+
+from backend.utils.cache_sqlite import BackendSQLite
+
+
+@pytest.fixture
+def cache(tmp_path):
+    tmp_path.chmod(0o700)
+    return BackendSQLite(ruta=str(tmp_path / "cache.db"))
+
+
+def test_guarda_y_lee(cache):
+    cache.set("k", {"a": [1, 2]}, ttl_seconds=60)
+    assert cache.get("k") == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize("valor", [
+    (x for x in range(3)),
+    threading.Lock(),
+    lambda: 1,
+])
+def test_valor_no_serializable_no_falla(cache, valor):
+    cache.set("k", valor, ttl_seconds=60)
+
+    assert cache.get("k", "sin valor") == "sin valor"
+    assert cache.stats()["errores"] == 1
+
+
+def test_fila_corrupta_es_un_miss(cache):
+    cache.set("k", 1, ttl_seconds=60)
+    cache._conexion().execute("UPDATE cache SET valor = ? WHERE clave = 'k'", (b"no es pickle",))
+
+    assert cache.get("k", "sin valor") == "sin valor"
+    assert cache.stats()["errores"] == 1
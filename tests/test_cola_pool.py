@@ -0,0 +1,158 @@
+# tests/test_cola_pool.py
+# Cua justa del pool (ColaPool) i reserva atòmica de get_connections(n).
+import threading
+import time
+
+import pytest
+
+from backend.utils import db
+from backend.utils.db import ColaPool, PoolAgotadoError
+from tests.falsos import PoolFalso, instalar_pool
+
+
+def _esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        assert time.monotonic() < limite, "temps d'espera esgotat"
+        time.sleep(0.005)
+
+
+def _encolar(cola, prioridad, orden, nombre, n=1):
+    """Llança un thread que adquireix i apunta 'nombre' en aconseguir-ho."""
+    en_cola = cola.en_cola()
+
+    def ejecutar():
+        cola.adquirir(prioridad, 5, n)
+        orden.append(nombre)
+
+    hilo = threading.Thread(target=ejecutar)
+    hilo.start()
+    # Ordre d'arribada determinista: el següent no s'encua fins que aquest hi és
+    _esperar(lambda: cola.en_cola() > en_cola)
+    return hilo
+
+
+def test_sin_espera_si_hay_permisos():
+    cola = ColaPool(2, 10)
+    assert cola.adquirir(db.PRIORIDAD_NORMAL, 1) is False
+    assert cola.adquirir(db.PRIORIDAD_NORMAL, 1) is False
+    assert cola._libres == 0
+
+
+def test_fifo_dentro_de_la_misma_prioridad_y_prioridad_primero():
+    cola = ColaPool(1, 10)
+    cola.adquirir(db.PRIORIDAD_NORMAL, 1)
+    orden = []
+    hilos = [
+        _encolar(cola, db.PRIORIDAD_BAJA, orden, "baja"),
+        _encolar(cola, db.PRIORIDAD_NORMAL, orden, "normal-1"),
+        _encolar(cola, db.PRIORIDAD_NORMAL, orden, "normal-2"),
+        _encolar(cola, db.PRIORIDAD_ALTA, orden, "alta"),
+    ]
+
+    for atendidos in range(1, len(hilos) + 1):
+        cola.liberar()
+        _esperar(lambda: len(orden) == atendidos)
+
+    for hilo in hilos:
+        hilo.join(5)
+    assert orden == ["alta", "normal-1", "normal-2", "baja"]
+
+
+def test_timeout_lanza_pool_agotado_y_sale_de_la_cola():
+    cola = ColaPool(1, 10)
+    cola.adquirir(db.PRIORIDAD_NORMAL, 1)
+
+    inicio = time.monotonic()
+    with pytest.raises(PoolAgotadoError) as error:
+        cola.adquirir(db.PRIORIDAD_NORMAL, 0.05)
+
+    assert error.value.motivo == "timeout"
+    assert time.monotonic() - inicio >= 0.05
+    assert cola.en_cola() == 0
+
+
+def test_cola_llena_rechaza_al_momento():
+    cola = ColaPool(1, 1)
+    cola.adquirir(db.PRIORIDAD_NORMAL, 1)
+    orden = []
+    hilo = _encolar(cola, db.PRIORIDAD_NORMAL, orden, "esperando")
+
+    with pytest.raises(PoolAgotadoError) as error:
+        cola.adquirir(db.PRIORIDAD_NORMAL, 5)
+    assert error.value.motivo == "cola llena"
+
+    cola.liberar()
+    hilo.join(5)
+    assert orden == ["esperando"]
+
+
+def test_adquirir_n_es_todo_o_nada():
+    cola = ColaPool(2, 10)
+    cola.adquirir(db.PRIORIDAD_NORMAL, 1)
+    orden = []
+    hilo = _encolar(cola, db.PRIORIDAD_NORMAL, orden, "dos", n=2)
+
+    # Amb un permís lliure no se'n reserva cap (no hi ha retenció parcial)
+    time.sleep(0.05)
+    assert orden == []
+    assert cola._libres == 1
+
+    cola.liberar()
+    hilo.join(5)
+    assert orden == ["dos"]
+    assert cola._libres == 0
+
+
+def test_el_que_espera_n_no_se_salta_por_los_de_detras():
+    cola = ColaPool(2, 10)
+    cola.adquirir(db.PRIORIDAD_NORMAL, 1)
+    orden = []
+    dos = _encolar(cola, db.PRIORIDAD_NORMAL, orden, "dos", n=2)
+    uno = _encolar(cola, db.PRIORIDAD_NORMAL, orden, "uno")
+
+    # Hi ha un permís lliure, però 'uno' ha arribat després de 'dos'
+    time.sleep(0.05)
+    assert orden == []
+
+    cola.liberar()
+    dos.join(5)
+    cola.liberar(2)
+    uno.join(5)
+    assert orden == ["dos", "uno"]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    return instalar_pool(monkeypatch, PoolFalso(2))
+
+
+def test_get_connections_reserva_todas_o_ninguna(pool):
+    retenida = db.get_connection()
+
+    with pytest.raises(PoolAgotadoError):
+        db.get_connections(2)
+
+    # La que quedava lliure no s'ha consumit ni s'ha quedat reservada
+    assert pool.en_uso == 1
+    assert db._cola._libres == 1
+    assert db._cola.en_cola() == 0
+
+    retenida.close()
+    conexiones = db.get_connections(2)
+    assert len(conexiones) == 2
+    assert pool.en_uso == 2
+    for conn in conexiones:
+        conn.close()
+    assert db._cola._libres == 2
+
+
+def test_get_connections_devuelve_las_ya_obtenidas_si_falla_el_pool(pool):
+    # El pool de mysql-connector té menys connexions que permisos la cua
+    pool.tamano = 1
+
+    with pytest.raises(PoolAgotadoError):
+        db.get_connections(2)
+
+    assert pool.en_uso == 0
+    assert db._cola._libres == 2
@@ -0,0 +1,131 @@
+# tests/test_db_replica.py
+# Encaminament lectura → rèplica / escriptura → primari de get_connection,
+# amb pools de mentida (no cal cap MySQL).
+import time
+
+import mysql.connector
+import pytest
+from flask import Blueprint, Flask, jsonify
+
+from backend.utils import db
+
+
+class ConexionFalsa:
+    def __init__(self, origen):
+        self.origen = origen
+        self.cerrada = False
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolFalso:
+    def __init__(self, nombre):
+        self.pool_name = nombre
+        self.entregadas = 0
+
+    def get_connection(self):
+        self.entregadas += 1
+        return ConexionFalsa(self.pool_name)
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    primario = PoolFalso("primario")
+    replica = PoolFalso("replica")
+    monkeypatch.setattr(db, "REPLICA_CONFIG", {"host": "replica", "database": "crm_db"})
+    monkeypatch.setattr(db, "POOL_RESET_SESSION", False)
+    monkeypatch.setattr(db, "_pool", primario)
+    monkeypatch.setattr(db, "_cola", db.ColaPool(4, 10))
+    monkeypatch.setattr(db, "_pool_replica", replica)
+    monkeypatch.setattr(db, "_cola_replica", db.ColaPool(4, 10))
+    monkeypatch.setattr(db, "_replica_caida_hasta", 0.0)
+    return primario, replica
+
+
+def _origen():
+    conn = db.get_connection()
+    try:
+        return jsonify({"origen": conn.origen})
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def cliente():
+    app = Flask(__name__)
+
+    @app.route("/lectura", methods=["GET", "POST"])
+    def lectura():
+        return _origen()
+
+    @app.route("/primario")
+    @db.usar_primario
+    def primario():
+        return _origen()
+
+    export_bp = Blueprint("export_bp", __name__)
+
+    @export_bp.route("/exportar", methods=["POST"])
+    def exportar():
+        return _origen()
+
+    app.register_blueprint(export_bp)
+    return app.test_client()
+
+
+def test_get_va_a_la_replica(pools, cliente):
+    assert cliente.get("/lectura").json["origen"] == "replica"
+
+
+def test_post_va_al_primario(pools, cliente):
+    assert cliente.post("/lectura").json["origen"] == "primario"
+
+
+def test_usar_primario_fuerza_el_primario(pools, cliente):
+    assert cliente.get("/primario").json["origen"] == "primario"
+
+
+def test_cabecera_leer_primario(pools, cliente):
+    respuesta = cliente.get("/lectura", headers={"X-Leer-Primario": "1"})
+    assert respuesta.json["origen"] == "primario"
+
+
+def test_post_de_exportacion_va_a_la_replica(pools, cliente):
+    assert cliente.post("/exportar").json["origen"] == "replica"
+
+
+def test_sin_replica_configurada_todo_va_al_primario(pools, cliente, monkeypatch):
+    monkeypatch.setattr(db, "REPLICA_CONFIG", None)
+    assert cliente.get("/lectura").json["origen"] == "primario"
+
+
+def test_replica_caida_usa_el_primario_durante_el_reintento(pools, cliente, monkeypatch):
+    intentos = []
+
+    def init_fallido():
+        intentos.append(1)
+        raise mysql.connector.errors.InterfaceError("replica caida")
+
+    monkeypatch.setattr(db, "_pool_replica", None)
+    monkeypatch.setattr(db, "_init_replica", init_fallido)
+
+    assert cliente.get("/lectura").json["origen"] == "primario"
+    assert cliente.get("/lectura").json["origen"] == "primario"
+    assert len(intentos) == 1
+    assert db._replica_caida_hasta - time.time() == pytest.approx(db.REPLICA_REINTENTO, abs=5)
+
+    # Passat REPLICA_REINTENTO es torna a provar la rèplica
+    def init_correcto():
+        monkeypatch.setattr(db, "_pool_replica", pools[1])
+
+    monkeypatch.setattr(db, "_init_replica", init_correcto)
+    monkeypatch.setattr(db, "_replica_caida_hasta", time.time() - 1)
+    assert cliente.get("/lectura").json["origen"] == "replica"
+
+
+def test_las_conexiones_vuelven_a_la_cola(pools, cliente):
+    cliente.get("/lectura")
+    cliente.post("/lectura")
+    assert db._cola._libres == 4
+    assert db._cola_replica._libres == 4
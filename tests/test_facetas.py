@@ -0,0 +1,55 @@
+# tests/test_facetas.py
+# GET /api/usuarios/facets: la clau de cache ha de distingir 'match'.
+import time
+
+import jwt
+import pytest
+
+from backend import create_app
+from backend.utils import simple_cache, versiones
+from tests.falsos import PoolFalso, instalar_pool
+
+
+def responder(sql, params):
+    if "COUNT(DISTINCT u.idUsuario) AS total" in sql and "GROUP BY" not in sql:
+        # match=exact passa per l'índex d'atributs: un altre recompte
+        return [{"total": 1 if "atributos_busqueda" in sql else 3}]
+    return []
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    pool = instalar_pool(monkeypatch, PoolFalso(4, responder))
+    monkeypatch.setattr(versiones, "_versiones", {})
+    monkeypatch.setattr(simple_cache, "_cache", simple_cache.LRUCache())
+    app = create_app()
+    app.config["SECRET_KEY"] = "clave-de-pruebas-de-32-bytes-o-mas"
+    token = jwt.encode(
+        {"id": 1, "username": "test", "rol": "admin", "exp": int(time.time()) + 60},
+        app.config["SECRET_KEY"],
+        algorithm="HS256",
+    )
+    cliente = app.test_client()
+    cliente.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return cliente, pool
+
+
+def test_match_forma_parte_de_la_clave_de_cache(entorno):
+    cliente, _ = entorno
+    clasico = cliente.get("/api/usuarios/facets?ciudad=Barcelona")
+    exacto = cliente.get("/api/usuarios/facets?ciudad=Barcelona&match=exact")
+
+    assert clasico.status_code == exacto.status_code == 200
+    assert clasico.json["total"] == 3
+    assert exacto.json["total"] == 1
+
+
+def test_paginacion_y_campos_no_cambian_la_clave(entorno):
+    cliente, pool = entorno
+    cliente.get("/api/usuarios/facets?ciudad=Barcelona")
+    antes = len(pool.sql("COUNT(DISTINCT"))
+
+    respuesta = cliente.get("/api/usuarios/facets?ciudad=Barcelona&limit=10&fields=id")
+
+    assert respuesta.json["total"] == 3
+    assert len(pool.sql("COUNT(DISTINCT")) == antes
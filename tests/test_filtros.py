@@ -0,0 +1,14 @@
+# tests/test_filtros.py
+# Els valors dels filtres LIKE es comparen literalment (% i _ escapats).
+from backend.utils.query_helpers import aplicar_filtros_atributos, aplicar_filtros_basicos
+
+
+def test_filtros_basicos_escapan_comodines():
+    _, valores = aplicar_filtros_basicos({"nombre": "50%_a"}, {"nombre": "u.nombreUsuario LIKE %s"})
+    assert valores == ["%50\\%\\_a%"]
+
+
+def test_filtros_de_atributos_escapan_comodines():
+    filtros, valores = aplicar_filtros_atributos({"ciudad": "a_b%"}, [], [])
+    assert len(filtros) == 1
+    assert valores == ["ciudad", "%a\\_b\\%%"]
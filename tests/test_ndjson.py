@@ -0,0 +1,76 @@
+# tests/test_ndjson.py
+# Streaming NDJSON amb un pool de mentida de la mida just reservada.
+import json
+
+import pytest
+from flask import Flask
+
+from backend.utils import db, referencia, versiones
+from backend.utils.ndjson import respuesta_ndjson
+from tests.falsos import PoolFalso, instalar_pool
+
+USUARIOS = [{"id": i, "nombre": f"Contacto {i}"} for i in range(1, 6)]
+
+
+def responder(sql, params):
+    if "versiones_datos" in sql:
+        return []
+    if "FROM valores_atributos" in sql:
+        return [{"idUsuario": uid, "idAtributo": 1, "valor": "Barcelona"} for uid in params]
+    if "FROM atributos" in sql:
+        return [{"idAtributo": 1, "nombre": "ciudad"}]
+    if "FROM usuario" in sql:
+        return USUARIOS
+    return []  # master, firmas_email
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Tantes connexions com les que reserva l'streaming amb atributs (2)
+    pool = instalar_pool(monkeypatch, PoolFalso(2, responder))
+    # Versions sempre caducades: cada lot torna a consultar-les
+    monkeypatch.setattr(versiones, "VERSIONES_TTL", -1)
+    monkeypatch.setattr(versiones, "_versiones", {})
+    monkeypatch.setattr(referencia, "_snapshot", None)
+    return pool
+
+
+def _app(**opciones):
+    app = Flask(__name__)
+
+    @app.route("/stream")
+    def stream():
+        return respuesta_ndjson("SELECT id, nombre FROM usuario", [], tamano_lote=2, **opciones)
+
+    return app
+
+
+def _lineas(respuesta):
+    return [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize("compacto", [False, True])
+def test_stream_no_pide_conexiones_no_reservadas(pool, compacto):
+    respuesta = _app(compacto=compacto).test_client().get("/stream")
+
+    assert respuesta.status_code == 200
+    lineas = _lineas(respuesta)
+    if compacto:
+        assert lineas.pop(0) == {"atributos": {"1": "ciudad"}}
+    assert [fila["id"] for fila in lineas] == [u["id"] for u in USUARIOS]
+    assert lineas[0]["atributos"] == ({"1": "Barcelona"} if compacto else {"ciudad": "Barcelona"})
+    if not compacto:
+        # Les versions s'han tornat a llegir dins l'streaming, pel cursor reservat
+        assert len(pool.sql("versiones_datos")) > 1
+    assert pool.max_en_uso == 2
+    assert pool.en_uso == 0
+    assert db._cola._libres == 2
+
+
+def test_stream_con_limit_envia_next_cursor(pool):
+    respuesta = _app(limit=3).test_client().get("/stream")
+
+    lineas = _lineas(respuesta)
+    assert [fila["id"] for fila in lineas[:-1]] == [1, 2, 3]
+    assert lineas[-1]["next_cursor"] is not None
+    assert pool.en_uso == 0
@@ -0,0 +1,68 @@
+# tests/test_paginacion.py
+# Paginació per cursor (keyset): es recorre una taula sencera pàgina a
+# pàgina. SQLite ordena els NULL primer en ASC, com MySQL.
+import sqlite3
+
+import pytest
+
+from backend.utils.query_helpers import (
+    aplicar_cursor,
+    decodificar_cursor,
+    pagina_y_cursor,
+)
+
+NOMBRES = [None, "Berta", None, "Anna", None, "", "Carles", None, "Anna", None, "Berta"]
+
+
+@pytest.fixture
+def conexion():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE usuario (idUsuario INTEGER PRIMARY KEY, nombreUsuario TEXT)")
+    conn.executemany(
+        "INSERT INTO usuario (idUsuario, nombreUsuario) VALUES (?, ?)",
+        list(enumerate(NOMBRES, start=1)),
+    )
+    yield conn
+    conn.close()
+
+
+def _pagina(conn, cursor, limit):
+    filtros, valores = aplicar_cursor(cursor, [], [])
+    sql = "SELECT idUsuario AS id, nombreUsuario AS nombre FROM usuario u WHERE 1 = 1"
+    if filtros:
+        sql += " AND " + " AND ".join(filtros)
+    sql += " ORDER BY u.nombreUsuario ASC, u.idUsuario ASC LIMIT ?"
+    rows = [dict(r) for r in conn.execute(sql.replace("%s", "?"), valores + [limit + 1])]
+    return pagina_y_cursor(rows, limit)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 100])
+def test_recorre_todas_las_filas_con_nombres_null(conexion, limit):
+    vistos = []
+    cursor = None
+    while True:
+        rows, next_cursor = _pagina(conexion, cursor, limit)
+        vistos.extend(r["id"] for r in rows)
+        if next_cursor is None:
+            break
+        cursor = decodificar_cursor(next_cursor)
+
+    esperado = [
+        r[0] for r in conexion.execute(
+            "SELECT idUsuario FROM usuario ORDER BY nombreUsuario ASC, idUsuario ASC"
+        )
+    ]
+    assert vistos == esperado
+    assert len(vistos) == len(NOMBRES)
+
+
+def test_cursor_distingue_null_de_cadena_vacia(conexion):
+    # La primera pàgina acaba en un nom NULL (id 3): la següent continua
+    # pels NULL restants, no salta a ''
+    rows, next_cursor = _pagina(conexion, None, 2)
+    assert [r["id"] for r in rows] == [1, 3]
+    assert decodificar_cursor(next_cursor) == (None, 3)
+
+    rows, _ = _pagina(conexion, decodificar_cursor(next_cursor), 3)
+    assert [r["id"] for r in rows] == [5, 8, 10]
@@ -0,0 +1,171 @@
+# tests/test_simple_cache.py
+import threading
+import time
+
+import pytest
+
+from backend.utils import simple_cache
+from backend.utils.metricas import contadores
+from backend.utils.simple_cache import LRUCache, obtener_o_calcular
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    cache = LRUCache()
+    monkeypatch.setattr(simple_cache, "_cache", cache)
+    return cache
+
+
+def _esperar_refrescos():
+    for hilo in threading.enumerate():
+        if hilo.name.startswith("refresco-"):
+            hilo.join(5)
+
+
+def test_refresco_fallido_cuenta_error_y_sirve_el_valor_viejo(cache, caplog):
+    cache.set("k", ("viejo", time.time() - 1), ttl_seconds=60)
+    antes = contadores("cache_calculada").get("prueba_errores", 0)
+
+    def calcular():
+        raise RuntimeError("BD caída")
+
+    assert obtener_o_calcular("k", calcular, stale_seconds=60, metrica="prueba") == "viejo"
+    _esperar_refrescos()
+
+    assert contadores("cache_calculada")["prueba_errores"] == antes + 1
+    assert "Error refrescando cache (prueba)" in caplog.text
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def time(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(simple_cache, "time", reloj)
+    return reloj
+
+
+def test_lru_expulsa_la_menos_usada_por_numero_de_entradas():
+    cache = LRUCache(max_entradas=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # 'b' passa a ser la menys usada
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["expulsiones"] == 1
+
+
+def test_lru_respeta_el_limite_de_bytes():
+    valor = "x" * 1000
+    tamano = simple_cache.tamano_aproximado(valor)
+    cache = LRUCache(max_bytes=tamano * 2 + tamano // 2)
+    cache.set("a", valor)
+    cache.set("b", valor)
+    cache.set("c", valor)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_lru_no_guarda_un_valor_mayor_que_el_presupuesto():
+    cache = LRUCache(max_bytes=100)
+    cache.set("grande", "x" * 1000)
+    assert cache.get("grande") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_lru_ttl(reloj):
+    cache = LRUCache()
+    cache.set("k", "v", ttl_seconds=10)
+    reloj.ahora += 9
+    assert cache.get("k") == "v"
+    reloj.ahora += 2
+    assert cache.get("k") is None
+    assert cache.stats()["caducadas"] == 1
+
+
+def test_lru_invalidar_cambia_la_generacion():
+    cache = LRUCache()
+    assert cache.generacion("listados") == 0
+    cache.invalidar("listados")
+    assert cache.generacion("listados") == 1
+
+
+def _en_paralelo(funcion, n):
+    resultados, errores = [], []
+
+    def ejecutar():
+        try:
+            resultados.append(funcion())
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=ejecutar) for _ in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    return hilos, resultados, errores
+
+
+def test_single_flight_calcula_una_vez_para_peticiones_simultaneas():
+    llamadas = []
+    liberar = threading.Event()
+
+    def calcular():
+        llamadas.append(1)
+        liberar.wait(5)
+        return "valor"
+
+    antes = contadores("cache_calculada").get("prueba_sf_coalescidas", 0)
+    hilos, resultados, errores = _en_paralelo(
+        lambda: obtener_o_calcular("k", calcular, metrica="prueba_sf"), 5
+    )
+    # Tots els seguidors han d'estar esperant el líder abans de deixar-lo acabar
+    limite = time.monotonic() + 5
+    while contadores("cache_calculada").get("prueba_sf_coalescidas", 0) < antes + 4:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert len(llamadas) == 1
+    assert resultados == ["valor"] * 5
+    assert not errores
+    assert obtener_o_calcular("k", calcular) == "valor"  # ja a la cache
+    assert len(llamadas) == 1
+
+
+def test_single_flight_propaga_el_error_y_no_cachea(cache):
+    liberar = threading.Event()
+
+    def calcular():
+        liberar.wait(5)
+        raise RuntimeError("BD caída")
+
+    antes = contadores("cache_calculada").get("prueba_err_coalescidas", 0)
+    hilos, resultados, errores = _en_paralelo(
+        lambda: obtener_o_calcular("k", calcular, metrica="prueba_err"), 3
+    )
+    limite = time.monotonic() + 5
+    while contadores("cache_calculada").get("prueba_err_coalescidas", 0) < antes + 2:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert not resultados
+    assert len(errores) == 3
+    assert all(isinstance(e, RuntimeError) for e in errores)
+    assert cache.get("k") is None
+    assert not simple_cache._vuelos
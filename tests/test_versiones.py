@@ -0,0 +1,71 @@
+# tests/test_versiones.py
+# La cache local de versions només s'invalida quan l'escriptura es confirma.
+import pytest
+from flask import Flask
+
+from backend.utils import versiones
+from backend.utils.db_session import DBSession, registrar_unidad_trabajo, terminar_unidad
+from tests.falsos import PoolFalso, instalar_pool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(versiones, "VERSIONES_TTL", 60)
+    monkeypatch.setattr(versiones, "_versiones", {"usuario": (1, float("inf"))})
+    return instalar_pool(monkeypatch, PoolFalso(2))
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    registrar_unidad_trabajo(app)
+    return app
+
+
+def test_la_version_local_se_olvida_despues_del_commit(pool, app):
+    with app.test_request_context():
+        with DBSession() as db:
+            versiones.incrementar_version(db, "usuario")
+        # Encara sense commit: un GET concurrent ha de veure la versió confirmada
+        assert "usuario" in versiones._versiones
+        assert pool.commits == 0
+
+        terminar_unidad()
+        assert pool.commits == 1
+        assert "usuario" not in versiones._versiones
+
+
+def test_con_rollback_la_version_local_se_conserva(pool, app):
+    with app.test_request_context():
+        with DBSession() as db:
+            versiones.incrementar_version(db, "usuario")
+        terminar_unidad(confirmar=False)
+        assert versiones._versiones["usuario"][0] == 1
+
+
+def test_after_request_confirma_e_invalida(pool, app):
+    @app.route("/escribir", methods=["POST"])
+    def escribir():
+        with DBSession() as db:
+            versiones.incrementar_version(db, "usuario")
+        return {"ok": True}
+
+    @app.route("/fallar", methods=["POST"])
+    def fallar():
+        with DBSession() as db:
+            versiones.incrementar_version(db, "usuario")
+        return {"error": "x"}, 400
+
+    cliente = app.test_client()
+    cliente.post("/fallar")
+    assert "usuario" in versiones._versiones
+
+    cliente.post("/escribir")
+    assert "usuario" not in versiones._versiones
+    assert pool.en_uso == 0
+
+
+def test_fuera_de_peticion_se_olvida_al_momento(pool):
+    with DBSession() as db:
+        versiones.incrementar_version(db, "usuario")
+        assert "usuario" not in versiones._versiones
@@ -0,0 +1,24 @@
+# Servidor cooperatiu (gevent): molts requests lents per procés.
+#
+#   gunicorn -k gevent --worker-connections 500 wsgi_gevent:app
+#   python wsgi_gevent.py            (servidor gevent sense gunicorn)
+#
+# També funciona amb --preload: el driver MySQL (use_pure) es tria en crear
+# el pool, al primer checkout dins el worker, no en importar l'app.
+#
+# El monkey patching s'ha de fer abans d'importar res més.
+# Requereix: pip install gevent
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+from backend import create_app  # noqa: E402
+
+app = create_app()
+
+if __name__ == "__main__":
+    from gevent.pywsgi import WSGIServer
+
+    WSGIServer(("0.0.0.0", int(os.getenv("PORT", "5000"))), app).serve_forever()